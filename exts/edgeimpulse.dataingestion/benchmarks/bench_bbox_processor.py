@@ -0,0 +1,115 @@
+"""
+Measure the reading of the bounding boxes of a synthetic Replicator dataset, comparing
+the per-box loop bbox_processor used to run with process_files on one thread and on
+the thread and process pools.
+
+    python benchmarks/bench_bbox_processor.py --frames 20000 --boxes 20
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from common import load_package
+
+# Layout of the arrays of the bounding_box_2d_* annotators, defined by the extension
+load_package()
+from edgeimpulse.dataingestion.segmentation_processor import BOUNDING_BOX_DTYPE  # noqa: E402
+
+
+def write_dataset(root, frame_count, box_count, seed):
+    bounding_box_dir = os.path.join(root, "bounding_box_2d_tight")
+    rgb_dir = os.path.join(root, "rgb")
+    os.makedirs(bounding_box_dir)
+    os.makedirs(rgb_dir)
+
+    rng = np.random.default_rng(seed)
+    labels = {str(i): {"class": f"class_{i % 5}"} for i in range(box_count)}
+    for frame in range(frame_count):
+        boxes = np.zeros(box_count, dtype=BOUNDING_BOX_DTYPE)
+        boxes["semanticId"] = np.arange(box_count)
+        boxes["x_min"] = rng.integers(0, 1200, box_count)
+        boxes["y_min"] = rng.integers(0, 600, box_count)
+        boxes["x_max"] = boxes["x_min"] + rng.integers(1, 80, box_count)
+        boxes["y_max"] = boxes["y_min"] + rng.integers(1, 80, box_count)
+        boxes["occlusionRatio"] = rng.random(box_count)
+        np.save(os.path.join(bounding_box_dir, f"bounding_box_2d_tight_{frame:04d}.npy"), boxes)
+        with open(os.path.join(bounding_box_dir, f"bounding_box_2d_tight_labels_{frame:04d}.json"), "w") as f:
+            json.dump(labels, f)
+    return bounding_box_dir, rgb_dir
+
+
+# process_files before the frames were parsed on a pool: a per-box loop, writing the
+# labels to bounding_boxes.labels in the rgb folder
+def baseline_process_files(bounding_box_dir, rgb_dir, log_callback):
+    bounding_boxes_labels_data = {"version": 1, "type": "bounding-box-labels", "boundingBoxes": {}}
+    for npy_file in Path(bounding_box_dir).iterdir():
+        if npy_file.suffix != ".npy":
+            continue
+        file_number = npy_file.stem.split("_")[-1]
+        bounding_boxes = np.load(npy_file, allow_pickle=True)
+        with open(Path(bounding_box_dir) / f"bounding_box_2d_tight_labels_{file_number}.json", "r") as f:
+            labels = json.load(f)
+
+        bounding_boxes_entry = []
+        for i, bbox in enumerate(bounding_boxes):
+            key = str(i)
+            if key not in labels:
+                log_callback(f"Warning: Missing label for key {key}. Skipping.")
+                continue
+            x_min = int(bbox["x_min"])
+            y_min = int(bbox["y_min"])
+            bounding_boxes_entry.append(
+                {
+                    "label": labels[key]["class"],
+                    "x": x_min,
+                    "y": y_min,
+                    "width": int(bbox["x_max"] - x_min),
+                    "height": int(bbox["y_max"] - y_min),
+                }
+            )
+        bounding_boxes_labels_data["boundingBoxes"][f"rgb_{file_number}.png"] = bounding_boxes_entry
+
+    with open(Path(rgb_dir) / "bounding_boxes.labels", "w") as f:
+        json.dump(bounding_boxes_labels_data, f, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--boxes", type=int, default=20, help="Boxes per frame")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from edgeimpulse.dataingestion.bbox_processor import process_files
+
+    with tempfile.TemporaryDirectory() as root:
+        bounding_box_dir, rgb_dir = write_dataset(root, args.frames, args.boxes, args.seed)
+
+        def run_process_files(max_workers, use_processes):
+            return lambda: process_files(bounding_box_dir, rgb_dir, lambda message: None, max_workers, use_processes)
+
+        runs = [
+            ("baseline loop", lambda: baseline_process_files(bounding_box_dir, rgb_dir, lambda message: None)),
+            ("threads x1", run_process_files(1, False)),
+            (f"threads x{args.workers}", run_process_files(args.workers, False)),
+            (f"processes x{args.workers}", run_process_files(args.workers, True)),
+        ]
+        baseline_seconds = None
+        for name, run in runs:
+            start = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - start
+            baseline_seconds = baseline_seconds or seconds
+            print(
+                f"{name:<16} {seconds:8.2f} s {args.frames / seconds:10.0f} frames/s "
+                f"{baseline_seconds / seconds:6.2f}x"
+            )
+
+if __name__ == "__main__":
+    main()
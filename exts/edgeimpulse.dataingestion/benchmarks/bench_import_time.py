@@ -0,0 +1,76 @@
+"""
+Measure the cold import time of the heavy dependencies and of the extension modules
+that extension.py only imports on first use. Every import runs in a fresh interpreter.
+
+    python benchmarks/bench_import_time.py --repeat 5
+
+The modules importing Kit (extension, capture, classifier, config, utils) can only
+be measured inside Kit: the extension prints its startup time and the time taken by
+every module it loads lazily.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEPENDENCIES = ["numpy", "PIL.Image", "yaml", "httpx"]
+
+# Kit-free modules of the package
+PACKAGE_MODULES = [
+    "log_model",
+    "profiling",
+    "bbox_filter",
+    "preprocessing",
+    "segmentation_processor",
+    "bbox_processor",
+    "inference_result",
+    "backends",
+    "uploader",
+    "frame_watcher",
+    "ingestion_worker",
+    "active_learning",
+]
+
+IMPORT_SNIPPET = """
+import importlib, sys, time
+sys.path.insert(0, {benchmarks_dir!r})
+from common import load_package
+load_package()
+start = time.perf_counter()
+importlib.import_module({module!r})
+print((time.perf_counter() - start) * 1e3)
+"""
+
+
+def measure_import(module, repeat):
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(benchmarks_dir=BENCHMARKS_DIR, module=module)],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            return None
+        timings.append(float(result.stdout.strip()))
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module")
+    args = parser.parse_args()
+
+    modules = DEPENDENCIES + [f"edgeimpulse.dataingestion.{name}" for name in PACKAGE_MODULES]
+    print(f"{'module':<50} {'median ms':>10}")
+    for module in modules:
+        milliseconds = measure_import(module, args.repeat)
+        timing = "not installed" if milliseconds is None else f"{milliseconds:.1f}"
+        print(f"{module:<50} {timing:>10}")
+
+
+if __name__ == "__main__":
+    main()
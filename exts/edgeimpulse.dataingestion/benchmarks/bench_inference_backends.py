@@ -0,0 +1,83 @@
+"""
+Compare the per-frame latency of the inference backends, outside of Kit.
+
+    python benchmarks/bench_inference_backends.py --width 96 --height 96 \
+        --deployment ~/ei-model-1-3 --tflite model.tflite --onnx model.onnx
+
+--deployment is an extracted WebAssembly deployment (the directory holding node/),
+the other backends are skipped when their model is not given.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from common import load_package
+
+
+async def bench_backend(backend, model_dir, frames):
+    backend.load(model_dir)
+    # The first run pays for the cold start, like the warm-up in the extension
+    await backend.infer(frames[0])
+
+    latencies = []
+    for frame in frames:
+        start = time.perf_counter()
+        await backend.infer(frame)
+        latencies.append((time.perf_counter() - start) * 1e3)
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, required=True, help="Impulse input width")
+    parser.add_argument("--height", type=int, required=True, help="Impulse input height")
+    parser.add_argument("--deployment", help="Extracted WebAssembly deployment directory")
+    parser.add_argument("--tflite", help="TFLite model file")
+    parser.add_argument("--onnx", help="ONNX model file")
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    load_package()
+    from edgeimpulse.dataingestion.backends import create_inference_backend
+    from edgeimpulse.dataingestion.preprocessing import ImagePreprocessor
+
+    # Synthetic 1080p frames, preprocessed once so only the inference is measured
+    rng = np.random.default_rng(args.seed)
+    preprocessor = ImagePreprocessor(args.width, args.height)
+    frames = [
+        preprocessor.process(
+            Image.fromarray(rng.integers(0, 256, (1080, 1920, 4), dtype=np.uint8), "RGBA")
+        )
+        for _ in range(args.frames)
+    ]
+
+    candidates = [
+        ("node", args.deployment, None),
+        ("tflite", None, args.tflite),
+        ("onnx", None, args.onnx),
+    ]
+    executor = ThreadPoolExecutor(max_workers=1)
+    print(f"{'backend':<8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'fps':>7}")
+    for name, model_dir, model_path in candidates:
+        if not model_dir and not model_path:
+            continue
+        backend = create_inference_backend(name, model_path, executor, lambda message: None)
+        latencies = await bench_backend(backend, model_dir, frames)
+        backend.close()
+
+        latencies.sort()
+        mean = statistics.mean(latencies)
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{name:<8} {mean:>9.2f} {p50:>9.2f} {p95:>9.2f} {1e3 / mean:>7.1f}")
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,271 @@
+"""
+Headless benchmark suite of the hot paths of the extension, on fixed-seed synthetic
+inputs. Every benchmark is run --repeat times and its median is compared with a JSON
+baseline: the suite exits with an error when a benchmark is more than --threshold
+slower than its baseline, plus NOISE_IQRS interquartile ranges of the timings so the
+run to run noise of the machine is not reported as a regression.
+
+    python benchmarks/bench_suite.py --save-baseline baseline.json
+    python benchmarks/bench_suite.py --baseline baseline.json --threshold 0.2
+    python benchmarks/bench_suite.py --only bbox_conversion upload_throughput
+
+Baselines depend on the machine, record them on the machine that checks them.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from bench_bbox_processor import write_dataset
+from bench_upload_frame_time import start_ingestion_server, write_images
+from common import load_package
+
+BENCHMARKS = {}
+
+# interquartile ranges of noise, of the baseline or of the run, allowed on top of --threshold
+NOISE_IQRS = 2
+
+
+def benchmark(name, unit_count, unit):
+    """
+    Register a benchmark. The decorated function takes the seed, a temporary directory
+    and an ExitStack for its teardown, and returns the function to time, so the setup
+    is not measured.
+    """
+
+    def decorator(setup_fn):
+        BENCHMARKS[name] = (setup_fn, unit_count, unit)
+        return setup_fn
+
+    return decorator
+
+
+@benchmark("feature_extraction", 20, "frame")
+def feature_extraction(seed, root, stack):
+    # Resize of a captured 1080p frame to the impulse input and the features string
+    from edgeimpulse.dataingestion.preprocessing import ImagePreprocessor
+
+    rng = np.random.default_rng(seed)
+    frame = Image.fromarray(rng.integers(0, 256, (1080, 1920, 4), dtype=np.uint8), "RGBA")
+    preprocessor = ImagePreprocessor(320, 320)
+
+    def run():
+        for _ in range(20):
+            processed_frame = preprocessor.process(frame)
+            processed_frame.features
+
+    return run
+
+
+@benchmark("bbox_conversion", 1000, "frame")
+def bbox_conversion(seed, root, stack):
+    from edgeimpulse.dataingestion.bbox_filter import BoxFilter
+    from edgeimpulse.dataingestion.bbox_processor import convert_bounding_boxes
+    from edgeimpulse.dataingestion.segmentation_processor import BOUNDING_BOX_DTYPE
+
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(1000):
+        boxes = np.zeros(20, dtype=BOUNDING_BOX_DTYPE)
+        boxes["semanticId"] = rng.integers(0, 5, 20)
+        boxes["x_min"] = rng.integers(0, 1200, 20)
+        boxes["y_min"] = rng.integers(0, 600, 20)
+        boxes["x_max"] = boxes["x_min"] + rng.integers(1, 80, 20)
+        boxes["y_max"] = boxes["y_min"] + rng.integers(1, 80, 20)
+        boxes["occlusionRatio"] = rng.random(20)
+        frames.append(boxes)
+    labels = {str(i): {"class": f"class_{i}"} for i in range(5)}
+    box_filter = BoxFilter(min_area=16, max_occlusion=0.9, image_size=(1280, 720))
+
+    def run():
+        for boxes in frames:
+            convert_bounding_boxes(boxes, labels, lambda message: None, box_filter)
+
+    return run
+
+
+@benchmark("label_files", 2000, "frame")
+def label_files(seed, root, stack):
+    # The labels payload sent with every upload and the label cache of a dataset
+    from edgeimpulse.dataingestion.bbox_processor import save_label_cache
+    from edgeimpulse.dataingestion.uploader import create_labels_payload
+
+    rng = np.random.default_rng(seed)
+    frames = {}
+    for frame in range(2000):
+        image = f"rgb_{frame:04d}.png"
+        boxes = [
+            {"label": f"class_{i % 5}", "x": int(x), "y": int(y), "width": int(w), "height": int(h)}
+            for i, (x, y, w, h) in enumerate(rng.integers(0, 1000, (20, 4)))
+        ]
+        frames[f"bounding_box_2d_tight_{frame:04d}.npy"] = {
+            "signature": [0, 0, 0, 0],
+            "image": image,
+            "boxes": boxes,
+            "dropped": {},
+            "warnings": [],
+        }
+    cache_path = os.path.join(root, "labels.json")
+
+    def run():
+        for frame in frames.values():
+            create_labels_payload(frame["image"], frame["boxes"])
+        save_label_cache(cache_path, frames)
+
+    return run
+
+
+@benchmark("upload_throughput", 200, "file")
+def upload_throughput(seed, root, stack):
+    # Concurrent uploads to a local ingestion server answering after 5 ms
+    from edgeimpulse.dataingestion.uploader import upload_data
+
+    server, ingestion_url = start_ingestion_server(0.005)
+    stack.callback(server.server_close)
+    stack.callback(server.shutdown)
+    bounding_box_dir, rgb_dir = write_dataset(root, 200, 20, seed)
+    write_images(rgb_dir, 200, seed)
+    bounding_boxes = {
+        f"rgb_{frame:04d}.png": [{"label": "box", "x": 0, "y": 0, "width": 8, "height": 8}]
+        for frame in range(200)
+    }
+
+    def run():
+        asyncio.run(
+            upload_data(
+                "key",
+                rgb_dir,
+                "training",
+                lambda message: None,
+                lambda: None,
+                bounding_boxes,
+                ingestion_url,
+            )
+        )
+
+    return run
+
+
+@benchmark("result_cache", 10000, "lookup")
+def result_cache(seed, root, stack):
+    # Lookups of the cached results of static scenes, 3 hits out of 4
+    from edgeimpulse.dataingestion.result_cache import ResultCache
+
+    rng = np.random.default_rng(seed)
+    cache = ResultCache()
+    hashes = [f"{value:032x}" for value in rng.integers(0, 2**63, 40)]
+    results = [{"label": "box", "value": 0.9, "x": 1, "y": 2, "width": 3, "height": 4}] * 10
+    lookups = [hashes[index] for index in rng.integers(0, len(hashes), 10000)]
+
+    def run():
+        for features_hash in lookups:
+            if cache.get("ei-model-1-1", features_hash) is None:
+                cache.put("ei-model-1-1", features_hash, results)
+
+    return run
+
+
+def run_benchmark(name, repeat, seed):
+    setup_fn, unit_count, unit = BENCHMARKS[name]
+    with tempfile.TemporaryDirectory() as root, contextlib.ExitStack() as stack:
+        return time_benchmark(setup_fn(seed, root, stack), repeat, unit_count, unit)
+
+
+def time_benchmark(run, repeat, unit_count, unit):
+    # The first run warms up the imports, allocators and connections
+    run()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    quartiles = statistics.quantiles(timings, n=4) if len(timings) > 1 else [median] * 3
+    return {
+        "median_ms": median * 1e3,
+        "iqr_ms": (quartiles[2] - quartiles[0]) * 1e3,
+        "min_ms": min(timings) * 1e3,
+        "per_unit_us": median / unit_count * 1e6,
+        "unit": unit,
+    }
+
+
+def is_regression(result, baseline_result, threshold):
+    # The median may drift by the noise of either run before the threshold applies
+    noise_ms = NOISE_IQRS * max(result["iqr_ms"], baseline_result.get("iqr_ms", 0.0))
+    return result["median_ms"] > baseline_result["median_ms"] * (1 + threshold) + noise_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--repeat", type=int, default=15, help="Timed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="Baseline JSON to compare with")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="Allowed slowdown on top of the noise, 0.2 is 20%%"
+    )
+    parser.add_argument("--save-baseline", help="Write the results as a baseline JSON")
+    args = parser.parse_args()
+
+    load_package()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["benchmarks"]
+
+    results = {}
+    regressions = []
+    print(f"{'benchmark':<20} {'median ms':>10} {'iqr ms':>10} {'per unit':>16} {'baseline':>10} {'change':>8}")
+    for name in args.only or BENCHMARKS:
+        result = run_benchmark(name, args.repeat, args.seed)
+        results[name] = result
+
+        baseline_result = baseline.get(name, {})
+        baseline_ms = baseline_result.get("median_ms")
+        change = ""
+        if baseline_ms:
+            change = f"{result['median_ms'] / baseline_ms - 1:+.0%}"
+            if is_regression(result, baseline_result, args.threshold):
+                regressions.append(name)
+                change += " !"
+        print(
+            f"{name:<20} {result['median_ms']:>10.2f} {result['iqr_ms']:>10.2f} "
+            f"{result['per_unit_us']:>8.2f} us/{result['unit']:<6} "
+            f"{baseline_ms or 0:>10.2f} {change:>8}"
+        )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(
+                {
+                    "machine": {
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "cpus": os.cpu_count(),
+                    },
+                    "seed": args.seed,
+                    "benchmarks": results,
+                },
+                f,
+                indent=2,
+            )
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if regressions:
+        print(f"Regressed by more than {args.threshold:.0%} beyond the noise: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Measure how much an upload stalls the main event loop, outside of Kit. A 60 Hz ticker
+stands in for Kit's update loop (and so for the viewport frame time) while a synthetic
+dataset is uploaded to a local ingestion server:
+
+    inline  labels and blocking uploads on the main loop, like the extension used to
+    worker  IngestionWorker, labels and uploads on its own thread and event loop
+
+    python benchmarks/bench_upload_frame_time.py --frames 2000 --latency 20
+"""
+import argparse
+import asyncio
+import http.client
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+from PIL import Image
+
+from bench_bbox_processor import write_dataset
+from common import load_package
+
+FRAME_INTERVAL = 1 / 60
+
+
+def start_ingestion_server(latency):
+    class IngestionHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            try:
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+            except ConnectionError:
+                # the client gave up on the request, e.g. a cancelled upload
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), IngestionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/"
+
+
+def write_images(rgb_dir, frame_count, seed):
+    rng = np.random.default_rng(seed)
+    for frame in range(frame_count):
+        pixels = rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(os.path.join(rgb_dir, f"rgb_{frame:04d}.png"))
+
+
+async def measure_frames(done):
+    # Intervals between ticks of a loop that wants to run at 60 Hz
+    intervals = []
+    last = time.perf_counter()
+    while not done.is_set():
+        await asyncio.sleep(FRAME_INTERVAL)
+        now = time.perf_counter()
+        intervals.append((now - last) * 1e3)
+        last = now
+    return intervals
+
+
+async def ingest_inline(bounding_box_dir, rgb_dir, ingestion_url):
+    # What start_upload did before the worker: synchronous label reading and one
+    # blocking request per file, with only an await between files
+    from edgeimpulse.dataingestion.bbox_processor import process_files
+    from edgeimpulse.dataingestion.uploader import create_labels_payload
+
+    bounding_boxes = process_files(bounding_box_dir, rgb_dir, lambda message: None)
+    url = urllib.parse.urlparse(ingestion_url + "training/files")
+    connection = http.client.HTTPConnection(url.hostname, url.port)
+    for file in os.listdir(rgb_dir):
+        await asyncio.sleep(0)
+        with open(os.path.join(rgb_dir, file), "rb") as f:
+            body = f.read() + create_labels_payload(file, bounding_boxes.get(file, []))
+        connection.request("POST", url.path, body=body)
+        connection.getresponse().read()
+    connection.close()
+
+
+async def ingest_worker(bounding_box_dir, rgb_dir, ingestion_url):
+    from edgeimpulse.dataingestion.ingestion_worker import IngestionWorker
+
+    worker = IngestionWorker()
+    future = worker.submit(
+        worker.ingest("key", rgb_dir, "training", bounding_box_dir, ingestion_url=ingestion_url)
+    )
+    while not future.done():
+        worker.drain()
+        await asyncio.sleep(0.1)
+    future.result()
+    worker.stop()
+
+
+async def run(mode, bounding_box_dir, rgb_dir, ingestion_url):
+    done = asyncio.Event()
+    frames = asyncio.ensure_future(measure_frames(done))
+    start = time.perf_counter()
+    await (ingest_inline if mode == "inline" else ingest_worker)(bounding_box_dir, rgb_dir, ingestion_url)
+    seconds = time.perf_counter() - start
+    done.set()
+    return seconds, await frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=1000, help="Images in the dataset")
+    parser.add_argument("--boxes", type=int, default=20, help="Boxes per image")
+    parser.add_argument("--latency", type=float, default=20, help="Server latency per upload in ms")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    load_package()
+    server, ingestion_url = start_ingestion_server(args.latency / 1e3)
+
+    with tempfile.TemporaryDirectory() as root:
+        bounding_box_dir, rgb_dir = write_dataset(root, args.frames, args.boxes, args.seed)
+        write_images(rgb_dir, args.frames, args.seed)
+
+        print(f"{'mode':<8} {'upload s':>9} {'frame ms':>9} {'p95 ms':>9} {'max ms':>9} {'>33 ms':>7}")
+        for mode in ("inline", "worker"):
+            seconds, intervals = asyncio.run(run(mode, bounding_box_dir, rgb_dir, ingestion_url))
+            intervals.sort()
+            p95 = intervals[min(len(intervals) - 1, int(len(intervals) * 0.95))]
+            stalls = sum(interval > 33 for interval in intervals)
+            print(
+                f"{mode:<8} {seconds:>9.2f} {statistics.mean(intervals):>9.2f} {p95:>9.2f} "
+                f"{intervals[-1]:>9.2f} {stalls:>7}"
+            )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import importlib.abc
+import os
+import sys
+import types
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "edgeimpulse", "dataingestion")
+
+# top-level packages only available inside Kit
+KIT_PACKAGES = ("omni", "carb", "pxr")
+
+
+class KitImportBlocker(importlib.abc.MetaPathFinder):
+    """
+    Fails the import of Kit modules with a clear error, so a benchmark that pulls in a
+    Kit module (directly or through a package module) stops at the import instead of
+    picking up an unrelated package of the same name.
+    """
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname.split(".")[0] in KIT_PACKAGES:
+            raise ImportError(f"{fullname} is only available inside Kit, benchmarks run headless")
+        return None
+
+
+def load_package():
+    """
+    Make the Kit-free modules of the extension importable without running the package
+    __init__, which loads the extension and therefore Kit.
+    """
+    if not any(isinstance(finder, KitImportBlocker) for finder in sys.meta_path):
+        sys.meta_path.insert(0, KitImportBlocker())
+
+    for name, path in (
+        ("edgeimpulse", os.path.dirname(PACKAGE_DIR)),
+        ("edgeimpulse.dataingestion", PACKAGE_DIR),
+    ):
+        if name not in sys.modules:
+            module = types.ModuleType(name)
+            module.__path__ = [path]
+            sys.modules[name] = module
@@ -0,0 +1,234 @@
+"""
+Write a synthetic dataset laid out like the output of the Replicator BasicWriter, to
+test bbox_processor and the uploader at scale without rendering anything:
+
+    rgb/rgb_NNNN.png
+    bounding_box_2d_tight/bounding_box_2d_tight_NNNN.npy
+    bounding_box_2d_tight/bounding_box_2d_tight_labels_NNNN.json
+    bounding_box_2d_loose/...
+
+    python benchmarks/generate_dataset.py /tmp/dataset --frames 100000 --boxes 20 \\
+        --annotators tight loose --missing-labels 0.01 --workers 8
+
+The images are a gradient with the boxes filled in the color of their class, cheap to
+encode and easy to check by eye. Like Replicator, each frame numbers its classes: the
+boxes of a class share its semanticId and the labels json is keyed by semanticId.
+Frames are written in chunks by a process pool, each chunk with its own random
+stream, so a seed gives the same dataset whatever the number of workers.
+
+A --missing-labels fraction of the frames only gets its rgb image, like frames written
+without annotations, and the same fraction of the keys of the other labels json is
+left out, like classes Replicator could not label.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from common import load_package
+
+load_package()
+from edgeimpulse.dataingestion.segmentation_processor import BOUNDING_BOX_DTYPE  # noqa: E402
+
+# frames written by one task of the pool
+CHUNK_SIZE = 500
+
+# extra margin of the loose boxes around the tight ones, in pixels
+LOOSE_MARGIN = 3
+
+
+def create_background(width, height):
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    background = np.empty((height, width, 3), dtype=np.uint8)
+    background[..., 0] = x[np.newaxis, :]
+    background[..., 1] = y[:, np.newaxis]
+    background[..., 2] = 96
+    return background
+
+
+def create_boxes(rng, box_count, width, height):
+    boxes = np.zeros(box_count, dtype=BOUNDING_BOX_DTYPE)
+    box_width = rng.integers(4, max(5, width // 4), box_count)
+    box_height = rng.integers(4, max(5, height // 4), box_count)
+    boxes["x_min"] = rng.integers(0, np.maximum(1, width - box_width))
+    boxes["y_min"] = rng.integers(0, np.maximum(1, height - box_height))
+    # Replicator boxes are inclusive of their last pixel
+    boxes["x_max"] = np.minimum(boxes["x_min"] + box_width, width) - 1
+    boxes["y_max"] = np.minimum(boxes["y_min"] + box_height, height) - 1
+    boxes["occlusionRatio"] = rng.random(box_count, dtype=np.float32)
+    return boxes
+
+
+def loosen_boxes(rng, boxes, width, height):
+    loose = boxes.copy()
+    margins = rng.integers(0, LOOSE_MARGIN + 1, (4, len(boxes)))
+    loose["x_min"] = np.maximum(boxes["x_min"] - margins[0], 0)
+    loose["y_min"] = np.maximum(boxes["y_min"] - margins[1], 0)
+    loose["x_max"] = np.minimum(boxes["x_max"] + margins[2], width - 1)
+    loose["y_max"] = np.minimum(boxes["y_max"] + margins[3], height - 1)
+    return loose
+
+
+def write_chunk(output_dir, annotators, start, stop, options, seed_sequence):
+    rng = np.random.default_rng(seed_sequence)
+    width, height = options["width"], options["height"]
+    class_count = options["class_count"]
+    class_colors = rng.integers(0, 256, (class_count, 3), dtype=np.uint8)
+    background = create_background(width, height)
+    rgb_dir = os.path.join(output_dir, "rgb")
+
+    box_total = 0
+    missing_total = 0
+    missing_key_total = 0
+    for frame in range(start, stop):
+        frame_number = f"{frame:04d}"
+        box_count = int(rng.integers(options["min_boxes"], options["max_boxes"] + 1))
+        boxes = create_boxes(rng, box_count, width, height)
+        class_ids = rng.integers(0, class_count, box_count)
+        # the classes of the frame are numbered from 0, in the order of their class ids
+        frame_class_ids, boxes["semanticId"] = np.unique(class_ids, return_inverse=True)
+
+        pixels = background.copy()
+        for box, class_id in zip(boxes, class_ids):
+            pixels[box["y_min"] : box["y_max"] + 1, box["x_min"] : box["x_max"] + 1] = class_colors[class_id]
+        # The fastest zlib level, the images are only read back by the uploader
+        Image.fromarray(pixels).save(os.path.join(rgb_dir, f"rgb_{frame_number}.png"), compress_level=1)
+
+        if rng.random() < options["missing_label_rate"]:
+            missing_total += 1
+            continue
+
+        kept_keys = rng.random(len(frame_class_ids)) >= options["missing_label_rate"]
+        labels = {
+            str(semantic_id): {"class": f"class_{class_id}"}
+            for semantic_id, class_id in enumerate(frame_class_ids.tolist())
+            if kept_keys[semantic_id]
+        }
+        missing_key_total += len(frame_class_ids) - len(labels)
+        for annotator in annotators:
+            annotator_boxes = boxes if annotator == "tight" else loosen_boxes(rng, boxes, width, height)
+            dir_name = f"bounding_box_2d_{annotator}"
+            np.save(os.path.join(output_dir, dir_name, f"{dir_name}_{frame_number}.npy"), annotator_boxes)
+            with open(os.path.join(output_dir, dir_name, f"{dir_name}_labels_{frame_number}.json"), "w") as f:
+                json.dump(labels, f)
+        box_total += box_count
+
+    return stop - start, box_total, missing_total, missing_key_total
+
+
+def generate_dataset(
+    output_dir,
+    frame_count,
+    min_boxes,
+    max_boxes,
+    annotators=("tight",),
+    width=512,
+    height=512,
+    class_count=5,
+    missing_label_rate=0.0,
+    workers=None,
+    seed=0,
+    progress_fn=None,
+):
+    """
+    Write a synthetic Replicator dataset.
+    Args:
+        output_dir (str): Folder receiving rgb/ and the bounding_box_2d_* folders.
+        frame_count (int): Number of frames.
+        min_boxes (int), max_boxes (int): Range of the number of boxes per frame.
+        annotators (tuple): "tight" and/or "loose".
+        missing_label_rate (float): Fraction of the frames written without annotations,
+            and of the keys left out of the labels json of the others.
+        workers (int): Processes writing the frames, all the CPUs by default.
+        progress_fn (callable): Called with the number of frames written so far.
+    Returns:
+        tuple: Numbers of frames, boxes, frames without annotations and label keys
+            left out written.
+    """
+    os.makedirs(os.path.join(output_dir, "rgb"), exist_ok=True)
+    for annotator in annotators:
+        os.makedirs(os.path.join(output_dir, f"bounding_box_2d_{annotator}"), exist_ok=True)
+
+    options = {
+        "width": width,
+        "height": height,
+        "class_count": class_count,
+        "min_boxes": min_boxes,
+        "max_boxes": max_boxes,
+        "missing_label_rate": missing_label_rate,
+    }
+    starts = range(0, frame_count, CHUNK_SIZE)
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(starts))
+
+    totals = np.zeros(4, dtype=np.int64)
+    with ProcessPoolExecutor(workers or os.cpu_count() or 1) as executor:
+        futures = [
+            executor.submit(
+                write_chunk,
+                output_dir,
+                annotators,
+                start,
+                min(start + CHUNK_SIZE, frame_count),
+                options,
+                seed_sequence,
+            )
+            for start, seed_sequence in zip(starts, seed_sequences)
+        ]
+        for future in futures:
+            totals += future.result()
+            if progress_fn is not None:
+                progress_fn(int(totals[0]))
+    return tuple(int(total) for total in totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir", help="Folder to write the dataset to")
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[20], help="Boxes per frame, or a min and max")
+    parser.add_argument("--annotators", nargs="+", choices=["tight", "loose"], default=["tight"])
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--classes", type=int, default=5)
+    parser.add_argument(
+        "--missing-labels", type=float, default=0.0, help="Fraction of frames without annotations and of label keys"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    min_boxes, max_boxes = args.boxes[0], args.boxes[-1]
+    start = time.perf_counter()
+
+    def report(frames_written):
+        seconds = time.perf_counter() - start
+        print(f"\r{frames_written}/{args.frames} frames, {frames_written / seconds:.0f} frames/s", end="", flush=True)
+
+    frames, boxes, missing, missing_keys = generate_dataset(
+        args.output_dir,
+        args.frames,
+        min_boxes,
+        max_boxes,
+        tuple(args.annotators),
+        args.width,
+        args.height,
+        args.classes,
+        args.missing_labels,
+        args.workers,
+        args.seed,
+        report,
+    )
+    print(
+        f"\nWrote {frames} frames with {boxes} boxes ({missing} without annotations, "
+        f"{missing_keys} label keys left out) to "
+        f"{args.output_dir} in {time.perf_counter() - start:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+Headless test setup. The tests of the Kit-free modules run under pytest without the
+package __init__, which loads the extension and therefore Kit. Inside Kit they are
+run by omni.kit.test, which imports them through tests/__init__.py.
+"""
+import os
+import sys
+import types
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "edgeimpulse", "dataingestion")
+
+
+def register_package(name, path):
+    if name not in sys.modules:
+        module = types.ModuleType(name)
+        module.__path__ = [path]
+        sys.modules[name] = module
+
+
+# pytest imports the tests as dataingestion.tests.*, edgeimpulse/ being the first
+# folder without an __init__
+register_package("dataingestion", PACKAGE_DIR)
+register_package("dataingestion.tests", os.path.join(PACKAGE_DIR, "tests"))
@@ -0,0 +1,168 @@
+import os
+
+# extensions of the candidate frames, the images of the data folder
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+class FrameScore:
+    """
+    How much a frame would teach the model: its score is between 0 (the model already
+    gets it right, with confidence) and 1, the counts explain it in the logs.
+    """
+
+    def __init__(self, score, misses=0, label_errors=0, false_positives=0, confidence=None):
+        self.score = score
+        self.misses = misses
+        self.label_errors = label_errors
+        self.false_positives = false_positives
+        self.confidence = confidence
+
+    def reasons(self):
+        reasons = []
+        if self.misses:
+            reasons.append(f"{self.misses} missed")
+        if self.label_errors:
+            reasons.append(f"{self.label_errors} wrong labels")
+        if self.false_positives:
+            reasons.append(f"{self.false_positives} false positives")
+        if self.confidence is not None:
+            reasons.append(f"confidence {self.confidence:.2f}")
+        return ", ".join(reasons)
+
+
+def box_center_inside(prediction, box):
+    center_x = prediction["x"] + prediction["width"] / 2
+    center_y = prediction["y"] + prediction["height"] / 2
+    return box["x"] <= center_x <= box["x"] + box["width"] and box["y"] <= center_y <= box["y"] + box["height"]
+
+
+def box_iou(a, b):
+    width = min(a["x"] + a["width"], b["x"] + b["width"]) - max(a["x"], b["x"])
+    height = min(a["y"] + a["height"], b["y"] + b["height"]) - max(a["y"], b["y"])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    union = a["width"] * a["height"] + b["width"] * b["height"] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def score_frame(predictions, ground_truth=None, min_iou=0.0):
+    """
+    Score a frame from the predictions of the model and its Replicator ground truth.
+    Args:
+        predictions (list): Model results in image pixels, with label and value, plus
+            x, y, width and height for object detection.
+        ground_truth (list): bounding_boxes.labels entries of the frame, or None if
+            the frame has no labels.
+        min_iou (float): Overlap a prediction needs with a ground truth box, on top of
+            its center lying in the box, to detect it. 0 suits FOMO, whose predictions
+            are grid cells smaller than the objects.
+    Returns:
+        FrameScore: The score of the frame.
+    """
+    if predictions and "x" not in predictions[0]:
+        return score_classification(predictions, ground_truth)
+
+    # Predictions near the detection threshold are the least certain
+    confidence = min((prediction["value"] for prediction in predictions), default=None)
+    uncertainty = 1 - confidence if confidence is not None else 0.0
+    if not ground_truth:
+        # Without labels every prediction of an empty frame is a false positive
+        false_positives = len(predictions) if ground_truth is not None else 0
+        error = 1.0 if false_positives else 0.0
+        return FrameScore(max(error, uncertainty), false_positives=false_positives, confidence=confidence)
+
+    misses = 0
+    label_errors = 0
+    for box in ground_truth:
+        overlapping = [
+            prediction
+            for prediction in predictions
+            if box_center_inside(prediction, box) and box_iou(prediction, box) >= min_iou
+        ]
+        if not overlapping:
+            misses += 1
+        elif not any(prediction["label"] == box["label"] for prediction in overlapping):
+            label_errors += 1
+
+    # Several FOMO cells can detect one object, only predictions outside of every
+    # ground truth box are false positives
+    false_positives = sum(
+        1 for prediction in predictions if not any(box_center_inside(prediction, box) for box in ground_truth)
+    )
+
+    error = (misses + label_errors + false_positives) / (len(ground_truth) + false_positives)
+    return FrameScore(max(error, uncertainty), misses, label_errors, false_positives, confidence)
+
+
+def score_classification(predictions, ground_truth=None):
+    # Margin between the two most likely classes, small margins are uncertain
+    values = sorted((prediction["value"] for prediction in predictions), reverse=True)
+    top_label = max(predictions, key=lambda prediction: prediction["value"])["label"]
+    margin = values[0] - (values[1] if len(values) > 1 else 0.0)
+
+    label_errors = 0
+    if ground_truth:
+        # The labels of the boxes of the frame are all acceptable classes
+        label_errors = int(top_label not in {box["label"] for box in ground_truth})
+    return FrameScore(max(float(label_errors), 1 - margin), label_errors=label_errors, confidence=values[0])
+
+
+def select_frames(scores, budget, min_score):
+    """
+    Pick the frames worth uploading.
+    Args:
+        scores (dict): Frame name to its FrameScore.
+        budget (int): Maximum number of frames, 0 for no limit.
+        min_score (float): Frames scoring below it are left out.
+    Returns:
+        list: The names of the selected frames, highest scores first.
+    """
+    ranked = sorted(
+        (name for name, frame_score in scores.items() if frame_score.score >= min_score),
+        key=lambda name: scores[name].score,
+        reverse=True,
+    )
+    return ranked[:budget] if budget > 0 else ranked
+
+
+async def select_uncertain_frames(
+    classifier, data_path, bounding_boxes, log_fn, budget=0, min_score=0.0, min_iou=0.0, job=None
+):
+    """
+    Run the model on the images of data_path and select the ones it gets wrong or is
+    unsure about, for an upload limited to them.
+    Args:
+        classifier (Classifier): Runs the deployed model, see Classifier.predict_images.
+        bounding_boxes (dict): Image name to its bounding_boxes.labels entries, or None
+            to score the images on the confidence of the model only.
+        log_fn (callable): Receives the progress messages.
+        job (Job): Reports the progress and can pause or cancel the scoring.
+    Returns:
+        list: The names of the selected images, or None if the model could not run.
+    """
+    image_names = sorted(name for name in os.listdir(data_path) if name.lower().endswith(IMAGE_EXTENSIONS))
+    log_fn(f"Active learning: running the model on {len(image_names)} frames...")
+    predictions = await classifier.predict_images([os.path.join(data_path, name) for name in image_names], job=job)
+    if predictions is None:
+        log_fn("Error: Active learning needs the deployed model, nothing was uploaded")
+        return None
+
+    scores = {}
+    for name in image_names:
+        image_predictions = predictions.get(os.path.join(data_path, name))
+        if image_predictions is None:
+            # Frames the model failed on are worth a look
+            scores[name] = FrameScore(1.0)
+            continue
+        ground_truth = bounding_boxes.get(name) if bounding_boxes is not None else None
+        scores[name] = score_frame(image_predictions, ground_truth, min_iou)
+
+    selected = select_frames(scores, budget, min_score)
+    for name in selected[:10]:
+        log_fn(f"{name}: score {scores[name].score:.2f}, {scores[name].reasons() or 'no prediction'}")
+    log_fn(
+        f"Success: Active learning selected {len(selected)} of {len(image_names)} frames "
+        f"(score >= {min_score:g}{f', budget {budget}' if budget > 0 else ''})"
+    )
+    return selected
@@ -0,0 +1,518 @@
+import asyncio
+import os
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from .inference_result import (
+    ERROR_PREFIX,
+    RESULT_PREFIX,
+    RUNNER_PATH,
+    InferenceResultError,
+    parse_inference_output,
+)
+from .profiling import profiler
+
+# ITU-R BT.601 luma weights, used by Edge Impulse to convert RGB frames to grayscale
+GRAYSCALE_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+# Minimum score for a FOMO cell or an SSD detection to be reported
+DETECTION_THRESHOLD = 0.5
+
+BACKEND_NAMES = ["node", "tflite", "onnx"]
+
+# numpy types of the ONNX input tensor types, float for the others
+ONNX_INPUT_TYPES = {"tensor(float)": np.float32, "tensor(uint8)": np.uint8, "tensor(int8)": np.int8}
+
+# Failures in a row after which the bundled runner is given up for run-impulse.js
+MAX_RUNNER_FAILURES = 3
+
+# Seconds the bundled runner gets to exit once its stdin is closed
+RUNNER_STOP_TIMEOUT = 2
+
+
+class InferenceBackendError(Exception):
+    pass
+
+
+class InferenceBackend:
+    """
+    Runs the impulse on preprocessed frames. Results use the same structure as the
+    NodeJS runner: {"results": [...], "anomaly": ..., "timing": {...}} with boxes in
+    model input pixels.
+    """
+
+    # Whether the backend runs the WebAssembly deployment downloaded from Studio
+    uses_deployment = False
+
+    def __init__(self, executor, log_fn):
+        self.executor = executor
+        self.log_fn = log_fn
+        self.model_version = None
+
+    def load(self, model_dir=None):
+        """Load the model, raising InferenceBackendError if it is not usable."""
+        raise NotImplementedError
+
+    async def infer(self, processed_frame):
+        """Run the model on a PreprocessedFrame on the worker pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.run, processed_frame)
+
+    def run(self, processed_frame):
+        raise NotImplementedError
+
+    async def warm_up(self):
+        """Prepare the backend for the first frame, after load."""
+        pass
+
+    def close(self):
+        pass
+
+
+class BundledRunner:
+    """
+    One process of the bundled runner. It loads the model once and classifies the
+    frames sent on its stdin one at a time, the lock keeps a single frame in flight.
+    """
+
+    # Command of the runner, run in the node folder of the deployment
+    command = ["node", RUNNER_PATH, "--serve"]
+
+    def __init__(self, script_dir):
+        self.script_dir = script_dir
+        self.process = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            self.__ensure_process()
+
+    def stop(self):
+        with self.lock:
+            self.__stop_process()
+
+    def run(self, features):
+        """Classify one features string, returning the result line of the runner."""
+        with self.lock, profiler.span("node_runner", "classify"):
+            process = self.__ensure_process()
+            logs = []
+            try:
+                process.stdin.write(features + "\n")
+                process.stdin.flush()
+                for line in process.stdout:
+                    if line.startswith(RESULT_PREFIX):
+                        return line
+                    if line.startswith(ERROR_PREFIX):
+                        raise InferenceBackendError(line[len(ERROR_PREFIX) :].strip())
+                    logs.append(line)
+            except OSError as e:
+                logs.append(str(e))
+
+            # The runner exited, the next frame starts a new one
+            self.__stop_process()
+            raise InferenceBackendError(f"Bundled runner exited: {''.join(logs).strip()}")
+
+    def __ensure_process(self):
+        if self.process is not None and self.process.poll() is None:
+            return self.process
+        self.__stop_process()
+        try:
+            # The logs of the deployment share stdout with the results, see run
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                cwd=self.script_dir,
+            )
+        except OSError as e:
+            raise InferenceBackendError(f"Could not start the bundled runner: {e}")
+        return self.process
+
+    def __stop_process(self):
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            # Closing stdin ends the request loop of the runner
+            process.stdin.close()
+            process.wait(timeout=RUNNER_STOP_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+
+class NodeBackend(InferenceBackend):
+    """
+    Runs the WebAssembly deployment with NodeJS. A pool of bundled runners, up to one
+    per worker thread, is kept running so the model is loaded once per runner and
+    concurrent frames are classified in parallel; the run-impulse.js script of the
+    deployment, started per frame, is the fallback.
+    """
+
+    uses_deployment = True
+
+    def __init__(self, executor, log_fn):
+        super().__init__(executor, log_fn)
+        self.script_dir = None
+        self.use_bundled_runner = True
+        self.runner_failures = 0
+        # ThreadPoolExecutor does not expose its size, more runners would stay idle
+        self.max_runners = getattr(executor, "_max_workers", None) or 1
+        self.runners = []
+        # Reused last in first out, so the runners that are already warm are reused
+        self.idle_runners = []
+        self.runners_condition = threading.Condition()
+
+    def load(self, model_dir=None):
+        runner_path = os.path.join(model_dir, "node", "run-impulse.js")
+        if not os.path.isfile(runner_path):
+            raise InferenceBackendError(f"Model runner not found at {runner_path}")
+        self.close()
+        self.script_dir = os.path.join(model_dir, "node")
+        self.model_version = os.path.basename(model_dir)
+        self.use_bundled_runner = True
+        self.runner_failures = 0
+
+    async def warm_up(self):
+        """Start a runner, which loads the model while the first frame is captured.
+        The other runners are started when frames are classified concurrently."""
+        if self.use_bundled_runner:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, self.__start_runner)
+
+    async def infer(self, processed_frame):
+        if self.use_bundled_runner:
+            loop = asyncio.get_running_loop()
+            try:
+                stdout = await loop.run_in_executor(self.executor, self.__run_runner, processed_frame.features)
+            except InferenceBackendError as e:
+                self.__runner_failed(e)
+            else:
+                self.runner_failures = 0
+                return self.__parse(stdout)
+
+        return await self.__run_fallback(processed_frame)
+
+    def close(self):
+        with self.runners_condition:
+            runners, self.runners = self.runners, []
+            self.idle_runners = []
+            self.runners_condition.notify_all()
+        # Waits for the frames in flight, their runners are dropped once released
+        for runner in runners:
+            runner.stop()
+
+    def __runner_failed(self, error):
+        # Fall back for this frame only, a runner that keeps failing is given up
+        # until the next model is loaded
+        self.runner_failures += 1
+        if self.runner_failures < MAX_RUNNER_FAILURES:
+            self.log_fn(f"Warning: Bundled runner failed, using run-impulse.js for this frame: {error}")
+            return
+        self.log_fn(
+            f"Warning: Bundled runner failed {self.runner_failures} times in a row, "
+            f"falling back to run-impulse.js: {error}"
+        )
+        self.use_bundled_runner = False
+        self.close()
+
+    def __parse(self, stdout):
+        try:
+            with profiler.span("parse_result", "classify"):
+                return parse_inference_output(stdout)
+        except InferenceResultError as e:
+            self.log_fn(f"{stdout}")
+            raise InferenceBackendError(str(e))
+
+    def __acquire_runner(self):
+        # An idle runner, else a new one while the pool is not full, else wait for one
+        with self.runners_condition:
+            while True:
+                if self.idle_runners:
+                    return self.idle_runners.pop()
+                if len(self.runners) < self.max_runners:
+                    runner = BundledRunner(self.script_dir)
+                    self.runners.append(runner)
+                    return runner
+                self.runners_condition.wait()
+
+    def __release_runner(self, runner):
+        with self.runners_condition:
+            if runner in self.runners:
+                self.idle_runners.append(runner)
+                self.runners_condition.notify()
+                return
+        # The pool was closed while the runner was in use
+        runner.stop()
+
+    def __start_runner(self):
+        runner = self.__acquire_runner()
+        try:
+            runner.start()
+        finally:
+            self.__release_runner(runner)
+
+    def __run_runner(self, features):
+        runner = self.__acquire_runner()
+        try:
+            return runner.run(features)
+        finally:
+            self.__release_runner(runner)
+
+    async def __run_fallback(self, processed_frame):
+        loop = asyncio.get_running_loop()
+        # Building the features string is not free, keep it off the event loop
+        features_file = await loop.run_in_executor(
+            self.executor, save_features, processed_frame.features
+        )
+        try:
+            process_result = await self.__run_subprocess(["node", "run-impulse.js", features_file])
+        finally:
+            os.remove(features_file)
+
+        if process_result.returncode != 0:
+            raise InferenceBackendError(f"Classification failed: {process_result.stderr}")
+        return self.__parse(process_result.stdout)
+
+    async def __run_subprocess(self, command):
+        """Run the given subprocess command on the worker pool and capture its output."""
+        loop = asyncio.get_running_loop()
+
+        def subprocess_run():
+            with profiler.span("node_subprocess", "classify", command=" ".join(command[:2])):
+                return subprocess.run(
+                    command,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    cwd=self.script_dir,
+                )
+
+        return await loop.run_in_executor(self.executor, subprocess_run)
+
+
+class LocalModelBackend(InferenceBackend):
+    """
+    Base for backends running a model file in-process on CPU. Class labels are read from
+    a labels.txt file next to the model, one label per line.
+    """
+
+    def __init__(self, model_path, executor, log_fn):
+        super().__init__(executor, log_fn)
+        self.model_path = model_path
+        self.labels = []
+        # Sessions are not thread-safe, each worker thread gets its own
+        self.thread_local = threading.local()
+
+    def load(self, model_dir=None):
+        if not self.model_path or not os.path.isfile(self.model_path):
+            raise InferenceBackendError(f"Model file not found at {self.model_path}")
+
+        labels_path = os.path.join(os.path.dirname(self.model_path), "labels.txt")
+        if os.path.isfile(labels_path):
+            with open(labels_path, "r") as f:
+                self.labels = [line.strip() for line in f if line.strip()]
+
+        mtime = int(os.path.getmtime(self.model_path))
+        self.model_version = f"{os.path.basename(self.model_path)}-{mtime}"
+        # Create the session of the calling thread to validate the model
+        self.session()
+
+    def session(self):
+        session = getattr(self.thread_local, "session", None)
+        if session is None:
+            session = self.create_session()
+            self.thread_local.session = session
+        return session
+
+    def create_session(self):
+        raise NotImplementedError
+
+    def run(self, processed_frame):
+        pixels = unpack_pixels(processed_frame.packed_pixels)
+
+        start = time.perf_counter()
+        with profiler.span("invoke", "classify", model=os.path.basename(self.model_path)):
+            outputs = self.invoke(pixels)
+        classification_ms = (time.perf_counter() - start) * 1e3
+
+        height, width = processed_frame.packed_pixels.shape
+        with profiler.span("parse_result", "classify"):
+            output_dict = decode_outputs(outputs, self.labels, width, height)
+        output_dict["timing"] = {"classification": classification_ms, "total": classification_ms}
+        return output_dict
+
+    def invoke(self, pixels):
+        """Run the model on HxWx3 uint8 pixels and return the output tensors."""
+        raise NotImplementedError
+
+
+class TFLiteBackend(LocalModelBackend):
+    """Runs a .tflite model with tflite_runtime, or TensorFlow Lite if it is not installed."""
+
+    def create_session(self):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError:
+                raise InferenceBackendError(
+                    "The tflite backend requires the tflite-runtime or tensorflow package"
+                )
+
+        interpreter = Interpreter(model_path=self.model_path, num_threads=1)
+        interpreter.allocate_tensors()
+        return interpreter
+
+    def invoke(self, pixels):
+        interpreter = self.session()
+        input_details = interpreter.get_input_details()[0]
+        interpreter.set_tensor(input_details["index"], prepare_input(pixels, input_details))
+        interpreter.invoke()
+        outputs = []
+        for output_details in interpreter.get_output_details():
+            output = interpreter.get_tensor(output_details["index"])
+            scale, zero_point = output_details.get("quantization", (0.0, 0))
+            if scale:
+                output = (output.astype(np.float32) - zero_point) * scale
+            outputs.append(output)
+        return outputs
+
+
+class ONNXBackend(LocalModelBackend):
+    """Runs an .onnx model with onnxruntime."""
+
+    def create_session(self):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise InferenceBackendError("The onnx backend requires the onnxruntime package")
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = 1
+        return onnxruntime.InferenceSession(
+            self.model_path, options, providers=["CPUExecutionProvider"]
+        )
+
+    def invoke(self, pixels):
+        session = self.session()
+        model_input = session.get_inputs()[0]
+        shape = model_input.shape
+        # Channels first models take NCHW input
+        channels_first = len(shape) == 4 and shape[1] in (1, 3) and shape[3] not in (1, 3)
+        input_details = {
+            "dtype": ONNX_INPUT_TYPES.get(model_input.type, np.float32),
+            "shape": [1, shape[2], shape[3], shape[1]] if channels_first else shape,
+        }
+        input_data = prepare_input(pixels, input_details)
+        if channels_first:
+            input_data = np.ascontiguousarray(input_data.transpose(0, 3, 1, 2))
+        return session.run(None, {model_input.name: input_data})
+
+
+@profiler.traced("save_features", "classify")
+def save_features(features_str):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt", mode="w+t") as tmp_file:
+        tmp_file.write(features_str)
+        return tmp_file.name
+
+
+def unpack_pixels(packed_pixels):
+    """Unpack 0xRRGGBB integers into HxWx3 uint8 pixels."""
+    return np.stack(
+        [(packed_pixels >> 16) & 0xFF, (packed_pixels >> 8) & 0xFF, packed_pixels & 0xFF],
+        axis=-1,
+    ).astype(np.uint8)
+
+
+def prepare_input(pixels, input_details):
+    """Scale and quantize HxWx3 uint8 pixels for a 1xHxWxC model input, like the impulse does."""
+    values = pixels.astype(np.float32)
+    if input_details["shape"][-1] == 1:
+        # Same luminance as the grayscale conversion of the image DSP block
+        values = (values @ GRAYSCALE_WEIGHTS)[..., np.newaxis]
+
+    dtype = input_details["dtype"]
+    scale, zero_point = input_details.get("quantization", (0.0, 0))
+    if dtype in (np.int8, np.uint8):
+        info = np.iinfo(dtype)
+        # Quantized inputs take the 0-1 values, other integer inputs the raw pixels
+        values = values / 255.0 / scale + zero_point if scale else values
+        values = np.clip(np.round(values), info.min, info.max)
+    else:
+        values = values / 255.0
+    return values.astype(dtype)[np.newaxis, ...]
+
+
+def decode_outputs(outputs, labels, width, height):
+    """
+    Decode the raw model outputs into results. Supports classification (one 1xN output),
+    FOMO (one 1xHxWxN heatmap, background first) and SSD (boxes, classes, scores, count).
+    """
+
+    def label_of(index):
+        return labels[index] if index < len(labels) else str(index)
+
+    if len(outputs) >= 3:
+        boxes, classes, scores = (np.asarray(o)[0] for o in outputs[:3])
+        results = []
+        for (y_min, x_min, y_max, x_max), class_id, score in zip(boxes, classes, scores):
+            if score < DETECTION_THRESHOLD:
+                continue
+            results.append({
+                "label": label_of(int(class_id)),
+                "value": float(score),
+                "x": round(float(x_min) * width),
+                "y": round(float(y_min) * height),
+                "width": round(float(x_max - x_min) * width),
+                "height": round(float(y_max - y_min) * height),
+            })
+        return {"results": results}
+
+    output = np.asarray(outputs[0])[0]
+    if output.ndim == 3:
+        grid_height, grid_width, _ = output.shape
+        cell_width, cell_height = width / grid_width, height / grid_height
+        # Skip the background class, report every cell above the threshold
+        rows, cols, class_ids = np.nonzero(output[..., 1:] >= DETECTION_THRESHOLD)
+        results = [
+            {
+                "label": label_of(int(class_id)),
+                "value": float(output[row, col, class_id + 1]),
+                "x": round(col * cell_width),
+                "y": round(row * cell_height),
+                "width": round(cell_width),
+                "height": round(cell_height),
+            }
+            for row, col, class_id in zip(rows, cols, class_ids)
+        ]
+        return {"results": results}
+
+    return {
+        "results": [
+            {"label": label_of(index), "value": float(value)}
+            for index, value in enumerate(output.ravel())
+        ]
+    }
+
+
+def create_inference_backend(name, model_path, executor, log_fn):
+    """
+    Create an inference backend.
+    Args:
+        name (str): One of BACKEND_NAMES.
+        model_path (str): Model file for the in-process backends.
+    """
+    if name == "tflite":
+        return TFLiteBackend(model_path, executor, log_fn)
+    if name == "onnx":
+        return ONNXBackend(model_path, executor, log_fn)
+    return NodeBackend(executor, log_fn)
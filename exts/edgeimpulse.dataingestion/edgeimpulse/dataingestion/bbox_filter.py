@@ -0,0 +1,87 @@
+from collections import Counter
+
+import numpy as np
+
+
+class BoxFilter:
+    """
+    Drops, clips and renames the boxes of one frame before they are exported, working
+    on whole columns of the Replicator structured array.
+    """
+
+    def __init__(self, min_area=1, max_occlusion=1.0, clip_to_image=True, class_map=None, image_size=None):
+        """
+        Args:
+            min_area (int): Boxes whose exported width * height is below this are dropped.
+            max_occlusion (float): Boxes with a larger occlusionRatio are dropped. Unknown
+                ratios (negative or NaN) are kept.
+            clip_to_image (bool): Clip the boxes to image_size.
+            class_map (dict): Renames classes, several classes mapped to the same name are
+                merged and classes mapped to an empty name are dropped.
+            image_size (tuple): (width, height) of the rgb images, clipping is skipped if None.
+        """
+        self.min_area = min_area
+        self.max_occlusion = max_occlusion
+        self.clip_to_image = clip_to_image
+        self.class_map = dict(class_map or {})
+        self.image_size = image_size
+
+    def signature(self):
+        """Return a JSON-serializable description of the filter, cached labels are only
+        reused when it did not change."""
+        return [
+            self.min_area,
+            self.max_occlusion,
+            self.clip_to_image,
+            [list(item) for item in sorted(self.class_map.items())],
+            list(self.image_size) if self.image_size else None,
+        ]
+
+    def apply(self, bounding_boxes, classes):
+        """
+        Filter the boxes of one frame.
+        Args:
+            bounding_boxes (np.ndarray): Structured array in the bounding_box_2d_* layout.
+            classes (np.ndarray): Object array with the class of each box.
+        Returns:
+            tuple: The kept boxes (a copy, clipped), their classes after class_map, and a
+                dict with the number of dropped boxes per original class.
+        """
+        keep = np.ones(len(bounding_boxes), dtype=bool)
+        mapped_classes = classes
+        if self.class_map and len(classes):
+            # map each distinct class once
+            unique_classes, inverse = np.unique(classes.astype(str), return_inverse=True)
+            mapped_unique = np.array(
+                [self.class_map.get(name, name) for name in unique_classes.tolist()], dtype=object
+            )
+            mapped_classes = mapped_unique[inverse.reshape(-1)]
+            keep &= mapped_classes != ""
+
+        x_min = bounding_boxes["x_min"].astype(np.int64)
+        y_min = bounding_boxes["y_min"].astype(np.int64)
+        x_max = bounding_boxes["x_max"].astype(np.int64)
+        y_max = bounding_boxes["y_max"].astype(np.int64)
+        if self.clip_to_image and self.image_size:
+            # x_max/y_max are inclusive, boxes fully off-image collapse to zero area
+            width, height = self.image_size
+            np.clip(x_min, 0, width - 1, out=x_min)
+            np.clip(x_max, 0, width - 1, out=x_max)
+            np.clip(y_min, 0, height - 1, out=y_min)
+            np.clip(y_max, 0, height - 1, out=y_max)
+
+        area = np.maximum(x_max - x_min, 0) * np.maximum(y_max - y_min, 0)
+        keep &= area >= self.min_area
+
+        if self.max_occlusion is not None and "occlusionRatio" in (bounding_boxes.dtype.names or ()):
+            # NaN compares False, so boxes without occlusion information are kept
+            keep &= ~(bounding_boxes["occlusionRatio"] > self.max_occlusion)
+
+        dropped = Counter(classes[~keep].tolist())
+
+        filtered = np.asarray(bounding_boxes)[keep]
+        filtered["x_min"] = x_min[keep]
+        filtered["y_min"] = y_min[keep]
+        filtered["x_max"] = x_max[keep]
+        filtered["y_max"] = y_max[keep]
+        return filtered, mapped_classes[keep], dict(dropped)
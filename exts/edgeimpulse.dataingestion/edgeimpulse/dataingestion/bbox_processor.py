@@ -1,79 +1,295 @@
 import json
+import multiprocessing
+import os
 import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
-# creates bounding_boxes.labels file with bounding box data inside rgb folder
-def process_files(bounding_box_dir, rgb_dir, log_callback):
-    log_callback(f"Creating bounding_boxes.labels file...")
+from PIL import Image
 
-    bounding_box_dir = Path(bounding_box_dir)
-    rgb_dir = Path(rgb_dir)
+from .jobs import JobCancelled
+from .segmentation_processor import SEGMENTATION_LABEL_FILES, load_segmentation_boxes
 
-    # extract bbox type from bbox path (either tight or loose)
-    bounding_box_dir_name = bounding_box_dir.name
-    if bounding_box_dir_name.startswith("bounding_box_2d_"):
-        label_type = bounding_box_dir_name.replace("bounding_box_2d_", "")
-    else:
-        raise ValueError(f"Invalid bounding box directory name: {bounding_box_dir_name}")
+# number of processed files between two progress messages
+PROGRESS_INTERVAL = 500
 
-    # data structure for bounding_boxes.labels
-    bounding_boxes_labels_data = {"version": 1, "type": "bounding-box-labels", "boundingBoxes": {}}
+# fields of the structured arrays written by the bounding_box_2d_* annotators
+BOUNDING_BOX_FIELDS = ("semanticId", "x_min", "y_min", "x_max", "y_max", "occlusionRatio")
 
-    # load npy files
-    npy_files = [f for f in bounding_box_dir.iterdir() if f.suffix == ".npy"]
+# bump when the cached entries change, older caches are then ignored
+LABEL_CACHE_VERSION = 3
 
-    for npy_file in npy_files:
-        file_number = npy_file.stem.split("_")[-1]
+# converts the boxes of one frame to bounding_boxes.labels entries, working on whole
+# columns of the structured array instead of box by box. Returns the entries and the
+# number of boxes dropped by box_filter per class.
+def convert_bounding_boxes(bounding_boxes, labels, log_callback, box_filter=None):
+    if len(bounding_boxes) == 0:
+        return [], {}
 
-        # load bbox data
-        bounding_boxes = np.load(npy_file, allow_pickle=True)
+    # id-to-class table, the labels json of Replicator is keyed by semanticId
+    semantic_ids, inverse = np.unique(bounding_boxes["semanticId"], return_inverse=True)
+    id_classes = np.empty(len(semantic_ids), dtype=object)
+    id_has_label = np.zeros(len(semantic_ids), dtype=bool)
+    for index, semantic_id in enumerate(semantic_ids.tolist()):
+        value = labels.get(str(semantic_id))
+        if value is None:
+            log_callback(f"Warning: Missing label for semanticId {semantic_id}. Skipping.")
+            continue
+        id_classes[index] = value["class"]
+        id_has_label[index] = True
 
-        # load labels from json
-        json_label_file = f"bounding_box_2d_{label_type}_labels_{file_number}.json"
-        json_label_path = bounding_box_dir / json_label_file
-        with open(json_label_path, "r") as f:
-            labels = json.load(f)
+    # skip the bounding boxes whose semanticId has no label
+    inverse = inverse.reshape(-1)
+    has_label = id_has_label[inverse]
+    bounding_boxes = bounding_boxes[has_label]
+    classes = id_classes[inverse[has_label]]
 
-        # load unique rgb file path
-        rgb_image_file = f"rgb_{file_number}.png"
+    dropped = {}
+    if box_filter is not None:
+        bounding_boxes, classes, dropped = box_filter.apply(bounding_boxes, classes)
 
-        # prepare bbox data for bounding_boxes.labels
-        bounding_boxes_entry = []
-        for i, bbox in enumerate(bounding_boxes):
-            key = str(i)
-            if key not in labels:
-                log_callback(f"Warning: Missing label for key {key}. Skipping.")
-                continue  # skip this bounding box if the key is missing 
+    x_max = bounding_boxes["x_max"]
+    y_max = bounding_boxes["y_max"]
+    x_min = bounding_boxes["x_min"].astype(np.int64)
+    y_min = bounding_boxes["y_min"].astype(np.int64)
+    width = (x_max - x_min.astype(x_max.dtype)).astype(np.int64)
+    height = (y_max - y_min.astype(y_max.dtype)).astype(np.int64)
 
-            label = labels[str(i)]["class"]
-            x_min = int(bbox["x_min"])
-            y_min = int(bbox["y_min"])
-            width = int(bbox["x_max"] - x_min)
-            height = int(bbox["y_max"] - y_min)
+    entries = [
+        {"label": label, "x": x, "y": y, "width": w, "height": h}
+        for label, x, y, w, h in zip(
+            classes.tolist(),
+            x_min.tolist(),
+            y_min.tolist(),
+            width.tolist(),
+            height.tolist(),
+        )
+    ]
+    return entries, dropped
 
-            # add bbox to entry structure
-            bounding_box_dict = {"label": label, "x": x_min, "y": y_min, "width": width, "height": height}
-            bounding_boxes_entry.append(bounding_box_dict)
+# memory-maps a Replicator bounding box array with pickle disabled, so scanning a
+# dataset only pages in the columns that are read and cannot execute code
+def load_bounding_boxes(npy_file):
+    bounding_boxes = np.load(npy_file, mmap_mode="r", allow_pickle=False)
 
-        # add entry to bounding_boxes.labels structure
-        bounding_boxes_labels_data["boundingBoxes"][rgb_image_file] = bounding_boxes_entry
+    field_names = bounding_boxes.dtype.names or ()
+    missing_fields = [name for name in BOUNDING_BOX_FIELDS if name not in field_names]
+    if bounding_boxes.ndim != 1 or missing_fields:
+        raise ValueError(
+            f"Invalid bounding box array in {npy_file}: expected a structured array with "
+            f"fields {', '.join(BOUNDING_BOX_FIELDS)}, missing {', '.join(missing_fields) or 'none'}"
+        )
+    return bounding_boxes
 
-    # write bounding_boxes.labels file to the same directory as the rgb files
-    bounding_boxes_labels_path = rgb_dir / "bounding_boxes.labels"
-    with open(bounding_boxes_labels_path, "w") as f:
-        json.dump(bounding_boxes_labels_data, f, indent=4)
+# parses one frame file and its labels json, runs in the worker pool so it returns
+# its warnings instead of logging them. Invalid frames are skipped and left out of
+# the labels. Segmentation masks are reduced to boxes first.
+def process_frame(frame_file, json_label_path, box_filter=None):
+    file_number = frame_file.stem.split("_")[-1]
 
-    log_callback(f"Success: bounding_boxes.labels file in {rgb_dir}")
+    # load unique rgb file path
+    rgb_image_file = f"rgb_{file_number}.png"
 
-# deletes bounding_boxes.labels that was created by the above program
-def post_process_files(rgb_dir, log_callback):
-    log_callback(f"Deleting bounding_boxes.labels file from {rgb_dir}...")
+    try:
+        if frame_file.name.startswith("bounding_box_2d_"):
+            # load bbox data and labels from json
+            bounding_boxes = load_bounding_boxes(frame_file)
+            with open(json_label_path, "r") as f:
+                labels = json.load(f)
+        else:
+            bounding_boxes, labels = load_segmentation_boxes(frame_file, json_label_path)
+    except ValueError as e:
+        return rgb_image_file, None, {}, [f"Warning: {e}. Skipping."]
 
-    rgb_dir = Path(rgb_dir)
-    bounding_boxes_labels_path = rgb_dir / "bounding_boxes.labels"
+    # prepare bbox data for bounding_boxes.labels
+    warnings = []
+    bounding_boxes_entry, dropped = convert_bounding_boxes(
+        bounding_boxes, labels, warnings.append, box_filter
+    )
+    return rgb_image_file, bounding_boxes_entry, dropped, warnings
+
+# threads by default: worker processes are only used with the fork start method, a
+# spawned worker would have to import the extension package (and Kit) to run
+# process_frame. Forking the Kit process itself is not recommended either.
+def create_executor(max_workers, use_processes=False):
+    if use_processes and "fork" in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("fork"))
+    return ThreadPoolExecutor(max_workers)
+
+# loads the per-frame label cache, keyed by frame path. Entries hold the frame/json
+# mtimes and sizes they were parsed from, so changed frames are parsed again. The
+# whole cache is dropped when the box filter changed.
+def load_label_cache(cache_path, filter_signature=None):
+    if cache_path is None or not os.path.isfile(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != LABEL_CACHE_VERSION or cache.get("filter") != filter_signature:
+        return {}
+    return cache.get("frames", {})
+
+# writes the label cache next to its final location, then renames it so a crash
+# never leaves a truncated cache behind
+def save_label_cache(cache_path, frames, filter_signature=None):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(
+            {"version": LABEL_CACHE_VERSION, "filter": filter_signature, "frames": frames},
+            f,
+            separators=(",", ":"),
+        )
+    os.replace(tmp_path, cache_path)
 
-    if bounding_boxes_labels_path.exists():
-        bounding_boxes_labels_path.unlink()
-        log_callback(f"Success: Deleted bounding_boxes.labels file from {rgb_dir}")
+# lists the frame files of an annotator directory with the labels json of each frame:
+# bounding_box_2d_{tight,loose}_NNNN.npy, or instance/semantic segmentation masks
+# saved as .npy ids or colorized .png
+def find_frame_files(bounding_box_dir):
+    dir_name = bounding_box_dir.name
+    if dir_name.startswith("bounding_box_2d_"):
+        frame_files = [f for f in bounding_box_dir.iterdir() if f.suffix == ".npy"]
+        label_file_pattern = f"{dir_name}_labels_{{}}.json"
+    elif dir_name in SEGMENTATION_LABEL_FILES:
+        frame_files = [
+            f
+            for f in bounding_box_dir.iterdir()
+            if f.suffix in (".npy", ".png") and f.stem[len(dir_name) + 1 :].isdigit()
+        ]
+        label_file_pattern = SEGMENTATION_LABEL_FILES[dir_name]
     else:
-        log_callback(f"No bounding_boxes.labels file found in {rgb_dir}")
\ No newline at end of file
+        raise ValueError(
+            f"Invalid bounding box directory name: {dir_name}, expected bounding_box_2d_tight, "
+            f"bounding_box_2d_loose, {' or '.join(SEGMENTATION_LABEL_FILES)}"
+        )
+
+    json_label_paths = [
+        bounding_box_dir / label_file_pattern.format(frame_file.stem.split("_")[-1])
+        for frame_file in frame_files
+    ]
+    return frame_files, json_label_paths
+
+# reads the resolution of the rgb images from the header of the first one, Replicator
+# renders a whole dataset at the same resolution
+def find_image_size(rgb_dir):
+    for rgb_file in rgb_dir.glob("rgb_*.png"):
+        with Image.open(rgb_file) as image:
+            return image.size
+    return None
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+# reads the bounding boxes of a Replicator dataset into a map of rgb image name to its
+# bounding_boxes.labels entries, nothing is written to the rgb folder. With a
+# cache_path, only the frames that are new or changed since the last run are parsed.
+# With a box_filter, boxes are filtered, clipped and renamed before being exported.
+# With a job, parsing reports its progress and stops when the job is cancelled.
+def process_files(
+    bounding_box_dir,
+    rgb_dir,
+    log_callback,
+    max_workers=None,
+    use_processes=False,
+    cache_path=None,
+    box_filter=None,
+    job=None,
+):
+    log_callback(f"Reading bounding boxes from {bounding_box_dir}...")
+
+    bounding_box_dir = Path(bounding_box_dir)
+    rgb_dir = Path(rgb_dir)
+
+    # bounding box arrays or segmentation masks, depending on the annotator
+    frame_files, json_label_paths = find_frame_files(bounding_box_dir)
+
+    filter_signature = None
+    if box_filter is not None:
+        if box_filter.clip_to_image and box_filter.image_size is None:
+            box_filter.image_size = find_image_size(rgb_dir)
+        filter_signature = box_filter.signature()
+
+    # reuse the frames whose frame and json files did not change
+    cached_frames = load_label_cache(cache_path, filter_signature)
+    frames = [None] * len(frame_files)
+    stale_indices = []
+    for index, (frame_file, json_label_path) in enumerate(zip(frame_files, json_label_paths)):
+        signature = file_signature(frame_file) + file_signature(json_label_path)
+        cached_frame = cached_frames.get(str(frame_file))
+        if cached_frame is not None and cached_frame["signature"] == signature:
+            frames[index] = cached_frame
+        else:
+            frames[index] = {"signature": signature}
+            stale_indices.append(index)
+
+    if cache_path is not None:
+        log_callback(
+            f"Reusing {len(frame_files) - len(stale_indices)} cached frames, parsing {len(stale_indices)}"
+        )
+
+    # parse the frames in parallel, results are merged in the original order
+    file_count = len(stale_indices)
+    max_workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, file_count // (max_workers * 8))
+    with create_executor(max_workers, use_processes) as executor:
+        results = executor.map(
+            process_frame,
+            [frame_files[index] for index in stale_indices],
+            [json_label_paths[index] for index in stale_indices],
+            [box_filter] * file_count,
+            chunksize=chunksize,
+        )
+
+        for count, (index, result) in enumerate(zip(stale_indices, results)):
+            rgb_image_file, bounding_boxes_entry, dropped, warnings = result
+            frames[index].update(
+                {
+                    "image": rgb_image_file,
+                    "boxes": bounding_boxes_entry,
+                    "dropped": dropped,
+                    "warnings": warnings,
+                }
+            )
+
+            if (count + 1) % PROGRESS_INTERVAL == 0:
+                log_callback(f"Processed {count + 1}/{file_count} bounding box files")
+
+            if job is not None:
+                job.set_progress(count + 1, file_count)
+                try:
+                    job.check()
+                except JobCancelled:
+                    # do not wait for the frames that are still queued
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    raise
+
+    dropped = Counter()
+    for frame in frames:
+        for warning in frame["warnings"]:
+            log_callback(warning)
+        dropped.update(frame["dropped"])
+
+    if dropped:
+        log_callback(
+            f"Filtered out {sum(dropped.values())} boxes: "
+            + ", ".join(f"{label} {count}" for label, count in dropped.most_common())
+        )
+
+    # the cache only changes when frames were parsed or removed since the last run
+    reused_count = len(frame_files) - len(stale_indices)
+    if cache_path is not None and (stale_indices or len(cached_frames) != reused_count):
+        save_label_cache(
+            cache_path,
+            {str(frame_file): frame for frame_file, frame in zip(frame_files, frames)},
+            filter_signature,
+        )
+
+    # frames with an invalid array are left out
+    bounding_boxes = {frame["image"]: frame["boxes"] for frame in frames if frame["boxes"] is not None}
+
+    log_callback(f"Success: Read bounding boxes of {len(bounding_boxes)} images")
+    return bounding_boxes
@@ -0,0 +1,134 @@
+import ctypes
+
+import numpy as np
+import omni.isaac.core.utils.viewports as vp
+import omni.kit.app
+from omni.kit.widget.viewport.capture import ByteCapture
+
+# Resolution of the render products created for cameras that have no viewport
+DEFAULT_CAMERA_RESOLUTION = (1280, 720)
+
+
+class ViewportFrameSource:
+    """Captures the rendered frame of a viewport window."""
+
+    def __init__(self, viewport_index):
+        self.viewport_index = viewport_index
+        self.name = f"Viewport {viewport_index}"
+
+    async def capture(self):
+        """
+        Capture the current frame.
+        Returns:
+            np.ndarray: HxWx4 uint8 RGBA frame, or None if the capture failed.
+        """
+        frames = []
+
+        def on_capture_completed(buffer, buffer_size, width, height, format):
+            image_size = width * height * 4
+            ctypes.pythonapi.PyCapsule_GetPointer.restype = ctypes.POINTER(
+                ctypes.c_byte * image_size
+            )
+            ctypes.pythonapi.PyCapsule_GetPointer.argtypes = [
+                ctypes.py_object,
+                ctypes.c_char_p,
+            ]
+            content = ctypes.pythonapi.PyCapsule_GetPointer(buffer, None)
+            pointer = ctypes.cast(content, ctypes.POINTER(ctypes.c_byte * image_size))
+            np_arr = np.ctypeslib.as_array(pointer.contents)
+            # Copy the pixels out of the capture buffer, it is released after the callback
+            frames.append(np_arr.view(np.uint8).reshape(height, width, 4).copy())
+
+        viewport_window_id = vp.get_id_from_index(self.viewport_index)
+        viewport_window = vp.get_window_from_id(viewport_window_id)
+        if viewport_window is None:
+            return None
+        viewport_api = viewport_window.viewport_api
+
+        capture_delegate = ByteCapture(on_capture_completed)
+        capture = viewport_api.schedule_capture(capture_delegate)
+        await capture.wait_for_result()
+
+        return frames[0] if frames else None
+
+    def destroy(self):
+        pass
+
+
+class CameraFrameSource:
+    """Captures a camera prim through a dedicated render product and an rgb annotator."""
+
+    def __init__(self, camera_path, resolution=DEFAULT_CAMERA_RESOLUTION, name=None):
+        import omni.replicator.core as rep
+
+        self.camera_path = camera_path
+        self.name = name or camera_path
+        self.resolution = resolution
+        self.render_product = rep.create.render_product(camera_path, resolution)
+        self.annotator = rep.AnnotatorRegistry.get_annotator("rgb")
+        self.annotator.attach([self.render_product])
+
+    async def capture(self):
+        """
+        Capture the current frame.
+        Returns:
+            np.ndarray: HxWx4 uint8 RGBA frame, or None if the capture failed.
+        """
+        app = omni.kit.app.get_app()
+        # The annotator is filled on the next rendered frames after it is attached
+        for _ in range(3):
+            await app.next_update_async()
+            data = self.annotator.get_data()
+            if data is not None and data.size > 0:
+                return np.ascontiguousarray(data, dtype=np.uint8)
+        return None
+
+    def destroy(self):
+        self.annotator.detach([self.render_product])
+        self.render_product.destroy()
+
+
+def parse_frame_source_specs(specs):
+    """
+    Parse the comma separated list of frame sources to classify.
+    Args:
+        specs (str): Viewport indices (e.g. "0") and/or camera prim paths (e.g. "/World/Camera").
+    Returns:
+        list: The unique source specs, in order. Defaults to the first viewport.
+    """
+    parsed = []
+    for spec in (specs or "").split(","):
+        spec = spec.strip()
+        if spec and spec not in parsed:
+            parsed.append(spec)
+    return parsed or ["0"]
+
+
+def create_frame_source(spec, preprocessor=None):
+    """
+    Create a frame source from a viewport index or a camera prim path.
+    Args:
+        spec (str): Viewport index or camera prim path.
+        preprocessor (ImagePreprocessor): If set, render at the impulse input size
+            (with a margin) instead of the viewport or default camera resolution.
+    """
+    if spec.isdigit():
+        viewport_index = int(spec)
+        if preprocessor is None:
+            return ViewportFrameSource(viewport_index)
+
+        # Render the viewport camera through a small dedicated render product, the
+        # readback, copies and resize then scale with the impulse input size
+        viewport_window = vp.get_window_from_id(vp.get_id_from_index(viewport_index))
+        viewport_api = viewport_window.viewport_api
+        width, height = viewport_api.resolution
+        return CameraFrameSource(
+            str(viewport_api.camera_path),
+            preprocessor.capture_resolution(width / height),
+            name=f"Viewport {viewport_index}",
+        )
+
+    if preprocessor is None:
+        return CameraFrameSource(spec)
+    width, height = DEFAULT_CAMERA_RESOLUTION
+    return CameraFrameSource(spec, preprocessor.capture_resolution(width / height))
@@ -1,18 +1,18 @@
 import asyncio
-import subprocess
 import uuid
 from enum import Enum, auto
 import os
 import tempfile
 import shutil
-import numpy as np
-import glob
-from omni.kit.widget.viewport.capture import ByteCapture
-import omni.isaac.core.utils.viewports as vp
-import ctypes
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from concurrent.futures import ThreadPoolExecutor
-import yaml
+from .capture import create_frame_source
+from .backends import InferenceBackendError, create_inference_backend
+from .inference_result import format_timing
+from .overlay import OverlayRenderer
+from .preprocessing import ImagePreprocessor, ResizeMode
+from .profiling import profiler
+from .result_cache import ResultCache
 from .utils import get_models_directory, is_node_installed
 
 
@@ -22,30 +22,58 @@ class ClassifierError(Enum):
     FAILED_TO_RETRIEVE_PROJECT_ID = auto()
     MODEL_DEPLOYMENT_NOT_AVAILABLE = auto()
     FAILED_TO_DOWNLOAD_MODEL = auto()
+    INVALID_MODEL = auto()
     FAILED_TO_PROCESS_VIEWPORT = auto()
     FAILED_TO_PROCESS_CLASSIFY_RESULT = auto()
 
 
 class Classifier:
     def __init__(
-        self, rest_client, project_id, impulse_image_height, impulse_image_width, log_fn
+        self,
+        rest_client,
+        project_id,
+        impulse_image_height,
+        impulse_image_width,
+        log_fn,
+        resize_mode=ResizeMode.SQUASH,
+        save_output_image=False,
+        backend_name="node",
+        local_model_path=None,
+        impulse_channel_count=3,
     ):
         self.rest_client = rest_client
         self.project_id = project_id
         self.model_ready = False
+        self.model_dir = None
         self.model_path = os.path.expanduser(f"{get_models_directory()}/model.zip")
-        self.featuresTmpFile = None
         self.log_fn = log_fn
         self.impulse_image_height = impulse_image_height
         self.impulse_image_width = impulse_image_width
-        self.image = None
-        self.original_width = None
-        self.original_height = None
-        self.new_width = None
-        self.new_height = None
+        self.preprocessor = ImagePreprocessor(
+            impulse_image_width, impulse_image_height, resize_mode, impulse_channel_count
+        )
+        self.save_output_image = save_output_image
+        self.result_cache = ResultCache()
         self.output_image_path = None
+        self.frame_sources = {}
+        # Every selected spec, including those whose frame source could not be created
+        self.frame_source_specs = []
+        self.capture_at_input_size = False
+        self.overlay_renderers = {}
+        # Long-lived worker pool shared by the preprocessing and the inference
+        # of all frame sources
+        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        self.backend = create_inference_backend(
+            backend_name, local_model_path, self.executor, log_fn
+        )
 
+    @profiler.traced("check_and_update_model", "classify")
     async def __check_and_update_model(self):
+        # In-process backends run a local model file, there is nothing to download
+        if not self.backend.uses_deployment:
+            self.log_fn(f"Loading local model {self.backend.model_path}")
+            return self.__validate_model(None)
+
         if not is_node_installed():
             self.log_fn("Error: NodeJS not installed")
             return ClassifierError.NODEJS_NOT_INSTALLED
@@ -62,8 +90,7 @@ class Classifier:
         # Check if the model directory exists and its version
         if os.path.exists(model_dir):
             self.log_fn("Latest model version already downloaded.")
-            self.model_ready = True
-            return ClassifierError.SUCCESS
+            return self.__validate_model(model_dir)
 
         # If the model directory for the current version does not exist, delete old versions and download the new one
         self.__delete_old_models(os.path.dirname(self.model_path), model_dir_name)
@@ -71,13 +98,25 @@ class Classifier:
         model_content = await self.rest_client.download_model(self.project_id)
         if model_content is not None:
             self.__save_model(model_content, model_dir)
-            self.model_ready = True
-            self.log_fn("Model is ready for classification.")
-            return ClassifierError.SUCCESS
+            return self.__validate_model(model_dir)
         else:
             self.log_fn("Error: Failed to download the model")
             return ClassifierError.FAILED_TO_DOWNLOAD_MODEL
 
+    def __validate_model(self, model_dir):
+        try:
+            self.backend.load(model_dir)
+        except InferenceBackendError as e:
+            self.log_fn(f"Error: {e}")
+            if model_dir:
+                shutil.rmtree(model_dir, ignore_errors=True)
+            return ClassifierError.INVALID_MODEL
+
+        self.model_dir = model_dir
+        self.model_ready = True
+        self.log_fn("Model is ready for classification.")
+        return ClassifierError.SUCCESS
+
     def __delete_old_models(self, parent_dir, exclude_dir_name):
         for dirname in os.listdir(parent_dir):
             if dirname.startswith("ei-model-") and dirname != exclude_dir_name:
@@ -100,279 +139,232 @@ class Classifier:
         os.remove(model_zip_path)
         self.log_fn(f"Model extracted to {model_dir}")
 
-    def __resize_image_and_extract_features(
-        self, image, target_width, target_height, channel_count
-    ):
-        # Resize the image
-        self.image = image.resize(
-            (target_width, target_height), Image.Resampling.LANCZOS
-        )
-
-        # Convert the image to the required color space
-        if channel_count == 3:  # RGB
-            self.image = self.image.convert("RGB")
-            img_array = np.array(self.image)
-            # Extract RGB features as hexadecimal values
-            features = [
-                "0x{:02x}{:02x}{:02x}".format(*pixel)
-                for pixel in img_array.reshape(-1, 3)
-            ]
-        elif channel_count == 1:  # Grayscale
-            self.image = self.image.convert("L")
-            img_array = np.array(self.image)
-            # Repeat the grayscale values to mimic the RGB structure
-            features = [
-                "0x{:02x}{:02x}{:02x}".format(pixel, pixel, pixel)
-                for pixel in img_array.flatten()
-            ]
-
-        return {
-            "features": features,
-            "originalWidth": image.width,
-            "originalHeight": image.height,
-            "newWidth": target_width,
-            "newHeight": target_height,
-        }
-
-    async def __capture_and_process_image(self):
-        def on_capture_completed(buffer, buffer_size, width, height, format):
-            try:
-                image_size = width * height * 4
-                ctypes.pythonapi.PyCapsule_GetPointer.restype = ctypes.POINTER(
-                    ctypes.c_byte * image_size
-                )
-                ctypes.pythonapi.PyCapsule_GetPointer.argtypes = [
-                    ctypes.py_object,
-                    ctypes.c_char_p,
-                ]
-                content = ctypes.pythonapi.PyCapsule_GetPointer(buffer, None)
-                pointer = ctypes.cast(
-                    content, ctypes.POINTER(ctypes.c_byte * image_size)
-                )
-                np_arr = np.ctypeslib.as_array(pointer.contents)
-                image = Image.frombytes("RGBA", (width, height), np_arr.tobytes())
-                self.image = image
-
-                # Directly use the image for resizing and feature extraction
-                target_width = self.impulse_image_width
-                target_height = self.impulse_image_height
-                channel_count = 3  # 3 for RGB, 1 for grayscale
-
-                resized_info = self.__resize_image_and_extract_features(
-                    image, target_width, target_height, channel_count
-                )
-                features = resized_info["features"]
-                features_str = ",".join(features)
-
-                self.original_width = resized_info["originalWidth"]
-                self.original_height = resized_info["originalHeight"]
-                self.new_width = resized_info["newWidth"]
-                self.new_height = resized_info["newHeight"]
-
+    def set_frame_sources(self, specs):
+        """
+        Select the viewports and cameras to classify.
+        Args:
+            specs (list): Viewport indices and/or camera prim paths, as strings.
+        """
+        self.frame_source_specs = list(specs)
+        for spec in list(self.frame_sources):
+            if spec not in specs:
+                self.frame_sources.pop(spec).destroy()
+                self.overlay_renderers.pop(spec, None)
+
+        for spec in specs:
+            if spec not in self.frame_sources:
                 try:
-                    with tempfile.NamedTemporaryFile(
-                        delete=False, suffix=".txt", mode="w+t"
-                    ) as tmp_file:
-                        tmp_file.write(features_str)
-                        self.featuresTmpFile = tmp_file.name
-                        self.log_fn(f"Features saved to {tmp_file.name}")
+                    self.frame_sources[spec] = create_frame_source(
+                        spec, self.preprocessor if self.capture_at_input_size else None
+                    )
+                    self.overlay_renderers[spec] = OverlayRenderer()
                 except Exception as e:
-                    self.log_fn(f"Error: Failed to save features to file: {e}")
+                    self.log_fn(f"Error: Failed to create frame source {spec}: {e}")
+
+    def set_capture_at_input_size(self, enabled):
+        """Render the frame sources at the impulse input size instead of full resolution."""
+        if enabled == self.capture_at_input_size:
+            return
+        specs = self.frame_source_specs
+        self.set_frame_sources([])
+        self.capture_at_input_size = enabled
+        self.set_frame_sources(specs)
+
+    async def __capture_and_process_image(self, spec):
+        source = self.frame_sources[spec]
+        with profiler.span("capture", "classify", source=source.name):
+            frame = await source.capture()
+        if frame is None:
+            self.log_fn(f"Error: Failed to capture {source.name}")
+            return None
+
+        def process():
+            # The PIL image shares the memory of the captured frame
+            height, width = frame.shape[:2]
+            image = Image.frombuffer("RGBA", (width, height), frame, "raw", "RGBA", 0, 1)
+            # Resize according to the impulse resize mode, keeping the transform
+            # to draw the results on the full resolution frame
+            with profiler.span("preprocess", "classify", source=source.name):
+                return self.preprocessor.process(image)
 
-            except Exception as e:
-                self.log_fn(f"Error: Failed to process and save image: {e}")
-
-        viewport_window_id = vp.get_id_from_index(0)
-        viewport_window = vp.get_window_from_id(viewport_window_id)
-        viewport_api = viewport_window.viewport_api
-
-        capture_delegate = ByteCapture(on_capture_completed)
-        capture = viewport_api.schedule_capture(capture_delegate)
-
-        await capture.wait_for_result()
-
-    async def __run_subprocess(self, command, cwd):
-        """Run the given subprocess command in a thread pool and capture its output."""
         loop = asyncio.get_running_loop()
-
-        def subprocess_run():
-            # Execute the command and capture output
-            return subprocess.run(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=cwd,
-            )
-
-        with ThreadPoolExecutor() as pool:
-            # Run the blocking operation in the executor
-            result = await loop.run_in_executor(pool, subprocess_run)
+        try:
+            processed_frame = await loop.run_in_executor(self.executor, process)
+        except Exception as e:
+            self.log_fn(f"Error: Failed to process image: {e}")
+            return None
+        return frame, processed_frame
+
+    async def warm_up(self):
+        """
+        Prefetch and validate the model, start the inference runner and run a dummy
+        inference, so that the model is loaded before the first real classification.
+        """
+        self.log_fn("Checking and updating model...")
+        result = await self.__check_and_update_model()
+        if result != ClassifierError.SUCCESS:
+            self.log_fn(f"Failed to update model: {result.name}")
             return result
 
-    # TODO The logic to normalize bouding boxes is not right, so we simply display
-    #      the boxes on the resized image directly
-    def __normalize_bounding_boxes(self, bounding_boxes):
-        orig_factor = self.original_width / self.original_height
-        new_factor = self.new_width / self.new_height
-
-        if orig_factor > new_factor:
-            # Boxed in with bands top/bottom
-            factor = self.new_width / self.original_width
-            offset_x = 0
-            offset_y = (self.new_height - (self.original_height * factor)) / 2
-        elif orig_factor < new_factor:
-            # Boxed in with bands left/right
-            factor = self.new_height / self.original_height
-            offset_x = (self.new_width - (self.original_width * factor)) / 2
-            offset_y = 0
+        self.log_fn("Warming up inference worker...")
+        try:
+            await self.backend.warm_up()
+            await self.backend.infer(self.preprocessor.blank_frame())
+        except InferenceBackendError as e:
+            self.log_fn(f"Warning: Warm-up inference failed: {e}")
         else:
-            # Image was already at the right aspect ratio
-            factor = self.new_width / self.original_width
-            offset_x = 0
-            offset_y = 0
-
-        # Adjust bounding boxes
-        for bb in bounding_boxes:
-            bb["x"] = round((bb["x"] - offset_x) / factor)
-            bb["width"] = round(bb["width"] / factor)
-            bb["y"] = round((bb["y"] - offset_y) / factor)
-            bb["height"] = round(bb["height"] / factor)
-
-        return bounding_boxes
+            self.log_fn("Inference worker is ready.")
+        return ClassifierError.SUCCESS
+
+    async def predict_images(self, image_paths, batch_size=None, job=None):
+        """
+        Run the model on image files, e.g. the frames of a dataset before uploading it.
+        Args:
+            image_paths (list): Paths of the images.
+            batch_size (int): Images preprocessed and classified at the same time, one
+                per worker thread by default.
+            job (Job): Gets the progress, and can pause or cancel between batches.
+        Returns:
+            dict: Image path to its results in image pixels, or None if the model is
+            not available. Images that could not be classified are left out.
+        """
+        if not self.model_ready:
+            self.log_fn("Checking and updating model...")
+            result = await self.__check_and_update_model()
+            if result != ClassifierError.SUCCESS:
+                self.log_fn(f"Failed to update model: {result.name}")
+                return None
+
+        batch_size = batch_size or os.cpu_count() or 1
+        loop = asyncio.get_running_loop()
 
-    def __draw_bounding_boxes_and_save(self, bounding_boxes):
-        draw = ImageDraw.Draw(self.image)
+        def load(image_path):
+            with Image.open(image_path) as image:
+                return self.preprocessor.process(image.convert("RGB"))
 
-        try:
-            font = ImageFont.truetype("arial.ttf", 10)
-        except IOError:
-            font = ImageFont.load_default()
-            print("Custom font not found. Using default font.")
-
-        # Loop through the bounding boxes and draw them along with labels and confidence values
-        for box in bounding_boxes:
-            x, y, width, height = box["x"], box["y"], box["width"], box["height"]
-            label = box["label"]
-            confidence = box["value"]
-
-            # Draw the bounding box rectangle
-            draw.rectangle(((x, y), (x + width, y + height)), outline="red", width=2)
-
-            # Prepare the label text with confidence
-            label_text = f"{label} ({confidence:.2f})"
-
-            # Calculate the text position to appear above the bounding box
-            text_bbox = draw.textbbox((0, 0), label_text, font=font)  # Get text bounding box
-            text_width = text_bbox[2] - text_bbox[0]  # Width of the text
-            text_height = text_bbox[3] - text_bbox[1]  # Height of the text
-
-            text_x = x + 5  # A small offset from the left edge of the bounding box
-            text_y = y - text_height  # Above the bounding box with a small offset
-
-            # Ensure the text is not drawn outside the image
-            if text_y < 0:
-                text_y = y + height + 5  # Below the bounding box if there is no space above
-
-            # Draw the text background
-            draw.rectangle(
-                ((text_x - 2, text_y), (text_x + text_width + 2, text_y + text_height)),
-                fill="red",
+        async def predict(image_path):
+            try:
+                processed_frame = await loop.run_in_executor(self.executor, load, image_path)
+                output_dict = await self.backend.infer(processed_frame)
+            except (OSError, InferenceBackendError) as e:
+                self.log_fn(f"Warning: Failed to classify {image_path}: {e}")
+                return None
+            if "results" not in output_dict:
+                self.log_fn(f"Warning: No results for {image_path}")
+                return None
+            return processed_frame.transform.to_frame(output_dict["results"])
+
+        predictions = {}
+        for start in range(0, len(image_paths), batch_size):
+            if job is not None:
+                await job.checkpoint()
+            batch = image_paths[start : start + batch_size]
+            with profiler.span("predict_batch", "classify", size=len(batch)):
+                results = await asyncio.gather(*(predict(image_path) for image_path in batch))
+            for image_path, image_results in zip(batch, results):
+                if image_results is not None:
+                    predictions[image_path] = image_results
+            if job is not None:
+                job.set_progress(start + len(batch), len(image_paths))
+        return predictions
+
+    def shutdown(self):
+        self.set_frame_sources([])
+        self.backend.close()
+        self.executor.shutdown(wait=False)
+
+    @profiler.traced("draw_overlay", "classify")
+    def __draw_overlay(self, spec, frame, transform, bounding_boxes):
+        overlay_renderer = self.overlay_renderers[spec]
+        overlay = overlay_renderer.render(frame, transform.to_frame(bounding_boxes))
+
+        # Writing the overlay to disk is opt-in, the UI reads it from memory
+        if self.save_output_image:
+            random_file_name = f"captured_with_bboxes_{uuid.uuid4()}.png"
+            self.output_image_path = os.path.join(tempfile.gettempdir(), random_file_name)
+            overlay_renderer.save(self.output_image_path)
+            self.log_fn(
+                f"Image with bounding boxes and labels saved at {self.output_image_path}"
             )
+        return overlay
+
+    async def classify_frame_sources(self):
+        """
+        Capture all the selected frame sources and classify them concurrently.
+        Returns:
+            dict: Source spec to a (ClassifierError, overlay) tuple.
+        """
+        # The model is usually already prefetched by warm_up()
+        if not self.model_ready:
+            self.log_fn("Checking and updating model...")
+            result = await self.__check_and_update_model()
+            if result != ClassifierError.SUCCESS:
+                self.log_fn(f"Failed to update model: {result.name}")
+                return {spec: (result, None) for spec in self.frame_sources}
+
+        if self.backend.uses_deployment:
+            if not self.model_dir or not os.path.exists(self.model_dir):
+                self.log_fn("No model directory found.")
+                self.model_ready = False
+                return {
+                    spec: (ClassifierError.FAILED_TO_DOWNLOAD_MODEL, None)
+                    for spec in self.frame_sources
+                }
+            self.log_fn(f"Using latest model directory: {self.model_dir}")
+
+        # Retry the frame sources that failed, e.g. a viewport opened since then
+        self.set_frame_sources(self.frame_source_specs)
+        if not self.frame_sources:
+            self.log_fn(
+                "Error: No frame source to classify, check the viewport indices and camera "
+                f"prim paths: {', '.join(self.frame_source_specs) or 'none selected'}"
+            )
+            return {}
 
-            # Draw the label text with confidence
-            draw.text((text_x, text_y), label_text, fill="white", font=font)
-
-        # Save the image
-        random_file_name = f"captured_with_bboxes_{uuid.uuid4()}.png"
-        self.output_image_path = os.path.join(tempfile.gettempdir(), random_file_name)
-        self.image.save(self.output_image_path)
-        self.log_fn(
-            f"Image with bounding boxes and labels saved at {self.output_image_path}"
+        specs = list(self.frame_sources)
+        results = await asyncio.gather(
+            *[self.__classify_frame_source(spec) for spec in specs]
         )
-
-    async def classify(self):
-        self.log_fn("Checking and updating model...")
-        result = await self.__check_and_update_model()
-        if result != ClassifierError.SUCCESS:
-            self.log_fn(f"Failed to update model: {result.name}")
-            return result, None  # Return None or an empty list for the bounding boxes
-
-        self.log_fn("Capturing and processing image...")
-        await self.__capture_and_process_image()
+        self.log_fn(self.result_cache.stats())
+        return dict(zip(specs, results))
+
+    async def __classify_frame_source(self, spec):
+        name = self.frame_sources[spec].name
+        self.log_fn(f"Capturing and processing {name}...")
+        captured = await self.__capture_and_process_image(spec)
+        if captured is None:
+            return ClassifierError.FAILED_TO_PROCESS_VIEWPORT, None
+        frame, processed_frame = captured
+        transform = processed_frame.transform
+
+        # Unchanged scenes give the same model input, reuse the previous result
+        model_version = self.backend.model_version
+        features_hash = processed_frame.features_hash
+        bounding_boxes = self.result_cache.get(model_version, features_hash)
+        if bounding_boxes is not None:
+            self.log_fn(f"{name}: scene unchanged, using cached result")
+            overlay = self.__draw_overlay(spec, frame, transform, bounding_boxes)
+            return ClassifierError.SUCCESS, overlay
 
         try:
-            model_dirs = glob.glob(
-                os.path.join(os.path.dirname(self.model_path), "ei-model-*")
-            )
-            if model_dirs:
-                latest_model_dir = max(model_dirs, key=os.path.getctime)
-                self.log_fn(f"Using latest model directory: {latest_model_dir}")
-
-                if self.featuresTmpFile:
-                    script_dir = os.path.join(latest_model_dir, "node")
-                    self.log_fn(f"Running inference on {self.featuresTmpFile}")
-                    command = ["node", "run-impulse.js", self.featuresTmpFile]
-
-                    # Run subprocess and capture its output
-                    process_result = await self.__run_subprocess(command, script_dir)
-
-                    if process_result.returncode == 0:
-                        self.log_fn(f"{process_result.stdout}")
-                        # Attempt to find the start of the JSON content
-                        try:
-                            json_start_index = process_result.stdout.find("{")
-                            if json_start_index == -1:
-                                self.log_fn(
-                                    "Error: No JSON content found in subprocess output."
-                                )
-                                return (
-                                    ClassifierError.FAILED_TO_PROCESS_CLASSIFY_RESULT,
-                                    None,
-                                )
-
-                            json_content = process_result.stdout[json_start_index:]
-
-                            # Use YAML loader to parse the JSON content. We cannot use json directly
-                            # because the result of running run-impulse.js is not a well formed JSON
-                            # (i.e. missing double quotes in names)
-                            output_dict = yaml.load(
-                                json_content, Loader=yaml.SafeLoader
-                            )
-
-                            if "results" in output_dict:
-                                output_dict["bounding_boxes"] = output_dict.pop(
-                                    "results"
-                                )
-                                self.__draw_bounding_boxes_and_save(
-                                    output_dict["bounding_boxes"]
-                                )
-                                return (
-                                    ClassifierError.SUCCESS,
-                                    self.output_image_path,
-                                )
-                            else:
-                                self.log_fn(
-                                    "Error: classifier output does not contain 'results' key."
-                                )
-                                return (
-                                    ClassifierError.FAILED_TO_PROCESS_CLASSIFY_RESULT,
-                                    None,
-                                )
-                        except yaml.YAMLError as e:
-                            self.log_fn(
-                                f"Error parsing classification results with YAML: {e}"
-                            )
-                            return (
-                                ClassifierError.FAILED_TO_PROCESS_CLASSIFY_RESULT,
-                                None,
-                            )
-                    else:
-                        self.log_fn(f"Classification failed: {process_result.stderr}")
-                        return ClassifierError.FAILED_TO_PROCESS_CLASSIFY_RESULT, None
-            else:
-                self.log_fn("No model directory found.")
-                return ClassifierError.FAILED_TO_DOWNLOAD_MODEL, None
-        except subprocess.CalledProcessError as e:
-            self.log_fn(f"Error executing model classification: {e.stderr}")
-            return ClassifierError.FAILED_TO_DOWNLOAD_MODEL, None
+            self.log_fn(f"Running inference on {name}")
+            with profiler.span("infer", "classify", source=name):
+                output_dict = await self.backend.infer(processed_frame)
+        except InferenceBackendError as e:
+            self.log_fn(f"Error: {name}: {e}")
+            return ClassifierError.FAILED_TO_PROCESS_CLASSIFY_RESULT, None
+
+        timing = format_timing(output_dict)
+        if timing:
+            self.log_fn(f"{name}: {timing}")
+
+        if "results" not in output_dict:
+            self.log_fn("Error: classifier output does not contain 'results' key.")
+            return ClassifierError.FAILED_TO_PROCESS_CLASSIFY_RESULT, None
+
+        output_dict["bounding_boxes"] = output_dict.pop("results")
+        self.result_cache.put(model_version, features_hash, output_dict["bounding_boxes"])
+        overlay = self.__draw_overlay(
+            spec, frame, transform, output_dict["bounding_boxes"]
+        )
+        return ClassifierError.SUCCESS, overlay
@@ -1,5 +1,3 @@
-import httpx
-
 from .impulse import Impulse
 from .deployment import DeploymentInfo
 
@@ -9,9 +7,15 @@ class EdgeImpulseRestClient:
         self.base_url = "https://studio.edgeimpulse.com/v1/api/"
         self.headers = {"x-api-key": project_api_key}
 
+    def create_client(self):
+        # httpx is only imported once the first request is made
+        import httpx
+
+        return httpx.AsyncClient()
+
     async def get_project_info(self):
         """Asynchronously retrieves the project info."""
-        async with httpx.AsyncClient() as client:
+        async with self.create_client() as client:
             response = await client.get(
                 f"{self.base_url}projects", headers=self.headers
             )
@@ -23,7 +27,7 @@ class EdgeImpulseRestClient:
 
     async def get_deployment_info(self, project_id):
         """Asynchronously retrieves deployment information, including version."""
-        async with httpx.AsyncClient() as client:
+        async with self.create_client() as client:
             response = await client.get(
                 f"{self.base_url}{project_id}/deployment?type=wasm&engine=tflite",
                 headers=self.headers,
@@ -42,7 +46,7 @@ class EdgeImpulseRestClient:
 
     async def download_model(self, project_id):
         """Asynchronously downloads the model."""
-        async with httpx.AsyncClient() as client:
+        async with self.create_client() as client:
             response = await client.get(
                 f"{self.base_url}{project_id}/deployment/download?type=wasm&engine=tflite",
                 headers=self.headers,
@@ -54,7 +58,7 @@ class EdgeImpulseRestClient:
 
     async def get_impulse(self, project_id):
         """Asynchronously fetches the impulse details and returns an Impulse object or None"""
-        async with httpx.AsyncClient() as client:
+        async with self.create_client() as client:
             response = await client.get(
                 f"{self.base_url}{project_id}/impulse",
                 headers=self.headers,
@@ -63,19 +67,40 @@ class EdgeImpulseRestClient:
                 data = response.json()
                 if "impulse" in data and data["impulse"].get("inputBlocks"):
                     first_input_block = data["impulse"]["inputBlocks"][0]
+                    channel_count = await self.__get_image_channel_count(
+                        client, project_id, data["impulse"].get("dspBlocks", [])
+                    )
                     return Impulse(
                         input_type=first_input_block.get("type"),
                         image_width=first_input_block.get("imageWidth"),
                         image_height=first_input_block.get("imageHeight"),
+                        resize_mode=first_input_block.get("resizeMode"),
+                        channel_count=channel_count,
                     )
                 else:
                     return None
             else:
                 return None
 
+    async def __get_image_channel_count(self, client, project_id, dsp_blocks):
+        """Reads the color depth of the image block of the impulse, 1 for grayscale and 3 for RGB"""
+        image_block = next((block for block in dsp_blocks if block.get("type") == "image"), None)
+        if image_block is None:
+            return 3
+        response = await client.get(
+            f"{self.base_url}{project_id}/dsp/{image_block['id']}/config",
+            headers=self.headers,
+        )
+        if response.status_code == 200 and response.json().get("success"):
+            for group in response.json().get("config", []):
+                for item in group.get("items", []):
+                    if item.get("param") == "channels":
+                        return 1 if item.get("value") == "Grayscale" else 3
+        return 3
+
     async def get_samples_count(self, project_id, category="training"):
         """Asynchronously fetches the number of samples ingested for a specific category"""
-        async with httpx.AsyncClient() as client:
+        async with self.create_client() as client:
             response = await client.get(
                 f"{self.base_url}{project_id}/raw-data/count?category={category}",
                 headers=self.headers,
@@ -1,20 +1,66 @@
+import contextlib
 import os
 import json
+import threading
 
 from .state import State
 
+# config.json used to be written to the current working directory of Kit
+LEGACY_CONFIG_FILE = "config.json"
+
+# seconds without changes before pending changes are written to disk
+FLUSH_DELAY = 0.5
+
 
 class Config:
-    def __init__(self, config_file="config.json"):
+    """
+    Extension settings persisted as JSON in the Kit data directory. Changes are written
+    on a background timer once they stop coming in, and grouped with batch().
+    """
+
+    def __init__(self, config_file=None, flush_delay=FLUSH_DELAY):
+        if config_file is None:
+            # utils reads the Kit settings, only needed for the default location
+            from .utils import get_data_directory
+
+            config_file = os.path.join(get_data_directory(), "config.json")
         self.config_file = config_file
+        self.flush_delay = flush_delay
+        self.lock = threading.RLock()
+        self.batch_depth = 0
+        self.dirty = False
+        self.flush_timer = None
         self.config_data = self.load_config()
 
     def load_config(self):
         if os.path.exists(self.config_file):
-            with open(self.config_file, "r") as file:
-                return json.load(file)
+            return self.read_config_file(self.config_file)
+
+        # Migrate the config written by previous versions next to the working directory
+        if os.path.exists(LEGACY_CONFIG_FILE):
+            config_data = self.read_config_file(LEGACY_CONFIG_FILE)
+            if config_data:
+                print(f"Migrating {os.path.abspath(LEGACY_CONFIG_FILE)} to {self.config_file}")
+                self.write_config_file(config_data)
+            return config_data
         return {}
 
+    def read_config_file(self, path):
+        try:
+            with open(path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            print(f"Failed to read config file {path}: {e}")
+            return {}
+
+    def write_config_file(self, config_data):
+        # Write next to the config file and rename it, a crash never leaves a truncated file
+        os.makedirs(os.path.dirname(os.path.abspath(self.config_file)), exist_ok=True)
+        tmp_file = f"{self.config_file}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump(config_data, file)
+        os.replace(tmp_file, self.config_file)
+
     def print_config_info(self):
         """Prints the path and content of the configuration file."""
         print(f"Config file path: {self.config_file}")
@@ -22,14 +68,53 @@ class Config:
         print(json.dumps(self.config_data, indent=4))
 
     def save_config(self):
-        with open(self.config_file, "w") as file:
-            json.dump(self.config_data, file)
+        """Write pending changes to disk now."""
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+                self.flush_timer = None
+            if not self.dirty:
+                return
+            self.write_config_file(self.config_data)
+            self.dirty = False
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Group several set() calls, they are written in a single flush once the
+        outermost batch exits."""
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                if self.batch_depth == 0 and self.dirty:
+                    self.schedule_flush()
+
+    def schedule_flush(self):
+        # Every change restarts the timer, so bursts of changes are written once
+        with self.lock:
+            if self.flush_timer is not None:
+                self.flush_timer.cancel()
+            self.flush_timer = threading.Timer(self.flush_delay, self.save_config)
+            self.flush_timer.daemon = True
+            self.flush_timer.start()
 
     def get(self, key, default=None):
         return self.config_data.get(key, default)
 
     def set(self, key, value):
-        self.config_data[key] = value
+        with self.lock:
+            if key in self.config_data and self.config_data[key] == value:
+                return
+            self.config_data[key] = value
+            self.dirty = True
+            if self.batch_depth == 0:
+                self.schedule_flush()
+
+    def close(self):
+        """Write pending changes and stop the flush timer, called on shutdown."""
         self.save_config()
 
     def get_state(self):
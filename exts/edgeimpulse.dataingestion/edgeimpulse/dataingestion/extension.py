@@ -4,24 +4,80 @@ import omni.ext
 import omni.ui as ui
 from omni.kit.window.file_importer import get_file_importer
 import asyncio
+import importlib
+import sys
+import time
 
+# Kit imports this module as soon as the extension is enabled, so it only imports
+# light modules. The classification and upload modules (numpy, PIL, yaml, httpx and
+# the Isaac Sim viewport utilities) are imported with import_feature() when first used.
 from .config import Config
-from .uploader import upload_data
-from .classifier import Classifier
+from .utils import (
+    get_active_learning_settings,
+    get_bbox_use_processes,
+    get_box_filter_settings,
+    get_inference_backend,
+    get_label_cache_path,
+    get_local_model_path,
+    get_log_file_path,
+    get_log_max_entries,
+    get_profiling_settings,
+    get_save_overlay_images,
+    get_stream_idle_timeout,
+    get_trace_path,
+)
+from .log_model import LogLevel, LogModel, ThrottledLogView
 from .state import State
+from .jobs import PRIORITY_BULK, PRIORITY_INTERACTIVE, JobManager
+from .profiling import profiler
 from .client import EdgeImpulseRestClient
-from .bbox_processor import process_files, post_process_files
+
+# levels shown by the log filter combo boxes
+LOG_FILTER_LEVELS = [LogLevel.INFO, LogLevel.WARNING, LogLevel.ERROR]
+
+# seconds between two polls of the ingestion progress while uploading
+PROGRESS_POLL_INTERVAL = 0.1
+
+# minimum seconds between two sample count refreshes while uploading
+SAMPLES_COUNT_INTERVAL = 2.0
+
+# seconds to wait before warming up the classifier of a project restored at startup,
+# so that loading the model does not compete with the startup of the app
+STARTUP_WARMUP_DELAY = 5.0
+
+
+def import_feature(module_name):
+    """
+    Import a module of the extension on first use and print how long it took.
+    Args:
+        module_name (str): Name of the module in this package, e.g. "classifier".
+    Returns:
+        module: The imported module.
+    """
+    full_name = f"{__package__}.{module_name}"
+    module = sys.modules.get(full_name)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(full_name)
+        print(
+            f"[edgeimpulse.dataingestion] Loaded {module_name} in "
+            f"{(time.perf_counter() - start) * 1e3:.0f} ms"
+        )
+    return module
 
 class EdgeImpulseExtension(omni.ext.IExt):
 
-    config = Config()
     classifier = None
 
     def on_startup(self, ext_id):
         print("[edgeimpulse.dataingestion] Edge Impulse Extension startup")
+        startup_time = time.perf_counter()
 
+        self.config = Config()
         self.config.print_config_info()
 
+        profiler.configure(**get_profiling_settings())
+
         # Load the last known state from the config
         saved_state_name = self.config.get_state()
         try:
@@ -29,8 +85,26 @@ class EdgeImpulseExtension(omni.ext.IExt):
         except KeyError:
             self.state = State.NO_PROJECT_CONNECTED
 
+        # Bounded logs, rendered a few times per second at most
+        self.upload_logs = ThrottledLogView(
+            LogModel(get_log_max_entries(), get_log_file_path("upload")), self.render_upload_logs
+        )
+        self.classify_logs = ThrottledLogView(
+            LogModel(get_log_max_entries(), get_log_file_path("classify")), self.render_classify_logs
+        )
+
         self.reset_to_initial_state()
 
+        # Label reading and uploads run on their own thread and event loop, created
+        # with the first upload
+        self.ingestion_worker = None
+
+        # Uploads and classifications run as jobs, one of each at a time. A running
+        # classification pauses the upload between two files.
+        self.job_manager = JobManager({"upload": 1, "classify": 1})
+
+        self.inference_backend = get_inference_backend()
+
         self._window = ui.Window("Edge Impulse", width=300, height=300)
 
         with self._window.frame:
@@ -45,7 +119,12 @@ class EdgeImpulseExtension(omni.ext.IExt):
         self.setup_ui_project_connected()
         self.setup_ui_no_project_connected()
 
-        self.transition_to_state(self.state)
+        self.transition_to_state(self.state, STARTUP_WARMUP_DELAY)
+
+        print(
+            "[edgeimpulse.dataingestion] Startup took "
+            f"{(time.perf_counter() - startup_time) * 1e3:.0f} ms"
+        )
 
     def reset_to_initial_state(self):
         self.project_id = None
@@ -54,10 +133,11 @@ class EdgeImpulseExtension(omni.ext.IExt):
 
         self.impulse = None
 
-        self.upload_logs_text = ""
+        self.upload_logs.model.clear()
         self.uploading = False
+        self.upload_job = None
 
-        self.classify_logs_text = ""
+        self.classify_logs.model.clear()
         self.classifying = False
 
         self.training_samples = 0
@@ -67,11 +147,14 @@ class EdgeImpulseExtension(omni.ext.IExt):
         self.impulse_info = None
         self.deployment_info = None
 
-    def transition_to_state(self, new_state):
+        self.warmup_task = None
+
+    def transition_to_state(self, new_state, warmup_delay=0):
         """
         Transition the extension to a new state.
 
         :param new_state: The new state to transition to.
+        :param warmup_delay: Seconds before the classifier is warmed up once connected.
         """
         # Store the new state in memory
         self.state = new_state
@@ -88,6 +171,8 @@ class EdgeImpulseExtension(omni.ext.IExt):
             self.project_info_label.text = (
                 f"Connected to project {self.project_id} ({self.project_name})"
             )
+            # Prefetch the model in the background so the first classification is fast
+            self.warmup_task = asyncio.ensure_future(self.warm_up_classifier(warmup_delay))
 
         self.update_ui_visibility()
 
@@ -187,10 +272,11 @@ class EdgeImpulseExtension(omni.ext.IExt):
 
         if project_info:
             print(f"Connected to project: {project_info}")
-            self.config.set("project_id", project_info["id"])
-            self.config.set("project_name", project_info["name"])
-            self.config.set("project_api_key", api_key)
-            self.transition_to_state(State.PROJECT_CONNECTED)
+            with self.config.batch():
+                self.config.set("project_id", project_info["id"])
+                self.config.set("project_name", project_info["name"])
+                self.config.set("project_api_key", api_key)
+                self.transition_to_state(State.PROJECT_CONNECTED)
         else:
             # Display an error message in the current UI
             self.display_error_message(
@@ -199,15 +285,19 @@ class EdgeImpulseExtension(omni.ext.IExt):
 
     def disconnect(self):
         print("Disconnecting")
+        self.job_manager.cancel_all()
+        self.stop_classifier()
         self.reset_to_initial_state()
-        self.config.set("project_id", None)
-        self.config.set("project_name", None)
-        self.config.set("project_api_key", None)
-        self.classify_button.visible = False
-        self.ready_for_classification.visible = False
-        self.data_collapsable_frame.collapsed = True
-        self.classification_collapsable_frame.collapsed = True
-        self.transition_to_state(State.NO_PROJECT_CONNECTED)
+        with self.config.batch():
+            self.config.set("project_id", None)
+            self.config.set("project_name", None)
+            self.config.set("project_api_key", None)
+            self.classify_button.visible = False
+            self.ready_for_classification.visible = False
+            self.warmup_status_label.visible = False
+            self.data_collapsable_frame.collapsed = True
+            self.classification_collapsable_frame.collapsed = True
+            self.transition_to_state(State.NO_PROJECT_CONNECTED)
 
     ### Data ingestion
 
@@ -241,6 +331,28 @@ class EdgeImpulseExtension(omni.ext.IExt):
                     self.checkbox.model.add_value_changed_fn(self.on_checkbox_changed)
                     ui.Spacer(width=3)
 
+                with ui.HStack(height=10):
+                    ui.Spacer(width=3)
+                    ui.Label("Stream While Rendering", width=70)
+                    ui.Spacer(width=5)
+                    self.stream_checkbox = ui.CheckBox(width=20, height=20)
+                    self.stream_checkbox.model.set_value(self.config.get("stream_upload", False))
+                    self.stream_checkbox.model.add_value_changed_fn(
+                        lambda model: self.config.set("stream_upload", model.as_bool)
+                    )
+                    ui.Spacer(width=3)
+
+                with ui.HStack(height=10):
+                    ui.Spacer(width=3)
+                    ui.Label("Upload Uncertain Frames Only", width=70)
+                    ui.Spacer(width=5)
+                    self.active_learning_checkbox = ui.CheckBox(width=20, height=20)
+                    self.active_learning_checkbox.model.set_value(self.config.get("active_learning", False))
+                    self.active_learning_checkbox.model.add_value_changed_fn(
+                        lambda model: self.config.set("active_learning", model.as_bool)
+                    )
+                    ui.Spacer(width=3)
+
                 with ui.HStack(height=20):
                     ui.Spacer(width=3)
 
@@ -290,6 +402,15 @@ class EdgeImpulseExtension(omni.ext.IExt):
                         "Upload to Edge Impulse", clicked_fn=lambda: self.start_upload()
                     )
 
+                # Progress of the running upload
+                self.upload_job_controls = ui.HStack(height=20, spacing=5, visible=False)
+                with self.upload_job_controls:
+                    self.upload_progress_bar = ui.ProgressBar()
+                    self.pause_upload_button = ui.Button(
+                        "Pause", clicked_fn=self.toggle_pause_upload, width=80
+                    )
+                    ui.Button("Cancel", clicked_fn=self.cancel_upload, width=80)
+
                 # Scrolling frame for upload logs
                 self.upload_logs_frame = ui.ScrollingFrame(height=100, visible=False)
                 with self.upload_logs_frame:
@@ -299,6 +420,14 @@ class EdgeImpulseExtension(omni.ext.IExt):
                     self.clear_upload_logs_button = ui.Button(
                         "Clear Logs", clicked_fn=self.clear_upload_logs, visible=False
                     )
+                    self.upload_logs_filter = ui.ComboBox(
+                        0, "All", "Warnings", "Errors", width=100, visible=False
+                    )
+                    self.upload_logs_filter.model.add_item_changed_fn(
+                        lambda model, item: self.upload_logs.set_min_level(
+                            LOG_FILTER_LEVELS[model.get_item_value_model().as_int]
+                        )
+                    )
 
     def on_checkbox_changed(self, model):
         self.bounding_box_path.visible = model.as_bool
@@ -319,10 +448,10 @@ class EdgeImpulseExtension(omni.ext.IExt):
             if dirname:
                 if path_type == "data":
                     self.data_path_display.text = dirname
-                    EdgeImpulseExtension.config.set("data_path", dirname)
+                    self.config.set("data_path", dirname)
                 elif path_type == "bbox":
                     self.bbox_path_display.text = dirname
-                    EdgeImpulseExtension.config.set("bbox_data_path", dirname)
+                    self.config.set("bbox_data_path", dirname)
             else:
                 print("No folder selected")
 
@@ -348,50 +477,186 @@ class EdgeImpulseExtension(omni.ext.IExt):
         return dataset_types[selected_index]
 
     def add_upload_logs_entry(self, message):
-        self.upload_logs_text += message + "\n"
-        self.upload_logs_label.text = self.upload_logs_text
+        self.upload_logs.add(message)
+        self.upload_logs_frame.visible = self.uploading
+
+    def render_upload_logs(self, text):
+        self.upload_logs_label.text = text
         self.update_clear_upload_logs_button_visibility()
 
     def clear_upload_logs(self):
-        self.upload_logs_text = ""
-        self.upload_logs_label.text = self.upload_logs_text
-        self.update_clear_upload_logs_button_visibility()
+        self.upload_logs.clear()
+        self.upload_logs_frame.visible = self.uploading
 
     def update_clear_upload_logs_button_visibility(self):
-        self.clear_upload_logs_button.visible = bool(self.upload_logs_text)
-        self.upload_logs_frame.visible = self.uploading
+        has_logs = len(self.upload_logs.model) > 0
+        self.clear_upload_logs_button.visible = has_logs
+        self.upload_logs_filter.visible = has_logs
 
     def start_upload(self):
+        # Prevent multiple uploads at the same time
+        if self.upload_job is not None and not self.upload_job.finished:
+            return
+
+        self.uploading = True
+        self.upload_button.text = "Uploading..."
+        self.upload_logs_frame.visible = True
+        self.upload_progress_bar.model.set_value(0)
+        self.pause_upload_button.text = "Pause"
+        self.upload_job_controls.visible = True
+
+        # if bbox checkbox checked, the bounding boxes of every image are read
+        # first, or of every frame as it is rendered when streaming. Both steps run
+        # on the ingestion worker thread, the settings are read here on the main thread.
+        bbox_data_path = None
+        cache_path = None
+        if self.bounding_box_path.visible:
+            bbox_data_path = self.config.get("bbox_data_path")
+            cache_path = get_label_cache_path(bbox_data_path)
+
+        if self.ingestion_worker is None:
+            self.ingestion_worker = import_feature("ingestion_worker").IngestionWorker()
+        self.ingestion_worker.use_processes = get_bbox_use_processes()
+
+        box_filter = import_feature("bbox_filter").BoxFilter(**get_box_filter_settings())
+        active_learning = False
+        if self.config.get("stream_upload", False):
+            ingest_fn = self.ingestion_worker.stream
+            ingest_args = (
+                self.config.get("project_api_key"),
+                self.config.get("data_path"),
+                self.config.get("dataset_type"),
+                bbox_data_path,
+                box_filter,
+                get_stream_idle_timeout(),
+            )
+        else:
+            ingest_fn = self.ingestion_worker.ingest
+            ingest_args = (
+                self.config.get("project_api_key"),
+                self.config.get("data_path"),
+                self.config.get("dataset_type"),
+                bbox_data_path,
+                cache_path,
+                box_filter,
+            )
+            # Streamed frames are uploaded as they come, they are never filtered
+            active_learning = self.config.get("active_learning", False)
+        self.upload_job = self.job_manager.submit(
+            "Upload",
+            "upload",
+            lambda job: self.run_upload(job, ingest_fn, ingest_args, active_learning),
+            PRIORITY_BULK,
+        )
 
-        # if bbox checkbox checked, create bounding_boxes.labels file
-        if (self.bounding_box_path.visible):
-            process_files(self.config.get("bbox_data_path"), self.config.get("data_path"), self.add_upload_logs_entry)
-
-        if not self.uploading:  # Prevent multiple uploads at the same time
-            self.uploading = True
-            self.upload_button.text = "Uploading..."
-            self.upload_logs_frame.visible = True
-
-            async def upload():
-                await upload_data(
-                    self.config.get("project_api_key"),
-                    self.config.get("data_path"),
-                    self.config.get("dataset_type"),
-                    self.add_upload_logs_entry,
-                    lambda: asyncio.ensure_future(self.get_samples_count()),
-                    self.on_upload_complete,
-                    self.bounding_box_path.visible,
-                )
+    async def run_upload(self, job, ingest_fn, ingest_args, active_learning=False):
+        future = None
+        try:
+            ingest_kwargs = {}
+            if active_learning:
+                file_names = await self.select_uncertain_frames(job, *ingest_args)
+                if file_names is None:
+                    return
+                ingest_kwargs["file_names"] = file_names
+
+            future = self.ingestion_worker.submit(ingest_fn(*ingest_args, job=job, **ingest_kwargs))
+            await self.poll_ingestion_progress(future, job)
+        finally:
+            # A cancelled job also cancels the worker task and its requests in flight
+            if future is not None:
+                future.cancel()
+            if job.cancelled:
+                self.add_upload_logs_entry("Upload cancelled")
+            self.on_upload_complete()
+            self.export_profiling_trace("upload", self.add_upload_logs_entry)
+
+    async def select_uncertain_frames(self, job, api_key, data_path, dataset, bbox_data_path, cache_path, box_filter):
+        # The ground truth is read on the ingestion worker, the model runs on this
+        # loop with the classifier. Both report to the upload logs and progress bar.
+        bounding_boxes = None
+        if bbox_data_path:
+            future = self.ingestion_worker.submit(
+                self.ingestion_worker.read_bounding_boxes(bbox_data_path, data_path, cache_path, box_filter, job)
+            )
+            try:
+                await self.poll_ingestion_progress(future, job)
+            finally:
+                future.cancel()
+            if future.cancelled() or future.exception() is not None or future.result() is None:
+                return None
+            bounding_boxes = future.result()
+
+        if not await self.ensure_classifier(self.add_upload_logs_entry):
+            return None
+
+        task = asyncio.ensure_future(
+            import_feature("active_learning").select_uncertain_frames(
+                self.classifier,
+                data_path,
+                bounding_boxes,
+                self.add_upload_logs_entry,
+                job=job,
+                **get_active_learning_settings(),
+            )
+        )
+        try:
+            await self.poll_ingestion_progress(task, job)
+        finally:
+            task.cancel()
+        if task.cancelled() or task.exception() is not None:
+            return None
+        if not task.result():
+            self.add_upload_logs_entry("No uncertain frames, nothing to upload")
+            return None
+        return task.result()
+
+    async def poll_ingestion_progress(self, future, job):
+        # Forward the worker progress to the UI until the upload is done
+        IngestionEvent = import_feature("ingestion_worker").IngestionEvent
+        samples_pending = False
+        samples_count_time = 0
+        while True:
+            done = future.done()
+            for event, args in self.ingestion_worker.drain():
+                if event == IngestionEvent.LOG:
+                    self.add_upload_logs_entry(*args)
+                elif event == IngestionEvent.SAMPLE_UPLOADED:
+                    samples_pending = True
+            self.upload_progress_bar.model.set_value(job.fraction)
+
+            # The sample counts take three requests, refresh them once in a while
+            # rather than after every uploaded file
+            now = time.monotonic()
+            if samples_pending and (done or now - samples_count_time >= SAMPLES_COUNT_INTERVAL):
+                samples_pending = False
+                samples_count_time = now
+                asyncio.ensure_future(self.get_samples_count())
+
+            if done:
+                break
+            await asyncio.sleep(PROGRESS_POLL_INTERVAL)
+
+        if not future.cancelled() and future.exception() is not None and not job.cancelled:
+            self.add_upload_logs_entry(f"Error: Upload failed: {future.exception()}")
+
+    def toggle_pause_upload(self):
+        if self.upload_job is None or self.upload_job.finished:
+            return
+        if self.upload_job.user_paused:
+            self.upload_job.resume()
+            self.pause_upload_button.text = "Pause"
+        else:
+            self.upload_job.pause()
+            self.pause_upload_button.text = "Resume"
 
-            asyncio.ensure_future(upload())
+    def cancel_upload(self):
+        if self.upload_job is not None:
+            self.job_manager.cancel(self.upload_job)
 
     def on_upload_complete(self):
         self.uploading = False
         self.upload_button.text = "Upload to Edge Impulse"
-
-        # if bbox checkbox checked, remove bounding_boxes.labels file from directory
-        if (self.bounding_box_path.visible):
-            post_process_files(self.config.get("data_path"), self.add_upload_logs_entry)
+        self.upload_job_controls.visible = False
 
     async def get_samples_count(self):
         self.training_samples = await self.rest_client.get_samples_count(
@@ -429,6 +694,10 @@ class EdgeImpulseExtension(omni.ext.IExt):
                     "Fetching latest model deployment...", height=20, visible=False
                 )
 
+                self.warmup_status_label = ui.Label(
+                    "", height=20, word_wrap=True, visible=False
+                )
+
                 self.ready_for_classification = ui.Label(
                     "Your model is ready! You can now run inference on the current scene",
                     height=20,
@@ -437,6 +706,35 @@ class EdgeImpulseExtension(omni.ext.IExt):
 
                 ui.Spacer(height=20)
 
+                with ui.HStack(height=20):
+                    ui.Spacer(width=3)
+                    ui.Label("Cameras", width=70)
+                    ui.Spacer(width=8)
+                    # Viewport indices and/or camera prim paths, comma separated
+                    self.frame_sources_field = ui.StringField(height=20)
+                    self.frame_sources_field.model.set_value(
+                        self.config.get("classify_frame_sources", "0")
+                    )
+                    self.frame_sources_field.model.add_end_edit_fn(
+                        self.on_frame_sources_changed
+                    )
+                    ui.Spacer(width=3)
+
+                with ui.HStack(height=20):
+                    ui.Spacer(width=3)
+                    ui.Label("Render at model input size", width=70)
+                    ui.Spacer(width=5)
+                    # Capture a small render product sized to the impulse input instead
+                    # of reading back and resizing the full resolution viewport
+                    self.capture_at_input_size_checkbox = ui.CheckBox(width=20, height=20)
+                    self.capture_at_input_size_checkbox.model.set_value(
+                        self.config.get("classify_capture_at_input_size", False)
+                    )
+                    self.capture_at_input_size_checkbox.model.add_value_changed_fn(
+                        self.on_capture_at_input_size_changed
+                    )
+                    ui.Spacer(width=3)
+
                 with ui.HStack(height=20):
                     self.classify_button = ui.Button(
                         "Classify current scene frame",
@@ -453,17 +751,22 @@ class EdgeImpulseExtension(omni.ext.IExt):
                     self.clear_classify_logs_button = ui.Button(
                         "Clear Logs", clicked_fn=self.clear_classify_logs, visible=False
                     )
+                    self.classify_logs_filter = ui.ComboBox(
+                        0, "All", "Warnings", "Errors", width=100, visible=False
+                    )
+                    self.classify_logs_filter.model.add_item_changed_fn(
+                        lambda model, item: self.classify_logs.set_min_level(
+                            LOG_FILTER_LEVELS[model.get_item_value_model().as_int]
+                        )
+                    )
 
                 self.classification_output_section = ui.CollapsableFrame(
                     "Ouput", collapsed=True, visible=False, height=0
                 )
                 with self.classification_output_section:
-                    self.image_display = ui.Image(
-                        "",
-                        width=400,
-                        height=300,
-                    )
-                    self.image_display.visible = False
+                    # One overlay per classified viewport or camera
+                    self.classification_output_stack = ui.VStack(spacing=5, height=0)
+                self.image_displays = {}
 
     async def on_classification_collapsed_changed(self, collapsed):
         if not collapsed:
@@ -483,7 +786,10 @@ Go to https://studio.edgeimpulse.com/studio/{self.project_id}/create-impulse to
             self.impulse_status_label.text = "Impulse is ready"
             self.impulse_status_label.visible = False
 
-            if not self.deployment_info or not self.deployment_info.has_deployment:
+            # In-process backends run a local model file instead of the deployment
+            if self.uses_deployment() and (
+                not self.deployment_info or not self.deployment_info.has_deployment
+            ):
                 self.deployment_status_label.visible = True
                 self.deployment_status_label.text = (
                     "Fetching your latest model deployment..."
@@ -498,7 +804,7 @@ Go to https://studio.edgeimpulse.com/studio/{self.project_id}/deployment to buil
             self.deployment_status_label.text = "Model deployment ready"
             self.deployment_status_label.visible = False
 
-            if self.impulse_info and self.deployment_info:
+            if self.impulse_info and (self.deployment_info or not self.uses_deployment()):
                 self.classify_button.visible = True
                 self.ready_for_classification.visible = True
             else:
@@ -506,38 +812,137 @@ Go to https://studio.edgeimpulse.com/studio/{self.project_id}/deployment to buil
                 self.ready_for_classification.visible = False
 
     def add_classify_logs_entry(self, message):
-        self.classify_logs_text += message + "\n"
-        self.classify_logs_label.text = self.classify_logs_text
+        self.classify_logs.add(message)
+        self.classify_logs_frame.visible = self.classifying
+
+    def render_classify_logs(self, text):
+        self.classify_logs_label.text = text
         self.update_clear_classify_logs_button_visibility()
 
     def clear_classify_logs(self):
-        self.classify_logs_text = ""
-        self.classify_logs_label.text = self.classify_logs_text
-        self.update_clear_classify_logs_button_visibility()
+        self.classify_logs.clear()
+        self.classify_logs_frame.visible = self.classifying
 
     def update_clear_classify_logs_button_visibility(self):
-        self.clear_classify_logs_button.visible = bool(self.classify_logs_text)
-        self.classify_logs_frame.visible = self.classifying
+        has_logs = len(self.classify_logs.model) > 0
+        self.clear_classify_logs_button.visible = has_logs
+        self.classify_logs_filter.visible = has_logs
 
     async def get_impulse(self):
         self.impulse = await self.rest_client.get_impulse(self.project_id)
 
-    async def start_classify(self):
+    def create_classifier(self):
+        Classifier = import_feature("classifier").Classifier
+        ResizeMode = import_feature("preprocessing").ResizeMode
+        self.classifier = Classifier(
+            self.rest_client,
+            self.project_id,
+            self.impulse.image_height,
+            self.impulse.image_width,
+            self.add_classify_logs_entry,
+            ResizeMode.from_impulse(self.impulse.resize_mode),
+            get_save_overlay_images(),
+            self.inference_backend,
+            get_local_model_path(),
+            self.impulse.channel_count,
+        )
+        self.classifier.set_capture_at_input_size(
+            self.config.get("classify_capture_at_input_size", False)
+        )
+        self.classifier.set_frame_sources(self.get_frame_source_specs())
+
+    def on_capture_at_input_size_changed(self, model):
+        self.config.set("classify_capture_at_input_size", model.as_bool)
+        if self.classifier:
+            self.classifier.set_capture_at_input_size(model.as_bool)
+
+    def get_frame_source_specs(self):
+        parse_frame_source_specs = import_feature("capture").parse_frame_source_specs
+        return parse_frame_source_specs(self.config.get("classify_frame_sources", "0"))
+
+    def on_frame_sources_changed(self, model):
+        self.config.set("classify_frame_sources", model.get_value_as_string())
+        if self.classifier:
+            self.classifier.set_frame_sources(self.get_frame_source_specs())
+
+    def stop_classifier(self):
+        if self.warmup_task and not self.warmup_task.done():
+            self.warmup_task.cancel()
+        self.warmup_task = None
+
+        if self.classifier:
+            self.classifier.shutdown()
+            self.classifier = None
+
+    def uses_deployment(self):
+        """Whether classification runs the WebAssembly deployment from Studio."""
+        return self.inference_backend == "node"
+
+    def set_warmup_status(self, message):
+        self.warmup_status_label.text = message
+        self.warmup_status_label.visible = bool(message)
+
+    async def warm_up_classifier(self, delay=0):
+        """Fetch the impulse, prefetch the model and start the inference worker."""
+        if delay:
+            await asyncio.sleep(delay)
+        self.set_warmup_status("Warm-up: fetching your Impulse design...")
+        if not self.impulse:
+            await self.get_impulse()
+        if not self.impulse or self.impulse.input_type != "image":
+            # Nothing to warm up, the Classification frame reports the details
+            self.set_warmup_status("")
+            return
+        self.impulse_info = self.impulse
+
+        if self.uses_deployment():
+            self.set_warmup_status("Warm-up: fetching latest model deployment...")
+            self.deployment_info = await self.rest_client.get_deployment_info(
+                self.project_id
+            )
+            if not self.deployment_info or not self.deployment_info.has_deployment:
+                self.set_warmup_status("")
+                return
+
+        if not self.classifier:
+            self.create_classifier()
+
+        self.set_warmup_status("Warm-up: downloading model and starting inference worker...")
+        try:
+            result = await self.classifier.warm_up()
+        except Exception as e:
+            self.set_warmup_status(f"Warm-up failed: {e}")
+            return
+        if result == import_feature("classifier").ClassifierError.SUCCESS:
+            self.set_warmup_status("Warm-up: model ready")
+        else:
+            self.set_warmup_status(f"Warm-up failed: {result.name}")
+
+    async def ensure_classifier(self, log_fn):
+        # Let a running warm-up finish instead of downloading the model twice
+        if self.warmup_task and not self.warmup_task.done():
+            log_fn("Waiting for model warm-up to finish...")
+            try:
+                await self.warmup_task
+            except asyncio.CancelledError:
+                pass
+
         if not self.classifier:
             if not self.impulse:
                 await self.get_impulse()
 
             if not self.impulse:
-                self.add_classify_logs_entry("Error: impulse is not ready yet")
-                return
+                log_fn("Error: impulse is not ready yet")
+                return False
 
-            self.classifier = Classifier(
-                self.rest_client,
-                self.project_id,
-                self.impulse.image_height,
-                self.impulse.image_width,
-                self.add_classify_logs_entry,
-            )
+            self.create_classifier()
+        return True
+
+    async def start_classify(self):
+        if not await self.ensure_classifier(self.add_classify_logs_entry):
+            return
+
+        ClassifierError = import_feature("classifier").ClassifierError
 
         async def classify():
             try:
@@ -545,19 +950,73 @@ Go to https://studio.edgeimpulse.com/studio/{self.project_id}/deployment to buil
                 self.classify_button.text = "Classifying..."
                 self.clear_classify_logs()
                 self.classification_output_section.visible = False
-                image_path = await self.classifier.classify()
-                corrected_path = image_path[1].replace("\\", "/")
-                self.image_display.source_url = corrected_path
-                self.image_display.width = ui.Length(self.impulse_info.image_width)
-                self.image_display.height = ui.Length(self.impulse_info.image_height)
-                self.image_display.visible = True
+                results = await self.classifier.classify_frame_sources()
+                overlays = {
+                    spec: overlay
+                    for spec, (result, overlay) in results.items()
+                    if result == ClassifierError.SUCCESS
+                }
+                if not overlays:
+                    return
+                self.show_overlays(overlays)
                 self.classification_output_section.visible = True
                 self.classification_output_section.collapsed = False
             finally:
                 self.classifying = False
                 self.classify_button.text = "Classify"
+                self.export_profiling_trace("classify", self.add_classify_logs_entry)
+
+        # Interactive, so a running upload is paused until the classification is done
+        self.job_manager.submit("Classify", "classify", lambda job: classify(), PRIORITY_INTERACTIVE)
+
+    def show_overlays(self, overlays):
+        # Rebuild the output section when the set of classified sources changes
+        if set(overlays) != set(self.image_displays):
+            self.classification_output_stack.clear()
+            self.image_displays = {}
+            with self.classification_output_stack:
+                for spec in overlays:
+                    ui.Label(self.classifier.frame_sources[spec].name, height=20)
+                    # The overlay is pushed from memory, no image file is involved
+                    image_provider = ui.ByteImageProvider()
+                    image_display = ui.ImageWithProvider(
+                        image_provider, width=400, height=300
+                    )
+                    self.image_displays[spec] = (image_provider, image_display)
 
-        asyncio.ensure_future(classify())
+        for spec, overlay in overlays.items():
+            image_provider, image_display = self.image_displays[spec]
+            height, width = overlay.shape[:2]
+            if hasattr(image_provider, "set_data_array"):
+                image_provider.set_data_array(overlay, [width, height])
+            else:
+                # Older Kit versions only have set_bytes_data, which also takes a buffer
+                # and does not need a Python list of every byte built on the UI thread
+                image_provider.set_bytes_data(memoryview(overlay.reshape(-1)), [width, height])
+            # The results are drawn on the full resolution frame, keep its aspect ratio
+            image_display.width = ui.Length(400)
+            image_display.height = ui.Length(400 * height / width)
+
+    def export_profiling_trace(self, snapshot_name, log_fn):
+        # Every export holds all the spans recorded so far, up to MAX_EVENTS
+        if not profiler.enabled:
+            return
+        profiler.snapshot(snapshot_name)
+        try:
+            trace_path = get_trace_path()
+            event_count = profiler.export(trace_path)
+        except OSError as e:
+            log_fn(f"Warning: Failed to write the profiling trace: {e}")
+            return
+        log_fn(f"Profiling trace with {event_count} events saved to {trace_path}")
 
     def on_shutdown(self):
         print("[edgeimpulse.dataingestion] Edge Impulse Extension shutdown")
+        self.job_manager.cancel_all()
+        self.stop_classifier()
+        if self.ingestion_worker is not None:
+            self.ingestion_worker.stop()
+        self.export_profiling_trace("shutdown", print)
+        self.upload_logs.destroy()
+        self.classify_logs.destroy()
+        self.config.close()
@@ -0,0 +1,71 @@
+import os
+from pathlib import Path
+
+from .bbox_processor import find_frame_files
+
+
+class FrameWatcher:
+    """
+    Finds the frames a Replicator writer has finished writing to its output folders.
+    A frame is ready once its rgb image (and its annotation files, when a bounding box
+    directory is watched) exist and kept the same size over two polls, so files that
+    are still being written are never read.
+    """
+
+    def __init__(self, rgb_dir, bounding_box_dir=None):
+        """
+        Args:
+            rgb_dir (str): Folder of the rgb_NNNN.png images.
+            bounding_box_dir (str): bounding_box_2d_* or segmentation folder, or None
+                to stream the images without labels.
+        """
+        self.rgb_dir = Path(rgb_dir)
+        self.bounding_box_dir = Path(bounding_box_dir) if bounding_box_dir else None
+        self.file_sizes = {}
+        self.ready_frames = set()
+
+    def poll(self):
+        """
+        Look for newly finished frames.
+        Returns:
+            list: (rgb_path, frame_file, json_label_path) of every frame that became
+                ready since the last poll, frame_file and json_label_path are None
+                without a bounding box directory.
+        """
+        annotations = {}
+        if self.bounding_box_dir is not None and self.bounding_box_dir.is_dir():
+            frame_files, json_label_paths = find_frame_files(self.bounding_box_dir)
+            for frame_file, json_label_path in zip(frame_files, json_label_paths):
+                annotations[frame_file.stem.split("_")[-1]] = (frame_file, json_label_path)
+
+        file_sizes = {}
+        ready = []
+        for rgb_path in sorted(self.rgb_dir.glob("rgb_*.png")):
+            frame_number = rgb_path.stem.split("_")[-1]
+            if frame_number in self.ready_frames:
+                continue
+
+            if self.bounding_box_dir is None:
+                frame_file, json_label_path = None, None
+                paths = [rgb_path]
+            elif frame_number in annotations:
+                frame_file, json_label_path = annotations[frame_number]
+                paths = [rgb_path, frame_file, json_label_path]
+            else:
+                continue
+
+            sizes = [self.__file_size(path) for path in paths]
+            for path, size in zip(paths, sizes):
+                file_sizes[path] = size
+            if all(sizes) and all(self.file_sizes.get(path) == size for path, size in zip(paths, sizes)):
+                self.ready_frames.add(frame_number)
+                ready.append((rgb_path, frame_file, json_label_path))
+
+        self.file_sizes = file_sizes
+        return ready
+
+    def __file_size(self, path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
@@ -1,5 +1,7 @@
 class Impulse:
-    def __init__(self, input_type, image_width=None, image_height=None):
+    def __init__(self, input_type, image_width=None, image_height=None, resize_mode=None, channel_count=3):
         self.input_type = input_type
         self.image_width = image_width
         self.image_height = image_height
+        self.resize_mode = resize_mode
+        self.channel_count = channel_count  # 3 for RGB, 1 for grayscale
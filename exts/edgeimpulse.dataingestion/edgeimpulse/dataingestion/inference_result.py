@@ -0,0 +1,71 @@
+import json
+import os
+
+import yaml
+
+# Bundled NodeJS runner printing the classification result as strict JSON
+RUNNER_PATH = os.path.join(os.path.dirname(__file__), "runner", "run-impulse-json.js")
+RESULT_PREFIX = "EI_RESULT "
+ERROR_PREFIX = "EI_ERROR "
+TIMING_LABELS = {
+    "load": "load",
+    "dsp": "DSP",
+    "classification": "inference",
+    "anomaly": "anomaly",
+    "total": "total",
+}
+
+
+class InferenceResultError(Exception):
+    pass
+
+
+def parse_inference_output(stdout):
+    """
+    Parse the classification result printed by the inference runner.
+    Args:
+        stdout (str): Output of the bundled runner or of the deployment run-impulse.js.
+    Returns:
+        dict: The classification result, with results, anomaly and timing keys.
+    Raises:
+        InferenceResultError: If no result could be parsed.
+    """
+    # Strict JSON record printed by the bundled runner
+    for line in stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            try:
+                return json.loads(line[len(RESULT_PREFIX) :])
+            except ValueError as e:
+                raise InferenceResultError(f"Invalid JSON result record: {e}")
+
+    # Fallback for the output of run-impulse.js
+    json_start_index = stdout.find("{")
+    if json_start_index == -1:
+        raise InferenceResultError("No JSON content found in subprocess output.")
+    json_content = stdout[json_start_index:]
+
+    try:
+        return json.loads(json_content)
+    except ValueError:
+        pass
+
+    # Use YAML loader to parse the JSON content. We cannot use json directly
+    # because the result of running run-impulse.js is not a well formed JSON
+    # (i.e. missing double quotes in names)
+    try:
+        return yaml.load(json_content, Loader=yaml.SafeLoader)
+    except yaml.YAMLError as e:
+        raise InferenceResultError(f"Error parsing classification results with YAML: {e}")
+
+
+def format_timing(output_dict):
+    """Format the timing fields of a classification result for the logs."""
+    timing = output_dict.get("timing")
+    if not isinstance(timing, dict):
+        return None
+    parts = [
+        f"{label} {timing[key]:.1f} ms"
+        for key, label in TIMING_LABELS.items()
+        if isinstance(timing.get(key), (int, float))
+    ]
+    return "Timing: " + ", ".join(parts) if parts else None
@@ -0,0 +1,242 @@
+import asyncio
+import functools
+import queue
+import threading
+from collections import Counter
+from enum import Enum
+from pathlib import Path
+
+from .bbox_processor import find_image_size, process_files, process_frame
+from .frame_watcher import FrameWatcher
+from .jobs import JobCancelled
+from .profiling import profiler
+from .uploader import INGESTION_URL, check_dataset, upload_data, upload_from_queue
+
+# frames read ahead of the uploads while streaming, the watcher waits when it is full
+STREAM_QUEUE_SIZE = 64
+
+# seconds between two scans of the folders Replicator writes to
+STREAM_POLL_INTERVAL = 0.5
+
+# seconds without a new frame after which a stream ends
+STREAM_IDLE_TIMEOUT = 30.0
+
+
+class IngestionEvent(Enum):
+    LOG = 1
+    SAMPLE_UPLOADED = 2
+
+
+class IngestionWorker:
+    """
+    Runs the ingestion pipeline on a background thread with its own event loop, so
+    reading labels and uploading never block Kit's loop. The worker reports back
+    through a thread-safe queue that the extension drains from its own loop.
+    """
+
+    def __init__(self):
+        self.progress = queue.SimpleQueue()
+        self.loop = None
+        self.thread = None
+        # Parse the bounding box files in worker processes, see bbox_processor.create_executor
+        self.use_processes = False
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.__run_loop, name="edgeimpulse-ingestion", daemon=True
+        )
+        self.thread.start()
+
+    def __run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            # Let the cancelled jobs unwind before closing the loop
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    def submit(self, coroutine):
+        """
+        Run a coroutine on the worker loop.
+        Args:
+            coroutine: The coroutine to run.
+        Returns:
+            concurrent.futures.Future: Its result, can be polled from any thread.
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def post(self, event, *args):
+        """Queue a progress event, can be called from any thread."""
+        self.progress.put((event, args))
+
+    def log(self, message):
+        self.post(IngestionEvent.LOG, message)
+
+    def drain(self):
+        """Return the queued progress events without blocking."""
+        events = []
+        while True:
+            try:
+                events.append(self.progress.get_nowait())
+            except queue.Empty:
+                return events
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.thread = None
+        self.loop = None
+
+    async def ingest(
+        self,
+        api_key,
+        data_path,
+        dataset,
+        bbox_data_path=None,
+        cache_path=None,
+        box_filter=None,
+        ingestion_url=INGESTION_URL,
+        file_names=None,
+        job=None,
+    ):
+        """
+        Read the bounding boxes (if bbox_data_path is set) and upload the images of
+        data_path, or only the file_names among them, on the worker loop. Submit it
+        with submit(). The job, if any, gets the progress of each step and can pause
+        or cancel them.
+        """
+        bounding_boxes = None
+        if bbox_data_path:
+            bounding_boxes = await self.read_bounding_boxes(bbox_data_path, data_path, cache_path, box_filter, job)
+            if bounding_boxes is None:
+                return
+
+        await upload_data(
+            api_key,
+            data_path,
+            dataset,
+            self.log,
+            lambda: self.post(IngestionEvent.SAMPLE_UPLOADED),
+            bounding_boxes,
+            ingestion_url,
+            file_names=file_names,
+            job=job,
+        )
+
+    async def read_bounding_boxes(self, bbox_data_path, data_path, cache_path=None, box_filter=None, job=None):
+        """
+        Read the bounding boxes of a dataset with bbox_processor.process_files.
+        Returns:
+            dict: Image name to its bounding_boxes.labels entries, or None if they
+            could not be read.
+        """
+        # The files are parsed on worker threads of this loop
+        try:
+            with profiler.span("read_bounding_boxes", "upload", path=str(bbox_data_path)):
+                return await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    functools.partial(
+                        process_files,
+                        bbox_data_path,
+                        data_path,
+                        self.log,
+                        cache_path=cache_path,
+                        use_processes=self.use_processes,
+                        box_filter=box_filter,
+                        job=job,
+                    ),
+                )
+        except JobCancelled:
+            raise
+        except Exception as e:
+            self.log(f"Error: Failed to read bounding boxes: {e}")
+            return None
+
+    async def stream(
+        self,
+        api_key,
+        data_path,
+        dataset,
+        bbox_data_path=None,
+        box_filter=None,
+        idle_timeout=STREAM_IDLE_TIMEOUT,
+        ingestion_url=INGESTION_URL,
+        job=None,
+    ):
+        """
+        Upload the frames of data_path while Replicator is still writing them, on the
+        worker loop. Finished frames (with their boxes, if bbox_data_path is set) go
+        through a bounded queue to the concurrent uploads, and the stream ends once no
+        new frame was written for idle_timeout seconds.
+        """
+        if not check_dataset(dataset, self.log):
+            return
+
+        loop = asyncio.get_running_loop()
+        watcher = FrameWatcher(data_path, bbox_data_path)
+        frame_queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        uploads = asyncio.ensure_future(
+            upload_from_queue(
+                api_key,
+                frame_queue,
+                dataset,
+                self.log,
+                lambda: self.post(IngestionEvent.SAMPLE_UPLOADED),
+                ingestion_url,
+                job=job,
+            )
+        )
+
+        self.log(f"Streaming frames from {data_path}...")
+        dropped = Counter()
+        frame_count = 0
+        idle_since = loop.time()
+        try:
+            while loop.time() - idle_since < idle_timeout:
+                if job is not None:
+                    await job.checkpoint()
+
+                ready_frames = await loop.run_in_executor(None, watcher.poll)
+                if not ready_frames:
+                    await asyncio.sleep(STREAM_POLL_INTERVAL)
+                    continue
+                idle_since = loop.time()
+
+                for rgb_path, frame_file, json_label_path in ready_frames:
+                    bounding_boxes = None
+                    if frame_file is not None:
+                        if box_filter is not None and box_filter.clip_to_image and box_filter.image_size is None:
+                            box_filter.image_size = find_image_size(Path(data_path))
+                        with profiler.span("process_frame", "upload", frame=frame_file.name):
+                            _, bounding_boxes, frame_dropped, warnings = await loop.run_in_executor(
+                                None, process_frame, frame_file, json_label_path, box_filter
+                            )
+                        for warning in warnings:
+                            self.log(warning)
+                        dropped.update(frame_dropped)
+                        # frames with an invalid array are not uploaded
+                        if bounding_boxes is None:
+                            continue
+                    await frame_queue.put((str(rgb_path), bounding_boxes))
+                    frame_count += 1
+
+            self.log(f"No new frame for {idle_timeout:g} s, {frame_count} frames streamed")
+            if dropped:
+                self.log(
+                    f"Filtered out {sum(dropped.values())} boxes: "
+                    + ", ".join(f"{label} {count}" for label, count in dropped.most_common())
+                )
+            await frame_queue.put(None)
+            await uploads
+        finally:
+            uploads.cancel()
@@ -0,0 +1,200 @@
+import asyncio
+import itertools
+import threading
+from enum import Enum, auto
+
+# priorities of the extension jobs, interactive jobs pre-empt bulk ones
+PRIORITY_BULK = 0
+PRIORITY_INTERACTIVE = 10
+
+# seconds between two checks of a paused job
+PAUSE_POLL_INTERVAL = 0.1
+
+
+class JobState(Enum):
+    PENDING = auto()
+    RUNNING = auto()
+    DONE = auto()
+    CANCELLED = auto()
+    FAILED = auto()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    Handle of a background job. Cancel, pause and progress are thread-safe, so the
+    work itself can run on another thread or event loop: it calls checkpoint() (or
+    check() from synchronous code) between units of work, which waits while the job
+    is paused and raises JobCancelled once it is cancelled.
+    """
+
+    def __init__(self, job_id, name, job_class, priority, run_fn):
+        self.id = job_id
+        self.name = name
+        self.job_class = job_class
+        self.priority = priority
+        self.run_fn = run_fn
+        self.state = JobState.PENDING
+        self.error = None
+        self.task = None
+        self.completed = 0
+        self.total = 0
+        self.user_paused = False
+        self.preempted = False
+        self.cancel_event = threading.Event()
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        self.lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.state in (JobState.DONE, JobState.CANCELLED, JobState.FAILED)
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def paused(self):
+        return not self.resume_event.is_set()
+
+    @property
+    def fraction(self):
+        """Completed fraction of the job, 0 while its total is unknown."""
+        with self.lock:
+            return self.completed / self.total if self.total else 0.0
+
+    def set_progress(self, completed, total):
+        with self.lock:
+            self.completed = completed
+            self.total = total
+
+    def cancel(self):
+        """Cancel the job, must be called from the loop of its JobManager."""
+        self.cancel_event.set()
+        if self.task is not None:
+            self.task.cancel()
+
+    def pause(self):
+        self.user_paused = True
+        self.__update_resume_event()
+
+    def resume(self):
+        self.user_paused = False
+        self.__update_resume_event()
+
+    def set_preempted(self, preempted):
+        self.preempted = preempted
+        self.__update_resume_event()
+
+    def __update_resume_event(self):
+        if self.user_paused or self.preempted:
+            self.resume_event.clear()
+        else:
+            self.resume_event.set()
+
+    async def checkpoint(self):
+        """Wait while the job is paused, raise JobCancelled if it was cancelled."""
+        while not self.resume_event.is_set() and not self.cancel_event.is_set():
+            await asyncio.sleep(PAUSE_POLL_INTERVAL)
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def check(self):
+        """Blocking checkpoint() for code running on a worker thread."""
+        while not self.resume_event.wait(PAUSE_POLL_INTERVAL):
+            if self.cancel_event.is_set():
+                break
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+
+class JobManager:
+    """
+    Runs jobs as tasks on the current event loop. Each job class has a concurrency
+    limit, pending jobs start by priority, and while a job runs every running job
+    of a lower priority is paused at its next checkpoint.
+    """
+
+    def __init__(self, limits):
+        """
+        Args:
+            limits (dict): Maximum number of running jobs per job class.
+        """
+        self.limits = limits
+        self.pending = []
+        self.running = []
+        self.job_ids = itertools.count(1)
+
+    def submit(self, name, job_class, run_fn, priority=PRIORITY_BULK):
+        """
+        Queue a job.
+        Args:
+            name (str): Display name of the job.
+            job_class (str): Key of the concurrency limits.
+            run_fn (callable): Called with the Job once it starts, returns the coroutine to run.
+            priority (int): Higher priorities start first and pre-empt lower ones.
+        Returns:
+            Job: The handle of the job.
+        """
+        job = Job(next(self.job_ids), name, job_class, priority, run_fn)
+        self.pending.append(job)
+        self.__schedule()
+        return job
+
+    def cancel(self, job):
+        if job in self.pending:
+            self.pending.remove(job)
+            job.cancel_event.set()
+            job.state = JobState.CANCELLED
+        else:
+            job.cancel()
+
+    def cancel_all(self):
+        for job in self.pending + self.running:
+            self.cancel(job)
+
+    def __schedule(self):
+        # Highest priority first, then submission order
+        self.pending.sort(key=lambda job: (-job.priority, job.id))
+        for job in list(self.pending):
+            running_count = sum(1 for running in self.running if running.job_class == job.job_class)
+            if running_count >= self.limits.get(job.job_class, 1):
+                continue
+            self.pending.remove(job)
+            self.running.append(job)
+            job.state = JobState.RUNNING
+            job.task = asyncio.ensure_future(self.__run(job))
+            job.task.add_done_callback(lambda task, job=job: self.__finish(job))
+        self.__update_preemption()
+
+    def __update_preemption(self):
+        top_priority = max((job.priority for job in self.running), default=None)
+        for job in self.running:
+            job.set_preempted(job.priority < top_priority)
+
+    async def __run(self, job):
+        try:
+            await job.run_fn(job)
+            job.state = JobState.CANCELLED if job.cancelled else JobState.DONE
+        except JobCancelled:
+            job.state = JobState.CANCELLED
+        except Exception as e:
+            job.error = e
+            job.state = JobState.FAILED
+        finally:
+            # Leave running in the same step the final state is set, so a finished
+            # job is never still listed as running
+            self.__finish(job)
+
+    def __finish(self, job):
+        # Also reached by tasks cancelled before they started running
+        if job not in self.running:
+            return
+        if job.state == JobState.RUNNING:
+            job.state = JobState.CANCELLED
+        self.running.remove(job)
+        self.__schedule()
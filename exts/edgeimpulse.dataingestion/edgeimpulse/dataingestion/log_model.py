@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from enum import IntEnum
+from logging.handlers import RotatingFileHandler
+
+# messages kept for display, older ones are only in the log file (if enabled)
+DEFAULT_MAX_ENTRIES = 1000
+
+# seconds between two refreshes of a log view
+REFRESH_INTERVAL = 0.25
+
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 3
+
+
+class LogLevel(IntEnum):
+    INFO = 0
+    SUCCESS = 1
+    WARNING = 2
+    ERROR = 3
+
+    @classmethod
+    def from_message(cls, message):
+        """Return the level of a message from its "Error:", "Warning:" or "Success:" prefix."""
+        for level, prefix in ((cls.ERROR, "Error"), (cls.WARNING, "Warning"), (cls.SUCCESS, "Success")):
+            if message.startswith(prefix):
+                return level
+        return cls.INFO
+
+
+LOGGING_LEVELS = {
+    LogLevel.INFO: logging.INFO,
+    LogLevel.SUCCESS: logging.INFO,
+    LogLevel.WARNING: logging.WARNING,
+    LogLevel.ERROR: logging.ERROR,
+}
+
+
+class LogModel:
+    """
+    Bounded, thread-safe history of log messages. Only the last max_entries messages
+    are kept, the full history can be streamed to a rotating log file.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, log_file=None):
+        self.entries = deque(maxlen=max_entries)
+        self.lock = threading.Lock()
+        self.logger = None
+        self.file_handler = None
+        if log_file:
+            self.__open_log_file(log_file)
+
+    def __open_log_file(self, log_file):
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        self.file_handler = RotatingFileHandler(
+            log_file, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT, encoding="utf-8"
+        )
+        self.file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        self.logger = logging.getLogger(f"edgeimpulse.dataingestion.{os.path.basename(log_file)}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(self.file_handler)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, message):
+        level = LogLevel.from_message(message)
+        with self.lock:
+            self.entries.append((level, message))
+        if self.logger is not None:
+            self.logger.log(LOGGING_LEVELS[level], message)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def format(self, min_level=LogLevel.INFO):
+        """Return the kept messages of at least min_level, one per line."""
+        with self.lock:
+            messages = [message for level, message in self.entries if level >= min_level]
+        return "".join(f"{message}\n" for message in messages)
+
+    def close(self):
+        if self.file_handler is not None:
+            self.logger.removeHandler(self.file_handler)
+            self.file_handler.close()
+            self.file_handler = None
+            self.logger = None
+
+
+class ThrottledLogView:
+    """
+    Renders a LogModel at most once per refresh_interval, so a burst of messages
+    costs a single relayout of the widget instead of one per message.
+    """
+
+    def __init__(self, model, render_fn, min_level=LogLevel.INFO, refresh_interval=REFRESH_INTERVAL):
+        """
+        Args:
+            model (LogModel): The messages to display.
+            render_fn (callable): Called on the event loop with the formatted messages.
+            min_level (LogLevel): Messages below this level are hidden.
+            refresh_interval (float): Minimum seconds between two renders.
+        """
+        self.model = model
+        self.render_fn = render_fn
+        self.min_level = min_level
+        self.refresh_interval = refresh_interval
+        self.refresh_handle = None
+
+    def add(self, message):
+        """Add a message, must be called from the event loop."""
+        self.model.add(message)
+        if self.refresh_handle is None:
+            loop = asyncio.get_event_loop()
+            self.refresh_handle = loop.call_later(self.refresh_interval, self.refresh)
+
+    def clear(self):
+        self.model.clear()
+        self.refresh()
+
+    def set_min_level(self, min_level):
+        self.min_level = min_level
+        self.refresh()
+
+    def refresh(self):
+        if self.refresh_handle is not None:
+            self.refresh_handle.cancel()
+            self.refresh_handle = None
+        self.render_fn(self.model.format(self.min_level))
+
+    def destroy(self):
+        if self.refresh_handle is not None:
+            self.refresh_handle.cancel()
+            self.refresh_handle = None
+        self.model.close()
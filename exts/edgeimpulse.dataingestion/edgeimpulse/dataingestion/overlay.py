@@ -0,0 +1,93 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+BOX_COLOR = (255, 0, 0, 255)
+TEXT_COLOR = (255, 255, 255, 255)
+
+
+class OverlayRenderer:
+    """
+    Draws classification results into a reused RGBA buffer so that a continuous
+    classification loop does not allocate, encode or write a new image per frame.
+    """
+
+    def __init__(self):
+        self.buffer = None
+        self.font = None
+        self.font_size = None
+
+    def render(self, frame, bounding_boxes):
+        """
+        Draw the bounding boxes with their label and confidence on a copy of the frame.
+        Args:
+            frame (np.ndarray): HxWx4 uint8 RGBA frame.
+            bounding_boxes (list): Dicts with label, value, x, y, width and height in frame pixels.
+        Returns:
+            np.ndarray: The overlay buffer, valid until the next call to render().
+        """
+        if self.buffer is None or self.buffer.shape != frame.shape:
+            self.buffer = np.empty_like(frame)
+        np.copyto(self.buffer, frame)
+
+        height, width = frame.shape[:2]
+        # Scale the outline and the labels with the frame so they stay readable
+        line_width = max(2, width // 640)
+        self.__load_font(max(10, height // 60))
+
+        for box in bounding_boxes:
+            if "x" not in box:
+                continue
+            x_min = min(max(int(box["x"]), 0), width - 1)
+            y_min = min(max(int(box["y"]), 0), height - 1)
+            x_max = min(max(int(box["x"] + box["width"]), x_min + 1), width)
+            y_max = min(max(int(box["y"] + box["height"]), y_min + 1), height)
+            self.__draw_rectangle(x_min, y_min, x_max, y_max, line_width)
+
+            label_text = f"{box['label']} ({box['value']:.2f})"
+            self.__draw_label(label_text, x_min, y_min, y_max)
+
+        return self.buffer
+
+    def save(self, path):
+        """Write the last rendered overlay to disk."""
+        Image.fromarray(self.buffer, "RGBA").save(path)
+
+    def __load_font(self, size):
+        if self.font_size == size:
+            return
+        try:
+            self.font = ImageFont.truetype("arial.ttf", size)
+        except IOError:
+            self.font = ImageFont.load_default()
+        self.font_size = size
+
+    def __draw_rectangle(self, x_min, y_min, x_max, y_max, line_width):
+        buffer = self.buffer
+        buffer[y_min : min(y_min + line_width, y_max), x_min:x_max] = BOX_COLOR
+        buffer[max(y_max - line_width, y_min) : y_max, x_min:x_max] = BOX_COLOR
+        buffer[y_min:y_max, x_min : min(x_min + line_width, x_max)] = BOX_COLOR
+        buffer[y_min:y_max, max(x_max - line_width, x_min) : x_max] = BOX_COLOR
+
+    def __draw_label(self, label_text, x, y_min, y_max):
+        # Render the text into a small grayscale mask and blit it, the rest of the
+        # frame is never touched by PIL
+        left, top, right, bottom = self.font.getbbox(label_text)
+        text_width, text_height = right - left + 4, bottom - top
+        mask_image = Image.new("L", (text_width, text_height))
+        ImageDraw.Draw(mask_image).text((2 - left, -top), label_text, fill=255, font=self.font)
+        mask = np.asarray(mask_image) > 127
+
+        height, width = self.buffer.shape[:2]
+        text_x = x + 3  # A small offset from the left edge of the bounding box
+        text_y = y_min - text_height  # Above the bounding box
+        if text_y < 0:
+            text_y = y_max + 5  # Below the bounding box if there is no space above
+
+        # Clip the label to the frame
+        x0, y0 = max(text_x, 0), max(text_y, 0)
+        x1, y1 = min(text_x + text_width, width), min(text_y + text_height, height)
+        if x0 >= x1 or y0 >= y1:
+            return
+        region = self.buffer[y0:y1, x0:x1]
+        region[:] = BOX_COLOR
+        region[mask[y0 - text_y : y1 - text_y, x0 - text_x : x1 - text_x]] = TEXT_COLOR
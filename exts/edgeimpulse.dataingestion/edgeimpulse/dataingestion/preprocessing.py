@@ -0,0 +1,215 @@
+import hashlib
+import math
+from enum import Enum
+
+import numpy as np
+from PIL import Image
+
+# Downscale by an integer factor with Image.reduce before the LANCZOS pass when the
+# source is at least this many times bigger than the target. Output is visually the
+# same as a plain LANCZOS resize but scales with the model input, not the monitor.
+REDUCING_GAP = 3.0
+
+# When rendering at the model input size, render this much bigger than strictly
+# needed so the final resize still downsamples and keeps some anti-aliasing.
+CAPTURE_MARGIN = 1.5
+
+
+class ResizeMode(Enum):
+    SQUASH = "squash"
+    FIT_SHORT = "fit-short"
+    FIT_LONG = "fit-long"
+
+    @classmethod
+    def from_impulse(cls, value):
+        """Map the impulse `resizeMode` to a ResizeMode, defaulting to squash."""
+        try:
+            return cls(value)
+        except ValueError:
+            return cls.SQUASH
+
+
+class FrameTransform:
+    """
+    Affine transform from model input coordinates back to the captured frame:
+    frame = model * scale + offset
+    """
+
+    def __init__(self, frame_width, frame_height, scale_x, scale_y, offset_x, offset_y):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.scale_x = scale_x
+        self.scale_y = scale_y
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+
+    def to_frame(self, bounding_boxes):
+        """
+        Map bounding boxes predicted on the model input onto the full resolution frame.
+        Args:
+            bounding_boxes (list): Dicts with x, y, width and height in model input pixels.
+        Returns:
+            list: Copies of the boxes in frame pixels, clipped to the frame.
+        """
+        mapped_boxes = []
+        for box in bounding_boxes:
+            if "x" not in box:
+                # Classification results have no box
+                mapped_boxes.append(dict(box))
+                continue
+
+            x_min = box["x"] * self.scale_x + self.offset_x
+            y_min = box["y"] * self.scale_y + self.offset_y
+            x_max = x_min + box["width"] * self.scale_x
+            y_max = y_min + box["height"] * self.scale_y
+
+            # Boxes can reach into the letterbox bands with fit-long
+            x_min = min(max(x_min, 0), self.frame_width)
+            y_min = min(max(y_min, 0), self.frame_height)
+            x_max = min(max(x_max, 0), self.frame_width)
+            y_max = min(max(y_max, 0), self.frame_height)
+
+            mapped_box = dict(box)
+            mapped_box["x"] = round(x_min)
+            mapped_box["y"] = round(y_min)
+            mapped_box["width"] = round(x_max - x_min)
+            mapped_box["height"] = round(y_max - y_min)
+            mapped_boxes.append(mapped_box)
+        return mapped_boxes
+
+
+class PreprocessedFrame:
+    def __init__(self, image, packed_pixels, transform):
+        self.image = image
+        self.packed_pixels = packed_pixels
+        self.transform = transform
+
+    @property
+    def features(self):
+        """The comma separated features string expected by the impulse."""
+        return ",".join(map(str, self.packed_pixels.ravel().tolist()))
+
+    @property
+    def features_hash(self):
+        """Hash of the model input, identical frames give identical results."""
+        return hashlib.blake2b(self.packed_pixels.tobytes(), digest_size=16).hexdigest()
+
+
+class ImagePreprocessor:
+    """Applies the impulse resize mode to captured frames and extracts the features."""
+
+    def __init__(self, target_width, target_height, resize_mode=ResizeMode.SQUASH, channel_count=3):
+        self.target_width = target_width
+        self.target_height = target_height
+        self.resize_mode = resize_mode
+        self.channel_count = channel_count  # 3 for RGB, 1 for grayscale
+
+    def capture_resolution(self, aspect_ratio, margin=CAPTURE_MARGIN):
+        """
+        Compute the smallest render resolution with the given aspect ratio that still
+        covers the impulse input, after the resize mode is applied, with a margin.
+        Args:
+            aspect_ratio (float): Width / height of the rendered frame.
+            margin (float): How much bigger than the impulse input the covered area is.
+        Returns:
+            tuple: (width, height) of the render resolution, rounded up to even values.
+        """
+        target_aspect_ratio = self.target_width / self.target_height
+        wider = aspect_ratio >= target_aspect_ratio
+
+        if self.resize_mode == ResizeMode.FIT_LONG:
+            # The longest axis is scaled to the impulse input
+            use_width = wider
+        else:
+            # Squash and fit-short need both axes to cover the impulse input
+            use_width = not wider
+
+        if use_width:
+            width = self.target_width * margin
+            height = width / aspect_ratio
+        else:
+            height = self.target_height * margin
+            width = height * aspect_ratio
+
+        return 2 * math.ceil(width / 2), 2 * math.ceil(height / 2)
+
+    def blank_frame(self):
+        """A black frame at the impulse input size, used to warm up the inference."""
+        packed_pixels = np.zeros((self.target_height, self.target_width), dtype=np.uint32)
+        transform = FrameTransform(self.target_width, self.target_height, 1, 1, 0, 0)
+        return PreprocessedFrame(None, packed_pixels, transform)
+
+    def process(self, image):
+        """
+        Resize a captured frame to the impulse input size.
+        Args:
+            image (PIL.Image): The full resolution frame.
+        Returns:
+            PreprocessedFrame: The original frame, the packed model input and the
+            transform mapping model coordinates back onto the frame.
+        """
+        resized_image, transform = self.resize(image)
+        packed_pixels = self.pack_pixels(resized_image)
+        return PreprocessedFrame(image, packed_pixels, transform)
+
+    def resize(self, image):
+        width, height = image.size
+        target_width, target_height = self.target_width, self.target_height
+
+        if self.resize_mode == ResizeMode.FIT_SHORT:
+            # Scale the shortest axis to the target and crop the center of the other one
+            scale = min(width / target_width, height / target_height)
+            crop_width = target_width * scale
+            crop_height = target_height * scale
+            left = (width - crop_width) / 2
+            top = (height - crop_height) / 2
+            resized_image = image.resize(
+                (target_width, target_height),
+                Image.Resampling.LANCZOS,
+                box=(left, top, left + crop_width, top + crop_height),
+                reducing_gap=REDUCING_GAP,
+            )
+            transform = FrameTransform(width, height, scale, scale, left, top)
+
+        elif self.resize_mode == ResizeMode.FIT_LONG:
+            # Scale the longest axis to the target and letterbox the other one
+            scale = max(width / target_width, height / target_height)
+            content_width = max(1, min(target_width, round(width / scale)))
+            content_height = max(1, min(target_height, round(height / scale)))
+            content = image.resize(
+                (content_width, content_height),
+                Image.Resampling.LANCZOS,
+                reducing_gap=REDUCING_GAP,
+            )
+            pad_x = (target_width - content_width) // 2
+            pad_y = (target_height - content_height) // 2
+            resized_image = Image.new(image.mode, (target_width, target_height))
+            resized_image.paste(content, (pad_x, pad_y))
+            scale_x = width / content_width
+            scale_y = height / content_height
+            transform = FrameTransform(
+                width, height, scale_x, scale_y, -pad_x * scale_x, -pad_y * scale_y
+            )
+
+        else:
+            resized_image = image.resize(
+                (target_width, target_height),
+                Image.Resampling.LANCZOS,
+                reducing_gap=REDUCING_GAP,
+            )
+            transform = FrameTransform(
+                width, height, width / target_width, height / target_height, 0, 0
+            )
+
+        return resized_image, transform
+
+    def pack_pixels(self, image):
+        """Pack the pixels as 0xRRGGBB integers, the format expected by the impulse."""
+        if self.channel_count == 1:
+            pixels = np.asarray(image.convert("L"), dtype=np.uint32)
+            # Repeat the grayscale values to mimic the RGB structure
+            packed = pixels * 0x010101
+        else:
+            pixels = np.asarray(image.convert("RGB"), dtype=np.uint32)
+            packed = (pixels[..., 0] << 16) | (pixels[..., 1] << 8) | pixels[..., 2]
+        return packed
@@ -0,0 +1,195 @@
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# events kept in memory, the oldest are dropped first
+MAX_EVENTS = 100000
+
+# allocation sites recorded by a memory snapshot
+SNAPSHOT_TOP_STATS = 10
+
+NULL_SPAN = nullcontext()
+
+
+class Profiler:
+    """
+    Records timing spans as Chrome trace events, to be opened in Perfetto or
+    chrome://tracing. While profiling is off a span is a shared no-op context manager.
+    Spans opened in an asyncio task get a track per task, so the concurrent tasks of
+    one loop do not overlap on the track of their thread.
+    """
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.enabled = False
+        self.trace_memory = False
+        self.events = deque(maxlen=max_events)
+        self.tracks = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.start_time = time.perf_counter()
+
+    def configure(self, enabled, trace_memory=False):
+        """
+        Turn the spans on or off.
+        Args:
+            enabled (bool): Record spans.
+            trace_memory (bool): Also record the traced memory of the process with
+                tracemalloc, which slows down every allocation.
+        """
+        trace_memory = enabled and trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not trace_memory and self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+
+    def span(self, name, category, **args):
+        """
+        Time a block of code, including the awaits inside it.
+        Args:
+            name (str): Name of the span.
+            category (str): Pipeline of the span, e.g. "classify" or "upload".
+            **args: Shown with the span in the trace viewer.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return self.__record_span(name, category, args)
+
+    def traced(self, name, category):
+        """Decorator recording a span around each call of a function or coroutine function."""
+
+        def decorator(fn):
+            if asyncio.iscoroutinefunction(fn):
+
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(name, category):
+                        return await fn(*args, **kwargs)
+
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name, category):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @contextmanager
+    def __record_span(self, name, category, args):
+        tid = self.__track()
+        memory_start = tracemalloc.get_traced_memory()[0] if self.trace_memory else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            if memory_start is not None:
+                # Traced memory of the whole process, other threads allocate too
+                args["memory_delta_kb"] = round((tracemalloc.get_traced_memory()[0] - memory_start) / 1024, 1)
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": self.__timestamp(start),
+                    "dur": (end - start) * 1e6,
+                    "pid": self.pid,
+                    "tid": tid,
+                    "args": args,
+                }
+            )
+
+    def snapshot(self, name):
+        """
+        Record the traced memory and its largest allocation sites, if memory tracing is on.
+        Args:
+            name (str): Name of the snapshot in the trace.
+        """
+        if not self.trace_memory:
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        top_stats = tracemalloc.take_snapshot().statistics("lineno")[:SNAPSHOT_TOP_STATS]
+        timestamp = self.__timestamp(time.perf_counter())
+        tid = self.__track()
+        self.events.append(
+            {
+                "name": "traced memory",
+                "ph": "C",
+                "ts": timestamp,
+                "pid": self.pid,
+                "tid": tid,
+                "args": {"current_kb": current / 1024, "peak_kb": peak / 1024},
+            }
+        )
+        self.events.append(
+            {
+                "name": f"memory snapshot {name}",
+                "cat": "memory",
+                "ph": "i",
+                "s": "p",
+                "ts": timestamp,
+                "pid": self.pid,
+                "tid": tid,
+                "args": {str(stat.traceback): f"{stat.size / 1024:.1f} KB" for stat in top_stats},
+            }
+        )
+
+    def export(self, path):
+        """
+        Write the recorded events to a Chrome trace-event JSON file.
+        Args:
+            path (str): Path of the trace file.
+        Returns:
+            int: Number of events written.
+        """
+        events = list(self.events)
+        with self.lock:
+            tracks = list(self.tracks.items())
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": track_name}}
+            for (_, track_name), tid in tracks
+        ]
+
+        # Written next to the final file, then renamed, so viewers never see half a trace
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+        os.replace(temp_path, path)
+        return len(events)
+
+    def clear(self):
+        self.events.clear()
+
+    def __timestamp(self, counter):
+        # Trace timestamps are in microseconds
+        return (counter - self.start_time) * 1e6
+
+    def __track(self):
+        thread = threading.current_thread()
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        track_name = thread.name if task is None else f"{thread.name} / {task.get_name()}"
+        key = (thread.ident, track_name)
+        with self.lock:
+            tid = self.tracks.get(key)
+            if tid is None:
+                tid = len(self.tracks) + 1
+                self.tracks[key] = tid
+        return tid
+
+
+# Shared by the classify and upload pipelines, configured by the extension
+profiler = Profiler()
@@ -0,0 +1,47 @@
+import copy
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of classification results keyed by (model version, features hash),
+    so that static scenes are not sent through the model again.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model_version, features_hash):
+        """Return a copy of the cached bounding boxes, or None on a miss."""
+        key = (model_version, features_hash)
+        bounding_boxes = self.entries.get(key)
+        if bounding_boxes is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(bounding_boxes)
+
+    def put(self, model_version, features_hash, bounding_boxes):
+        key = (model_version, features_hash)
+        self.entries[key] = copy.deepcopy(bounding_boxes)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = 100 * self.hits / lookups if lookups else 0
+        return (
+            f"Result cache: {self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate), "
+            f"{len(self.entries)}/{self.max_entries} entries"
+        )
@@ -0,0 +1,138 @@
+// Runs an Edge Impulse WebAssembly deployment and prints the result as a single line
+// of strict JSON, prefixed with RESULT_PREFIX so it can be told apart from the logs
+// of the deployment itself.
+//
+// Usage (from the "node" directory of the deployment):
+//     node run-impulse-json.js <features file or comma separated features>
+//     node run-impulse-json.js --serve
+//
+// With --serve the model is loaded once and every line read from stdin is classified
+// as comma separated features, one RESULT_PREFIX or ERROR_PREFIX line per request.
+const fs = require('fs');
+const path = require('path');
+const readline = require('readline');
+
+const RESULT_PREFIX = 'EI_RESULT ';
+const ERROR_PREFIX = 'EI_ERROR ';
+
+function nowMs() {
+    const [seconds, nanoseconds] = process.hrtime();
+    return seconds * 1e3 + nanoseconds / 1e6;
+}
+
+function parseFeatures(raw) {
+    return raw.trim().split(',').map(n => Number(n));
+}
+
+function readFeatures(arg) {
+    return parseFeatures(fs.existsSync(arg) ? fs.readFileSync(arg, 'utf8') : arg);
+}
+
+function waitForRuntime(Module) {
+    return new Promise((resolve) => {
+        if (Module.calledRun) {
+            resolve();
+            return;
+        }
+        Module.onRuntimeInitialized = resolve;
+    });
+}
+
+function classify(Module, features) {
+    const typedArray = new Float32Array(features);
+    const numBytes = typedArray.length * typedArray.BYTES_PER_ELEMENT;
+    const ptr = Module._malloc(numBytes);
+    const heapBytes = new Uint8Array(Module.HEAPU8.buffer, ptr, numBytes);
+    heapBytes.set(new Uint8Array(typedArray.buffer));
+
+    const start = nowMs();
+    const ret = Module.run_classifier(heapBytes.byteOffset, features.length, false);
+    const total = nowMs() - start;
+    Module._free(ptr);
+
+    if (ret.result !== 0) {
+        throw new Error('Classification failed (err code: ' + ret.result + ')');
+    }
+
+    // Older deployments do not expose the model type, rely on the entries then
+    const modelType = typeof Module.get_properties === 'function' ?
+        Module.get_properties().model_type : undefined;
+    const output = { anomaly: ret.anomaly, results: [], timing: { total: total } };
+    for (let ix = 0; ix < ret.size(); ix++) {
+        const c = ret.get(ix);
+        const entry = { label: c.label, value: c.value };
+        const hasBoundingBoxes = modelType !== undefined ?
+            modelType !== 'classification' : typeof c.x === 'number';
+        if (hasBoundingBoxes) {
+            entry.x = c.x;
+            entry.y = c.y;
+            entry.width = c.width;
+            entry.height = c.height;
+        }
+        output.results.push(entry);
+        c.delete();
+    }
+
+    // Newer deployments expose the per stage timing of the impulse
+    if (ret.timing) {
+        output.timing.dsp = ret.timing.dsp;
+        output.timing.classification = ret.timing.classification;
+        output.timing.anomaly = ret.timing.anomaly;
+    }
+    ret.delete();
+    return output;
+}
+
+async function loadModule() {
+    const Module = require(path.join(process.cwd(), 'edge-impulse-standalone'));
+    await waitForRuntime(Module);
+    if (typeof Module.init === 'function') {
+        Module.init();
+    }
+    return Module;
+}
+
+async function serve(Module, load) {
+    const lines = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+    for await (const line of lines) {
+        if (!line.trim()) {
+            continue;
+        }
+        try {
+            const output = classify(Module, parseFeatures(line));
+            // Only the first result pays for loading the model
+            if (load !== undefined) {
+                output.timing.load = load;
+                load = undefined;
+            }
+            process.stdout.write(RESULT_PREFIX + JSON.stringify(output) + '\n');
+        } catch (err) {
+            process.stdout.write(ERROR_PREFIX + (err && err.message ? err.message : err) + '\n');
+        }
+    }
+}
+
+async function main() {
+    if (!process.argv[2]) {
+        console.error('Usage: node run-impulse-json.js <features file> | --serve');
+        process.exit(1);
+    }
+
+    const loadStart = nowMs();
+    const Module = await loadModule();
+    const load = nowMs() - loadStart;
+
+    if (process.argv[2] === '--serve') {
+        await serve(Module, load);
+        return;
+    }
+
+    const output = classify(Module, readFeatures(process.argv[2]));
+    output.timing.load = load;
+    process.stdout.write(RESULT_PREFIX + JSON.stringify(output) + '\n');
+}
+
+main().catch((err) => {
+    console.error(err && err.message ? err.message : err);
+    process.exit(1);
+});
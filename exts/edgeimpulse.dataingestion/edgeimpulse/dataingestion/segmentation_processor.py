@@ -0,0 +1,133 @@
+import json
+import re
+
+import numpy as np
+from PIL import Image
+
+# directory names of the segmentation annotators and the json file mapping the ids of
+# each frame to their semantic class
+SEGMENTATION_LABEL_FILES = {
+    "instance_segmentation": "instance_segmentation_semantics_mapping_{}.json",
+    "semantic_segmentation": "semantic_segmentation_labels_{}.json",
+}
+
+# classes Replicator assigns to pixels that do not belong to a labelled prim
+IGNORED_CLASSES = {"BACKGROUND", "UNLABELLED"}
+
+# masks whose ids are all below this are reduced directly by id, bigger ids (e.g.
+# packed colors) are first remapped to 0..K-1 with np.unique
+DIRECT_ID_LIMIT = 4096
+
+# same layout as the arrays written by the bounding_box_2d_* annotators, boxes from
+# masks have no occlusion information so occlusionRatio is NaN
+BOUNDING_BOX_DTYPE = np.dtype(
+    [
+        ("semanticId", "<u4"),
+        ("x_min", "<i4"),
+        ("y_min", "<i4"),
+        ("x_max", "<i4"),
+        ("y_max", "<i4"),
+        ("occlusionRatio", "<f4"),
+    ]
+)
+
+COLOR_KEY_PATTERN = re.compile(r"^\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)$")
+
+
+# packs RGBA colors into uint32 ids, the same way for the mask pixels and the
+# "(r, g, b, a)" keys of the mapping files
+def pack_colors(r, g, b, a):
+    return (
+        np.asarray(r, dtype=np.uint32)
+        | (np.asarray(g, dtype=np.uint32) << 8)
+        | (np.asarray(b, dtype=np.uint32) << 16)
+        | (np.asarray(a, dtype=np.uint32) << 24)
+    )
+
+
+# loads a mask as an HxW array of ids: .npy masks hold the ids, colorized .png masks
+# are packed to one uint32 per pixel
+def load_mask(mask_file):
+    if mask_file.suffix == ".npy":
+        mask = np.load(mask_file, allow_pickle=False)
+        if mask.ndim == 3:
+            # some annotator versions keep a trailing channel axis
+            mask = mask[..., 0]
+        return mask
+
+    rgba = np.asarray(Image.open(mask_file).convert("RGBA"))
+    return pack_colors(rgba[..., 0], rgba[..., 1], rgba[..., 2], rgba[..., 3])
+
+
+# parses the keys of a mapping file, which are ids for .npy masks and colors for
+# colorized .png masks
+def parse_mapping_key(key):
+    if key.isdigit():
+        return int(key)
+    match = COLOR_KEY_PATTERN.match(key)
+    if match:
+        return int(pack_colors(*(int(channel) for channel in match.groups())))
+    return None
+
+
+# computes the tight box of every id of an HxW mask with vectorized reductions: for
+# each id, the rows and columns it appears in are marked in (H, K) and (W, K) tables,
+# the first and last marked entries are its extent. Boxes use the inclusive x_max and
+# y_max of the bounding_box_2d_* annotators.
+def extract_bounding_boxes(mask):
+    height, width = mask.shape
+    if mask.size == 0:
+        return np.zeros(0, dtype=mask.dtype), np.zeros(0, dtype=BOUNDING_BOX_DTYPE)
+
+    if mask.min() >= 0 and mask.max() < DIRECT_ID_LIMIT:
+        id_count = int(mask.max()) + 1
+        ids = np.arange(id_count)
+        inverse = mask.astype(np.intp)
+    else:
+        ids, inverse = np.unique(mask, return_inverse=True)
+        id_count = len(ids)
+        inverse = inverse.reshape(height, width)
+
+    pixel_counts = np.bincount(inverse.ravel(), minlength=id_count)
+    rows_present = np.zeros((height, id_count), dtype=bool)
+    rows_present[np.arange(height)[:, None], inverse] = True
+    columns_present = np.zeros((width, id_count), dtype=bool)
+    columns_present[np.arange(width)[None, :], inverse] = True
+
+    present = pixel_counts > 0
+    bounding_boxes = np.zeros(int(present.sum()), dtype=BOUNDING_BOX_DTYPE)
+    bounding_boxes["x_min"] = columns_present.argmax(axis=0)[present]
+    bounding_boxes["x_max"] = (width - 1 - columns_present[::-1].argmax(axis=0))[present]
+    bounding_boxes["y_min"] = rows_present.argmax(axis=0)[present]
+    bounding_boxes["y_max"] = (height - 1 - rows_present[::-1].argmax(axis=0))[present]
+    bounding_boxes["occlusionRatio"] = np.nan
+    return ids[present], bounding_boxes
+
+
+# derives the boxes of one segmentation frame, returned like a bounding_box_2d_* frame:
+# a structured array and a labels dict keyed by semanticId. Semantic masks give one box
+# per class, instance masks one box per instance.
+def load_segmentation_boxes(mask_file, json_label_path):
+    with open(json_label_path, "r") as f:
+        mapping = json.load(f)
+
+    classes = {}
+    for key, value in mapping.items():
+        mask_id = parse_mapping_key(key)
+        label = value.get("class") if isinstance(value, dict) else value
+        if mask_id is None or not label:
+            continue
+        if label.upper() in IGNORED_CLASSES:
+            continue
+        classes[mask_id] = label
+
+    ids, bounding_boxes = extract_bounding_boxes(load_mask(mask_file))
+
+    # only keep the ids with a class, background and unlabelled pixels are dropped
+    keep = np.array([int(mask_id) in classes for mask_id in ids.tolist()], dtype=bool)
+    ids = ids[keep]
+    bounding_boxes = bounding_boxes[keep]
+    bounding_boxes["semanticId"] = ids.astype(np.uint32)
+
+    labels = {str(mask_id): {"class": classes[mask_id]} for mask_id in ids.tolist()}
+    return bounding_boxes, labels
@@ -1 +1,10 @@
-from .test_hello_world import *
\ No newline at end of file
+from .test_preprocessing import *
+from .test_backends import *
+from .test_bbox_processor import *
+from .test_segmentation_processor import *
+from .test_bbox_filter import *
+from .test_config import *
+from .test_jobs import *
+from .test_active_learning import *
+from .test_client import *
+from .test_uploader import *
@@ -0,0 +1,153 @@
+import os
+import tempfile
+import unittest
+
+from ..active_learning import FrameScore, box_iou, score_frame, select_frames, select_uncertain_frames
+
+
+def box(label, x, y, width, height, value=None):
+    result = {"label": label, "x": x, "y": y, "width": width, "height": height}
+    if value is not None:
+        result["value"] = value
+    return result
+
+
+class TestScoreFrame(unittest.TestCase):
+    def test_confident_detection(self):
+        frame_score = score_frame([box("car", 10, 10, 20, 20, 0.9)], [box("car", 5, 5, 30, 30)])
+        self.assertEqual((frame_score.misses, frame_score.label_errors, frame_score.false_positives), (0, 0, 0))
+        self.assertAlmostEqual(frame_score.score, 0.1)
+
+    def test_missed_box(self):
+        predictions = [box("car", 10, 10, 20, 20, 0.9)]
+        ground_truth = [box("car", 5, 5, 30, 30), box("person", 100, 100, 20, 40)]
+        frame_score = score_frame(predictions, ground_truth)
+        self.assertEqual(frame_score.misses, 1)
+        self.assertAlmostEqual(frame_score.score, 0.5)
+
+    def test_wrong_label(self):
+        frame_score = score_frame([box("person", 10, 10, 20, 20, 0.95)], [box("car", 5, 5, 30, 30)])
+        self.assertEqual(frame_score.label_errors, 1)
+        self.assertEqual(frame_score.score, 1.0)
+
+    def test_false_positive(self):
+        predictions = [box("car", 10, 10, 20, 20, 0.9), box("car", 200, 200, 10, 10, 0.8)]
+        frame_score = score_frame(predictions, [box("car", 5, 5, 30, 30)])
+        self.assertEqual(frame_score.false_positives, 1)
+        self.assertAlmostEqual(frame_score.score, 0.5)
+
+    def test_fomo_cells_inside_one_object(self):
+        # Several cells detect the same object, none of them is a false positive
+        cells = [box("car", x, y, 8, 8, 0.9) for x in (0, 8, 16) for y in (0, 8)]
+        frame_score = score_frame(cells, [box("car", 0, 0, 24, 16)])
+        self.assertEqual((frame_score.misses, frame_score.false_positives), (0, 0))
+
+    def test_min_iou(self):
+        predictions = [box("car", 12, 12, 4, 4, 0.9)]
+        ground_truth = [box("car", 0, 0, 40, 40)]
+        self.assertEqual(score_frame(predictions, ground_truth).misses, 0)
+        self.assertEqual(score_frame(predictions, ground_truth, min_iou=0.5).misses, 1)
+
+    def test_without_ground_truth(self):
+        # Without labels only the confidence counts
+        frame_score = score_frame([box("car", 0, 0, 8, 8, 0.6)])
+        self.assertEqual(frame_score.false_positives, 0)
+        self.assertAlmostEqual(frame_score.score, 0.4)
+        self.assertEqual(score_frame([]).score, 0.0)
+
+    def test_empty_ground_truth(self):
+        # Labelled frames without boxes make every prediction a false positive
+        frame_score = score_frame([box("car", 0, 0, 8, 8, 0.99)], [])
+        self.assertEqual(frame_score.false_positives, 1)
+        self.assertEqual(frame_score.score, 1.0)
+        self.assertEqual(score_frame([], []).score, 0.0)
+
+    def test_no_predictions(self):
+        frame_score = score_frame([], [box("car", 0, 0, 8, 8), box("car", 20, 20, 8, 8)])
+        self.assertEqual(frame_score.misses, 2)
+        self.assertEqual(frame_score.score, 1.0)
+
+    def test_classification_margin(self):
+        predictions = [{"label": "car", "value": 0.55}, {"label": "person", "value": 0.45}]
+        frame_score = score_frame(predictions)
+        self.assertAlmostEqual(frame_score.score, 0.9)
+        self.assertEqual(frame_score.confidence, 0.55)
+
+    def test_classification_label_error(self):
+        predictions = [{"label": "car", "value": 0.9}, {"label": "person", "value": 0.1}]
+        self.assertAlmostEqual(score_frame(predictions, [box("car", 0, 0, 8, 8)]).score, 0.2)
+        frame_score = score_frame(predictions, [box("person", 0, 0, 8, 8)])
+        self.assertEqual(frame_score.label_errors, 1)
+        self.assertEqual(frame_score.score, 1.0)
+
+    def test_box_iou(self):
+        self.assertEqual(box_iou(box("a", 0, 0, 10, 10), box("b", 20, 20, 5, 5)), 0.0)
+        self.assertAlmostEqual(box_iou(box("a", 0, 0, 10, 10), box("b", 5, 0, 10, 10)), 50 / 150)
+
+
+class TestSelectFrames(unittest.TestCase):
+    def setUp(self):
+        self.scores = {
+            "a.png": FrameScore(0.2),
+            "b.png": FrameScore(0.9),
+            "c.png": FrameScore(0.5),
+            "d.png": FrameScore(0.7),
+        }
+
+    def test_highest_scores_first(self):
+        self.assertEqual(select_frames(self.scores, 0, 0.0), ["b.png", "d.png", "c.png", "a.png"])
+
+    def test_min_score(self):
+        self.assertEqual(select_frames(self.scores, 0, 0.5), ["b.png", "d.png", "c.png"])
+
+    def test_budget(self):
+        self.assertEqual(select_frames(self.scores, 2, 0.0), ["b.png", "d.png"])
+        self.assertEqual(select_frames(self.scores, 10, 0.6), ["b.png", "d.png"])
+
+    def test_reasons(self):
+        self.assertEqual(
+            FrameScore(1.0, misses=1, label_errors=2, false_positives=3, confidence=0.4).reasons(),
+            "1 missed, 2 wrong labels, 3 false positives, confidence 0.40",
+        )
+        self.assertEqual(FrameScore(0.0).reasons(), "")
+
+
+class StubClassifier:
+    def __init__(self, predictions):
+        self.predictions = predictions
+
+    async def predict_images(self, image_paths, batch_size=None, job=None):
+        if self.predictions is None:
+            return None
+        names = {path: os.path.basename(path) for path in image_paths}
+        return {path: self.predictions[name] for path, name in names.items() if name in self.predictions}
+
+
+class TestSelectUncertainFrames(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.data_path = temp_dir.name
+        for name in ("rgb_0000.png", "rgb_0001.png", "rgb_0002.png", "bounding_boxes.labels"):
+            open(os.path.join(self.data_path, name), "w").close()
+
+    async def test_selects_the_frames_the_model_gets_wrong(self):
+        classifier = StubClassifier(
+            {
+                "rgb_0000.png": [box("car", 10, 10, 20, 20, 0.95)],
+                "rgb_0001.png": [box("person", 10, 10, 20, 20, 0.95)],
+                # rgb_0002.png could not be classified
+            }
+        )
+        bounding_boxes = {name: [box("car", 5, 5, 30, 30)] for name in ("rgb_0000.png", "rgb_0001.png")}
+        messages = []
+        selected = await select_uncertain_frames(
+            classifier, self.data_path, bounding_boxes, messages.append, min_score=0.3
+        )
+        self.assertEqual(sorted(selected), ["rgb_0001.png", "rgb_0002.png"])
+        self.assertTrue(messages[-1].startswith("Success: Active learning selected 2 of 3 frames"))
+
+    async def test_without_model(self):
+        messages = []
+        self.assertIsNone(await select_uncertain_frames(StubClassifier(None), self.data_path, None, messages.append))
+        self.assertTrue(messages[-1].startswith("Error"))
@@ -0,0 +1,212 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from ..backends import GRAYSCALE_WEIGHTS, BundledRunner, NodeBackend, ONNXBackend, TFLiteBackend, prepare_input
+
+# Stands in for the bundled runner: answers every line after a short delay with its pid
+FAKE_RUNNER = """
+import json, os, sys, time
+for line in sys.stdin:
+    time.sleep(0.1)
+    print("EI_RESULT " + json.dumps({"results": [], "pid": os.getpid()}), flush=True)
+"""
+
+
+def random_pixels(height=4, width=6, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def luminance(pixels):
+    return pixels.astype(np.float32) @ GRAYSCALE_WEIGHTS
+
+
+class StubONNXSession:
+    """Stands in for an onnxruntime.InferenceSession, records the inputs it is fed."""
+
+    def __init__(self, shape, input_type="tensor(float)"):
+        self.model_input = SimpleNamespace(name="image", shape=shape, type=input_type)
+        self.feeds = []
+
+    def get_inputs(self):
+        return [self.model_input]
+
+    def run(self, output_names, feed):
+        self.feeds.append(feed)
+        return [np.array([[0.25, 0.75]], dtype=np.float32)]
+
+
+class StubInterpreter:
+    """Stands in for a TensorFlow Lite Interpreter with one input and one output."""
+
+    def __init__(self, shape, dtype=np.float32, quantization=(0.0, 0)):
+        self.input_details = {"index": 0, "shape": np.array(shape), "dtype": dtype, "quantization": quantization}
+        self.output_details = {"index": 1, "quantization": (1 / 256, 0)}
+        self.tensors = {}
+
+    def get_input_details(self):
+        return [self.input_details]
+
+    def get_output_details(self):
+        return [self.output_details]
+
+    def set_tensor(self, index, value):
+        self.tensors[index] = value
+
+    def invoke(self):
+        self.tensors[1] = np.array([[64, 192]], dtype=np.uint8)
+
+    def get_tensor(self, index):
+        return self.tensors[index]
+
+
+def stub_backend(backend_class, session):
+    backend = backend_class("model", None, print)
+    backend.create_session = lambda: session
+    return backend
+
+
+class TestPrepareInput(unittest.TestCase):
+    def test_rgb_float(self):
+        pixels = random_pixels()
+        input_data = prepare_input(pixels, {"shape": [1, 4, 6, 3], "dtype": np.float32})
+        self.assertEqual(input_data.shape, (1, 4, 6, 3))
+        np.testing.assert_allclose(input_data[0], pixels / 255.0, rtol=1e-6)
+
+    def test_grayscale_uses_luminance(self):
+        pixels = np.array([[[255, 0, 0], [0, 255, 0], [0, 0, 255], [90, 90, 90]]], dtype=np.uint8)
+        input_data = prepare_input(pixels, {"shape": [1, 1, 4, 1], "dtype": np.float32})
+        self.assertEqual(input_data.shape, (1, 1, 4, 1))
+        np.testing.assert_allclose(input_data[0, 0, :, 0], [0.299, 0.587, 0.114, 90 / 255], rtol=1e-5)
+
+    def test_quantized_input(self):
+        pixels = random_pixels()
+        input_data = prepare_input(
+            pixels, {"shape": [1, 4, 6, 3], "dtype": np.int8, "quantization": (1 / 255, -128)}
+        )
+        self.assertEqual(input_data.dtype, np.int8)
+        np.testing.assert_array_equal(input_data[0], pixels.astype(np.int16) - 128)
+
+    def test_unquantized_integer_input_takes_raw_pixels(self):
+        pixels = random_pixels()
+        input_data = prepare_input(pixels, {"shape": [1, 4, 6, 3], "dtype": np.uint8})
+        np.testing.assert_array_equal(input_data[0], pixels)
+
+
+class TestONNXBackend(unittest.TestCase):
+    def invoke(self, shape, pixels):
+        session = StubONNXSession(shape)
+        backend = stub_backend(ONNXBackend, session)
+        outputs = backend.invoke(pixels)
+        self.assertEqual(outputs[0].shape, (1, 2))
+        return session.feeds[0]["image"]
+
+    def test_nhwc_rgb(self):
+        pixels = random_pixels()
+        input_data = self.invoke([1, 4, 6, 3], pixels)
+        self.assertEqual(input_data.shape, (1, 4, 6, 3))
+        np.testing.assert_allclose(input_data[0], pixels / 255.0, rtol=1e-6)
+
+    def test_nhwc_grayscale(self):
+        pixels = random_pixels()
+        input_data = self.invoke([1, 4, 6, 1], pixels)
+        self.assertEqual(input_data.shape, (1, 4, 6, 1))
+        np.testing.assert_allclose(input_data[0, ..., 0], luminance(pixels) / 255.0, rtol=1e-5)
+
+    def test_nchw_rgb(self):
+        pixels = random_pixels()
+        input_data = self.invoke([1, 3, 4, 6], pixels)
+        self.assertEqual(input_data.shape, (1, 3, 4, 6))
+        self.assertTrue(input_data.flags["C_CONTIGUOUS"])
+        np.testing.assert_allclose(input_data[0], pixels.transpose(2, 0, 1) / 255.0, rtol=1e-6)
+
+    def test_nchw_grayscale(self):
+        pixels = random_pixels()
+        input_data = self.invoke([1, 1, 4, 6], pixels)
+        self.assertEqual(input_data.shape, (1, 1, 4, 6))
+        np.testing.assert_allclose(input_data[0, 0], luminance(pixels) / 255.0, rtol=1e-5)
+
+    def test_uint8_input(self):
+        session = StubONNXSession([1, 4, 6, 3], "tensor(uint8)")
+        pixels = random_pixels()
+        stub_backend(ONNXBackend, session).invoke(pixels)
+        np.testing.assert_array_equal(session.feeds[0]["image"][0], pixels)
+
+
+class TestTFLiteBackend(unittest.TestCase):
+    def test_rgb_quantized(self):
+        interpreter = StubInterpreter([1, 4, 6, 3], np.uint8, (1 / 255, 0))
+        pixels = random_pixels()
+        outputs = stub_backend(TFLiteBackend, interpreter).invoke(pixels)
+        np.testing.assert_array_equal(interpreter.tensors[0][0], pixels)
+        # Outputs are dequantized
+        np.testing.assert_allclose(outputs[0], [[0.25, 0.75]])
+
+    def test_grayscale(self):
+        interpreter = StubInterpreter([1, 4, 6, 1])
+        pixels = random_pixels()
+        stub_backend(TFLiteBackend, interpreter).invoke(pixels)
+        self.assertEqual(interpreter.tensors[0].shape, (1, 4, 6, 1))
+        np.testing.assert_allclose(interpreter.tensors[0][0, ..., 0], luminance(pixels) / 255.0, rtol=1e-5)
+
+    def test_run_decodes_the_outputs(self):
+        interpreter = StubInterpreter([1, 4, 6, 3])
+        backend = stub_backend(TFLiteBackend, interpreter)
+        backend.labels = ["cat", "dog"]
+        packed_pixels = np.full((4, 6), 0x102030, dtype=np.uint32)
+        output_dict = backend.run(SimpleNamespace(packed_pixels=packed_pixels))
+        self.assertEqual(
+            output_dict["results"], [{"label": "cat", "value": 0.25}, {"label": "dog", "value": 0.75}]
+        )
+        np.testing.assert_allclose(interpreter.tensors[0][0, 0, 0], np.array([0x10, 0x20, 0x30]) / 255.0)
+
+
+class TestNodeBackend(unittest.IsolatedAsyncioTestCase):
+    def create_backend(self, max_workers):
+        patcher = mock.patch.object(BundledRunner, "command", [sys.executable, "-c", FAKE_RUNNER])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        os.makedirs(os.path.join(temp_dir.name, "node"))
+        open(os.path.join(temp_dir.name, "node", "run-impulse.js"), "w").close()
+
+        executor = ThreadPoolExecutor(max_workers)
+        self.addCleanup(executor.shutdown)
+        backend = NodeBackend(executor, print)
+        backend.load(temp_dir.name)
+        self.addCleanup(backend.close)
+        return backend
+
+    async def classify(self, backend, frame_count):
+        frame = SimpleNamespace(features="1,2,3")
+        results = await asyncio.gather(*(backend.infer(frame) for _ in range(frame_count)))
+        return [result["pid"] for result in results]
+
+    async def test_concurrent_frames_use_a_runner_each(self):
+        backend = self.create_backend(4)
+        pids = await self.classify(backend, 4)
+        self.assertEqual(len(set(pids)), 4)
+
+        # The runners keep running and are reused
+        self.assertEqual(set(await self.classify(backend, 4)), set(pids))
+
+        processes = [runner.process for runner in backend.runners]
+        backend.close()
+        self.assertTrue(all(process.poll() is not None for process in processes))
+        self.assertEqual(backend.runners, [])
+
+    async def test_runners_are_limited_to_the_workers(self):
+        backend = self.create_backend(2)
+        await backend.warm_up()
+        pids = await self.classify(backend, 5)
+        self.assertEqual(len(set(pids)), 2)
+        self.assertEqual(len(backend.runners), 2)
@@ -0,0 +1,94 @@
+import json
+import unittest
+
+import numpy as np
+
+from ..bbox_filter import BoxFilter
+from ..segmentation_processor import BOUNDING_BOX_DTYPE
+
+
+def make_boxes(*rows):
+    # (x_min, y_min, x_max, y_max, occlusionRatio) per box
+    boxes = np.zeros(len(rows), dtype=BOUNDING_BOX_DTYPE)
+    for field, values in zip(("x_min", "y_min", "x_max", "y_max", "occlusionRatio"), zip(*rows)):
+        boxes[field] = values
+    return boxes
+
+
+def make_classes(*names):
+    return np.array(names, dtype=object)
+
+
+def extents(boxes):
+    return list(zip(*(boxes[field].tolist() for field in ("x_min", "y_min", "x_max", "y_max"))))
+
+
+class TestBoxFilterApply(unittest.TestCase):
+    def test_min_area(self):
+        boxes = make_boxes((0, 0, 10, 10, 0), (0, 0, 3, 3, 0), (5, 5, 5, 20, 0))
+        filtered, classes, dropped = BoxFilter(min_area=10).apply(boxes, make_classes("a", "b", "b"))
+        self.assertEqual(extents(filtered), [(0, 0, 10, 10)])
+        self.assertEqual(classes.tolist(), ["a"])
+        self.assertEqual(dropped, {"b": 2})
+
+    def test_max_occlusion_keeps_unknown_ratios(self):
+        boxes = make_boxes((0, 0, 9, 9, 0.2), (0, 0, 9, 9, 0.8), (0, 0, 9, 9, np.nan), (0, 0, 9, 9, -1))
+        _, classes, dropped = BoxFilter(max_occlusion=0.5).apply(boxes, make_classes("a", "b", "c", "d"))
+        self.assertEqual(classes.tolist(), ["a", "c", "d"])
+        self.assertEqual(dropped, {"b": 1})
+
+    def test_clip_to_image(self):
+        boxes = make_boxes((-10, -5, 120, 60, 0), (20, 10, 30, 20, 0), (150, 10, 200, 20, 0))
+        box_filter = BoxFilter(image_size=(100, 50))
+        filtered, classes, dropped = box_filter.apply(boxes, make_classes("a", "b", "c"))
+        # x_max and y_max are inclusive, a box fully off the image collapses and is dropped
+        self.assertEqual(extents(filtered), [(0, 0, 99, 49), (20, 10, 30, 20)])
+        self.assertEqual(dropped, {"c": 1})
+
+    def test_no_clipping_without_image_size_or_when_disabled(self):
+        boxes = make_boxes((-10, -5, 120, 60, 0))
+        for box_filter in (BoxFilter(), BoxFilter(clip_to_image=False, image_size=(100, 50))):
+            filtered, _, _ = box_filter.apply(boxes, make_classes("a"))
+            self.assertEqual(extents(filtered), [(-10, -5, 120, 60)])
+
+    def test_class_map_renames_merges_and_drops(self):
+        boxes = make_boxes(*[(0, 0, 9, 9, 0)] * 4)
+        box_filter = BoxFilter(class_map={"sedan": "car", "hatchback": "car", "debris": ""})
+        _, classes, dropped = box_filter.apply(boxes, make_classes("sedan", "hatchback", "debris", "person"))
+        self.assertEqual(classes.tolist(), ["car", "car", "person"])
+        # Dropped boxes are counted under their original class
+        self.assertEqual(dropped, {"debris": 1})
+
+    def test_input_is_not_modified(self):
+        boxes = make_boxes((-10, -5, 120, 60, 0))
+        boxes.setflags(write=False)
+        filtered, _, _ = BoxFilter(image_size=(100, 50)).apply(boxes, make_classes("a"))
+        self.assertEqual(extents(boxes), [(-10, -5, 120, 60)])
+        self.assertEqual(extents(filtered), [(0, 0, 99, 49)])
+
+    def test_empty_frame(self):
+        filtered, classes, dropped = BoxFilter(class_map={"a": "b"}).apply(make_boxes(), make_classes())
+        self.assertEqual((len(filtered), len(classes), dropped), (0, 0, {}))
+
+
+class TestBoxFilterSignature(unittest.TestCase):
+    def test_is_json_serializable(self):
+        signature = BoxFilter(class_map={"a": "b"}, image_size=(640, 480)).signature()
+        self.assertEqual(json.loads(json.dumps(signature)), signature)
+
+    def test_ignores_the_order_of_the_class_map(self):
+        self.assertEqual(
+            BoxFilter(class_map={"a": "x", "b": "y"}).signature(),
+            BoxFilter(class_map={"b": "y", "a": "x"}).signature(),
+        )
+
+    def test_changes_with_every_setting(self):
+        signatures = [
+            BoxFilter().signature(),
+            BoxFilter(min_area=2).signature(),
+            BoxFilter(max_occlusion=0.5).signature(),
+            BoxFilter(clip_to_image=False).signature(),
+            BoxFilter(class_map={"a": "b"}).signature(),
+            BoxFilter(image_size=(640, 480)).signature(),
+        ]
+        self.assertEqual(len({json.dumps(signature) for signature in signatures}), len(signatures))
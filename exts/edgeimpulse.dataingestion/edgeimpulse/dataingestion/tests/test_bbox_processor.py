@@ -0,0 +1,170 @@
+import json
+import tempfile
+import unittest
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+from .. import bbox_processor
+from ..bbox_processor import convert_bounding_boxes, process_files
+from ..segmentation_processor import BOUNDING_BOX_DTYPE
+
+
+# a per-box loop looking up the class of each box by its semanticId, warning once per
+# missing id
+def reference_convert(bounding_boxes, labels, log_callback):
+    for semantic_id in sorted(set(bounding_boxes["semanticId"].tolist())):
+        if str(semantic_id) not in labels:
+            log_callback(f"Warning: Missing label for semanticId {semantic_id}. Skipping.")
+
+    bounding_boxes_entry = []
+    for bbox in bounding_boxes:
+        key = str(int(bbox["semanticId"]))
+        if key not in labels:
+            continue
+
+        label = labels[key]["class"]
+        x_min = int(bbox["x_min"])
+        y_min = int(bbox["y_min"])
+        width = int(bbox["x_max"] - x_min)
+        height = int(bbox["y_max"] - y_min)
+        bounding_boxes_entry.append({"label": label, "x": x_min, "y": y_min, "width": width, "height": height})
+    return bounding_boxes_entry
+
+
+def random_boxes(rng, box_count):
+    boxes = np.zeros(box_count, dtype=BOUNDING_BOX_DTYPE)
+    boxes["semanticId"] = rng.integers(0, 6, box_count)
+    boxes["x_min"] = rng.integers(0, 500, box_count)
+    boxes["y_min"] = rng.integers(0, 500, box_count)
+    boxes["x_max"] = boxes["x_min"] + rng.integers(0, 100, box_count)
+    boxes["y_max"] = boxes["y_min"] + rng.integers(0, 100, box_count)
+    boxes["occlusionRatio"] = rng.random(box_count)
+    return boxes
+
+
+def random_labels(rng):
+    # Drop some of the semantic ids, and add keys that are not ids of the boxes
+    labels = {str(i): {"class": f"class_{rng.integers(0, 4)}"} for i in range(6) if rng.random() > 0.2}
+    labels["9"] = {"class": "not_in_the_frame"}
+    labels["01"] = {"class": "padded_key"}
+    labels["semantic"] = {"class": "not_an_index"}
+    return labels
+
+
+def write_frames(bounding_box_dir, frames):
+    bounding_box_dir.mkdir()
+    for number, (boxes, labels) in frames.items():
+        np.save(bounding_box_dir / f"bounding_box_2d_tight_{number}.npy", boxes)
+        with open(bounding_box_dir / f"bounding_box_2d_tight_labels_{number}.json", "w") as f:
+            json.dump(labels, f)
+
+
+class TestConvertBoundingBoxes(unittest.TestCase):
+    def assert_matches_reference(self, boxes, labels):
+        warnings, reference_warnings = [], []
+        entries, dropped = convert_bounding_boxes(boxes, labels, warnings.append)
+        self.assertEqual(entries, reference_convert(boxes, labels, reference_warnings.append))
+        self.assertEqual(warnings, reference_warnings)
+        self.assertEqual(dropped, {})
+
+    def test_random_frames(self):
+        rng = np.random.default_rng(0)
+        for box_count in (1, 2, 7, 50):
+            boxes = random_boxes(rng, box_count)
+            self.assert_matches_reference(boxes, random_labels(rng))
+
+    def test_labels_are_keyed_by_semantic_id(self):
+        # Replicator numbers the classes of a frame, boxes of a class share its id
+        boxes = random_boxes(np.random.default_rng(5), 6)
+        boxes["semanticId"] = [0, 0, 2, 1, 2, 1]
+        labels = {"0": {"class": "class_0"}, "1": {"class": "class_2"}, "2": {"class": "class_4"}}
+        warnings = []
+        entries, _ = convert_bounding_boxes(boxes, labels, warnings.append)
+        self.assertEqual(
+            [entry["label"] for entry in entries], ["class_0", "class_0", "class_4", "class_2", "class_4", "class_2"]
+        )
+        self.assertEqual(warnings, [])
+
+        del labels["2"]
+        entries, _ = convert_bounding_boxes(boxes, labels, warnings.append)
+        self.assertEqual([entry["label"] for entry in entries], ["class_0", "class_0", "class_2", "class_2"])
+        self.assertEqual(warnings, ["Warning: Missing label for semanticId 2. Skipping."])
+
+    def test_no_labels(self):
+        self.assert_matches_reference(random_boxes(np.random.default_rng(1), 5), {})
+
+    def test_empty_box_array(self):
+        self.assert_matches_reference(np.zeros(0, dtype=BOUNDING_BOX_DTYPE), {"0": {"class": "a"}})
+
+    def test_values_are_python_ints(self):
+        entries, _ = convert_bounding_boxes(random_boxes(np.random.default_rng(2), 3), {"0": {"class": "a"}}, print)
+        self.assertTrue(all(type(entries[0][key]) is int for key in ("x", "y", "width", "height")))
+
+
+class TestProcessFiles(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+        self.rgb_dir = self.root / "rgb"
+        self.rgb_dir.mkdir()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_matches_reference(self):
+        rng = np.random.default_rng(3)
+        frames = {f"{number:04d}": None for number in range(30)}
+        for number in frames:
+            box_count = int(rng.integers(0, 12))
+            frames[number] = (random_boxes(rng, box_count), random_labels(rng))
+        frames["0030"] = (np.zeros(0, dtype=BOUNDING_BOX_DTYPE), {})
+        frames["0031"] = (random_boxes(rng, 4), {})
+        write_frames(self.root / "bounding_box_2d_tight", frames)
+
+        reference_warnings = []
+        reference = {
+            f"rgb_{number}.png": reference_convert(boxes, labels, reference_warnings.append)
+            for number, (boxes, labels) in frames.items()
+        }
+
+        for use_processes in (False, True):
+            with self.subTest(use_processes=use_processes):
+                messages = []
+                bounding_boxes = process_files(
+                    self.root / "bounding_box_2d_tight",
+                    self.rgb_dir,
+                    messages.append,
+                    max_workers=2,
+                    use_processes=use_processes,
+                )
+                self.assertEqual(bounding_boxes, reference)
+                warnings = [message for message in messages if message.startswith("Warning")]
+                self.assertEqual(Counter(warnings), Counter(reference_warnings))
+                self.assertFalse((self.rgb_dir / "bounding_boxes.labels").exists())
+
+    def test_label_cache_is_only_written_when_it_changes(self):
+        rng = np.random.default_rng(4)
+        bounding_box_dir = self.root / "bounding_box_2d_tight"
+        write_frames(bounding_box_dir, {f"{number:04d}": (random_boxes(rng, 3), {}) for number in range(3)})
+        cache_path = str(self.root / "cache" / "labels.json")
+
+        def run():
+            with mock.patch.object(bbox_processor, "save_label_cache", wraps=bbox_processor.save_label_cache) as save:
+                bounding_boxes = process_files(bounding_box_dir, self.rgb_dir, print, cache_path=cache_path)
+            return bounding_boxes, save.call_count
+
+        first, save_count = run()
+        self.assertEqual(save_count, 1)
+        second, save_count = run()
+        self.assertEqual(save_count, 0)
+        self.assertEqual(second, first)
+
+        # A removed frame is dropped from the cache
+        (bounding_box_dir / "bounding_box_2d_tight_0002.npy").unlink()
+        third, save_count = run()
+        self.assertEqual(save_count, 1)
+        self.assertEqual(set(third), {"rgb_0000.png", "rgb_0001.png"})
+        self.assertEqual(len(bbox_processor.load_label_cache(cache_path)), 2)
@@ -0,0 +1,75 @@
+import unittest
+
+from ..client import EdgeImpulseRestClient
+
+IMPULSE = {
+    "success": True,
+    "impulse": {
+        "inputBlocks": [{"type": "image", "imageWidth": 96, "imageHeight": 64, "resizeMode": "fit-short"}],
+        "dspBlocks": [{"id": 3, "type": "image"}],
+    },
+}
+
+
+def dsp_config(channels):
+    return {
+        "success": True,
+        "config": [{"group": "Image", "items": [{"param": "channels", "value": channels}]}],
+    }
+
+
+class StubResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class StubClient:
+    """Stands in for an httpx.AsyncClient, answers GET requests from a dict keyed by url suffix."""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.urls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def get(self, url, headers=None):
+        self.urls.append(url)
+        for suffix, data in self.responses.items():
+            if url.endswith(suffix):
+                return StubResponse(200, data)
+        return StubResponse(404, {})
+
+
+class TestGetImpulse(unittest.IsolatedAsyncioTestCase):
+    async def get_impulse(self, responses):
+        rest_client = EdgeImpulseRestClient("key")
+        client = StubClient(responses)
+        rest_client.create_client = lambda: client
+        return await rest_client.get_impulse(1), client.urls
+
+    async def test_grayscale_impulse(self):
+        impulse, urls = await self.get_impulse({"/impulse": IMPULSE, "/dsp/3/config": dsp_config("Grayscale")})
+        self.assertEqual((impulse.image_width, impulse.image_height, impulse.channel_count), (96, 64, 1))
+        self.assertEqual(impulse.resize_mode, "fit-short")
+        self.assertTrue(urls[-1].endswith("1/dsp/3/config"))
+
+    async def test_rgb_impulse(self):
+        impulse, _ = await self.get_impulse({"/impulse": IMPULSE, "/dsp/3/config": dsp_config("RGB")})
+        self.assertEqual(impulse.channel_count, 3)
+
+    async def test_defaults_to_rgb(self):
+        # Without an image block, or when its config cannot be read
+        without_image_block = {**IMPULSE, "impulse": {**IMPULSE["impulse"], "dspBlocks": []}}
+        impulse, urls = await self.get_impulse({"/impulse": without_image_block})
+        self.assertEqual(impulse.channel_count, 3)
+        self.assertEqual(len(urls), 1)
+        impulse, _ = await self.get_impulse({"/impulse": IMPULSE})
+        self.assertEqual(impulse.channel_count, 3)
@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from ..config import Config
+from ..state import State
+
+# flush delay of the tests, in seconds
+FLUSH_DELAY = 0.05
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestConfig(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.config_file = os.path.join(temp_dir.name, "data", "config.json")
+        # The legacy config is read from the working directory
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(temp_dir.name)
+
+    def create_config(self):
+        config = Config(self.config_file, FLUSH_DELAY)
+        self.addCleanup(config.close)
+        write = mock.patch.object(config, "write_config_file", wraps=config.write_config_file).start()
+        self.addCleanup(mock.patch.stopall)
+        return config, write
+
+    def read_file(self):
+        with open(self.config_file, "r") as f:
+            return json.load(f)
+
+    def test_changes_are_written_after_the_delay(self):
+        config, write = self.create_config()
+        config.set("project_id", 1)
+        self.assertEqual(write.call_count, 0)
+        self.assertTrue(wait_for(lambda: not config.dirty))
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(self.read_file(), {"project_id": 1})
+
+    def test_bursts_are_written_once(self):
+        config, write = self.create_config()
+        for value in range(20):
+            config.set("value", value)
+        self.assertTrue(wait_for(lambda: not config.dirty))
+        time.sleep(FLUSH_DELAY * 3)
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(self.read_file(), {"value": 19})
+
+    def test_batch_waits_for_the_outermost_exit(self):
+        config, write = self.create_config()
+        with config.batch():
+            config.set("a", 1)
+            with config.batch():
+                config.set("b", 2)
+            # Leaving the inner batch does not flush
+            self.assertIsNone(config.flush_timer)
+            config.set("c", 3)
+            time.sleep(FLUSH_DELAY * 3)
+            self.assertEqual(write.call_count, 0)
+        self.assertTrue(wait_for(lambda: not config.dirty))
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(self.read_file(), {"a": 1, "b": 2, "c": 3})
+
+    def test_batch_without_changes_does_not_write(self):
+        config, write = self.create_config()
+        with config.batch():
+            config.get("a")
+        self.assertIsNone(config.flush_timer)
+        self.assertEqual(write.call_count, 0)
+
+    def test_unchanged_values_are_not_written(self):
+        config, write = self.create_config()
+        config.set("a", 1)
+        config.save_config()
+        config.set("a", 1)
+        self.assertFalse(config.dirty)
+        self.assertIsNone(config.flush_timer)
+        self.assertEqual(write.call_count, 1)
+
+    def test_close_writes_pending_changes(self):
+        config, write = self.create_config()
+        config.flush_delay = 60
+        config.set_state(State.PROJECT_CONNECTED)
+        config.close()
+        self.assertEqual(write.call_count, 1)
+        self.assertIsNone(config.flush_timer)
+        self.assertEqual(Config(self.config_file).get_state(), State.PROJECT_CONNECTED.name)
+
+    def test_invalid_file_is_ignored(self):
+        os.makedirs(os.path.dirname(self.config_file))
+        with open(self.config_file, "w") as f:
+            f.write("{not json")
+        self.assertEqual(Config(self.config_file).config_data, {})
+        self.assertEqual(Config(self.config_file).get_state(), State.NO_PROJECT_CONNECTED.name)
+
+    def test_legacy_config_is_migrated(self):
+        with open("config.json", "w") as f:
+            json.dump({"project_id": 7}, f)
+        self.assertEqual(Config(self.config_file).get("project_id"), 7)
+        self.assertEqual(self.read_file(), {"project_id": 7})
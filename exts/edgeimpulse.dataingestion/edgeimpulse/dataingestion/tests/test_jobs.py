@@ -0,0 +1,194 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from .. import jobs
+from ..jobs import PRIORITY_BULK, PRIORITY_INTERACTIVE, JobCancelled, JobManager, JobState
+
+
+async def wait_until(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError("Condition not reached in time")
+        await asyncio.sleep(0.005)
+
+
+def counting_job(steps, step_count=1000):
+    """A bulk job counting its units of work, with a checkpoint between each."""
+
+    async def run(job):
+        for _ in range(step_count):
+            await job.checkpoint()
+            steps.append(job.id)
+            await asyncio.sleep(0.001)
+
+    return run
+
+
+def waiting_job(event):
+    async def run(job):
+        await event.wait()
+
+    return run
+
+
+class TestJobManager(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(jobs, "PAUSE_POLL_INTERVAL", 0.005)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manager = JobManager({"upload": 1, "classify": 1})
+
+    async def asyncTearDown(self):
+        self.manager.cancel_all()
+        await asyncio.sleep(0.01)
+
+    async def test_interactive_job_preempts_bulk_job(self):
+        steps = []
+        upload = self.manager.submit("Upload", "upload", counting_job(steps), PRIORITY_BULK)
+        await wait_until(lambda: len(steps) >= 3)
+
+        done = asyncio.Event()
+        classify = self.manager.submit("Classify", "classify", waiting_job(done), PRIORITY_INTERACTIVE)
+        self.assertTrue(upload.preempted)
+        self.assertTrue(upload.paused)
+        self.assertFalse(classify.paused)
+
+        # The upload stops at its next checkpoint
+        await asyncio.sleep(0.02)
+        paused_count = len(steps)
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(steps), paused_count)
+        self.assertEqual(upload.state, JobState.RUNNING)
+
+        done.set()
+        await wait_until(lambda: classify.finished)
+        self.assertEqual(classify.state, JobState.DONE)
+        self.assertFalse(upload.paused)
+        await wait_until(lambda: len(steps) > paused_count)
+
+    async def test_equal_priorities_do_not_preempt(self):
+        steps = []
+        upload = self.manager.submit("Upload", "upload", counting_job(steps))
+        classify = self.manager.submit("Classify", "classify", waiting_job(asyncio.Event()))
+        self.assertFalse(upload.paused)
+        self.assertFalse(classify.paused)
+
+    async def test_class_limit_and_priority_order(self):
+        first_done = asyncio.Event()
+        started = []
+
+        def recording_job(name, event=None):
+            async def run(job):
+                started.append(name)
+                if event is not None:
+                    await event.wait()
+
+            return run
+
+        first = self.manager.submit("first", "upload", recording_job("first", first_done))
+        low = self.manager.submit("low", "upload", recording_job("low"), PRIORITY_BULK)
+        high = self.manager.submit("high", "upload", recording_job("high"), PRIORITY_INTERACTIVE)
+        await asyncio.sleep(0.01)
+        self.assertEqual(started, ["first"])
+        self.assertEqual((low.state, high.state), (JobState.PENDING, JobState.PENDING))
+
+        first_done.set()
+        await wait_until(lambda: low.finished and high.finished)
+        self.assertEqual(started, ["first", "high", "low"])
+        self.assertEqual(first.state, JobState.DONE)
+
+    async def test_cancel_running_job_starts_the_next_one(self):
+        steps = []
+        running = self.manager.submit("Upload 1", "upload", counting_job(steps))
+        pending = self.manager.submit("Upload 2", "upload", counting_job(steps, 3))
+        await wait_until(lambda: len(steps) >= 2)
+
+        self.manager.cancel(running)
+        await wait_until(lambda: running.finished)
+        self.assertEqual(running.state, JobState.CANCELLED)
+        await wait_until(lambda: pending.finished)
+        self.assertEqual(pending.state, JobState.DONE)
+        self.assertEqual(self.manager.running, [])
+
+    async def test_cancel_pending_job(self):
+        steps = []
+        self.manager.submit("Upload 1", "upload", waiting_job(asyncio.Event()))
+        pending = self.manager.submit("Upload 2", "upload", counting_job(steps))
+        self.manager.cancel(pending)
+        self.assertEqual(pending.state, JobState.CANCELLED)
+        self.assertNotIn(pending, self.manager.pending)
+        await asyncio.sleep(0.02)
+        self.assertEqual(steps, [])
+
+    async def test_cancel_preempted_job_on_a_worker_thread(self):
+        # Work on a thread blocks in check() while the job is paused
+        def work(job):
+            while True:
+                job.check()
+
+        upload = self.manager.submit(
+            "Upload", "upload", lambda job: asyncio.get_running_loop().run_in_executor(None, work, job)
+        )
+        self.manager.submit("Classify", "classify", waiting_job(asyncio.Event()), PRIORITY_INTERACTIVE)
+        self.assertTrue(upload.paused)
+        self.manager.cancel(upload)
+        await wait_until(lambda: upload.finished)
+        self.assertEqual(upload.state, JobState.CANCELLED)
+
+    async def test_user_pause_and_resume(self):
+        steps = []
+        upload = self.manager.submit("Upload", "upload", counting_job(steps))
+        await wait_until(lambda: len(steps) >= 1)
+        upload.pause()
+        await asyncio.sleep(0.02)
+        paused_count = len(steps)
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(steps), paused_count)
+
+        # A pre-emption ending does not resume a job paused by the user
+        upload.set_preempted(False)
+        self.assertTrue(upload.paused)
+        upload.resume()
+        await wait_until(lambda: len(steps) > paused_count)
+
+    async def test_failed_job(self):
+        async def fail(job):
+            raise ValueError("broken")
+
+        job = self.manager.submit("Upload", "upload", fail)
+        await wait_until(lambda: job.finished)
+        self.assertEqual(job.state, JobState.FAILED)
+        self.assertIsInstance(job.error, ValueError)
+        # A finished job has already left the running jobs
+        self.assertEqual(self.manager.running, [])
+
+    async def test_cancel_all(self):
+        jobs_submitted = [
+            self.manager.submit("Upload 1", "upload", waiting_job(asyncio.Event())),
+            self.manager.submit("Upload 2", "upload", waiting_job(asyncio.Event())),
+            self.manager.submit("Classify", "classify", waiting_job(asyncio.Event())),
+        ]
+        self.manager.cancel_all()
+        await wait_until(lambda: all(job.finished for job in jobs_submitted))
+        self.assertTrue(all(job.state == JobState.CANCELLED for job in jobs_submitted))
+        self.assertEqual((self.manager.pending, self.manager.running), ([], []))
+
+
+class TestJob(unittest.IsolatedAsyncioTestCase):
+    async def test_checkpoint_raises_once_cancelled(self):
+        job = jobs.Job(1, "Upload", "upload", PRIORITY_BULK, None)
+        await job.checkpoint()
+        job.cancel()
+        with self.assertRaises(JobCancelled):
+            await job.checkpoint()
+        with self.assertRaises(JobCancelled):
+            job.check()
+
+    def test_fraction(self):
+        job = jobs.Job(1, "Upload", "upload", PRIORITY_BULK, None)
+        self.assertEqual(job.fraction, 0.0)
+        job.set_progress(3, 4)
+        self.assertEqual(job.fraction, 0.75)
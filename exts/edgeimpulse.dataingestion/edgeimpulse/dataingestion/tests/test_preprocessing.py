@@ -0,0 +1,66 @@
+import unittest
+
+from PIL import Image
+
+from ..preprocessing import FrameTransform, ImagePreprocessor, ResizeMode
+
+
+def frame_transform(resize_mode, width=1920, height=1080):
+    preprocessor = ImagePreprocessor(96, 96, resize_mode)
+    _, transform = preprocessor.resize(Image.new("RGB", (width, height)))
+    return transform
+
+
+class TestFrameTransform(unittest.TestCase):
+    def test_squash_scales_each_axis(self):
+        transform = frame_transform(ResizeMode.SQUASH)
+        boxes = transform.to_frame([{"label": "a", "value": 0.9, "x": 10, "y": 20, "width": 30, "height": 40}])
+        self.assertEqual(boxes, [{"label": "a", "value": 0.9, "x": 200, "y": 225, "width": 600, "height": 450}])
+
+    def test_fit_short_offsets_by_the_crop(self):
+        # The 96x96 input is the center 1080x1080 of the frame
+        transform = frame_transform(ResizeMode.FIT_SHORT)
+        boxes = transform.to_frame([{"label": "a", "x": 8, "y": 20, "width": 32, "height": 40}])
+        self.assertEqual(boxes, [{"label": "a", "x": 510, "y": 225, "width": 360, "height": 450}])
+
+    def test_fit_short_clips_to_the_frame(self):
+        transform = frame_transform(ResizeMode.FIT_SHORT, 1080, 1920)
+        boxes = transform.to_frame([{"label": "a", "x": 0, "y": 0, "width": 96, "height": 96}])
+        self.assertEqual(boxes, [{"label": "a", "x": 0, "y": 420, "width": 1080, "height": 1080}])
+
+    def test_fit_long_removes_the_letterbox(self):
+        # The frame is 96x54 in the input, between two 21 pixel bands
+        transform = frame_transform(ResizeMode.FIT_LONG)
+        boxes = transform.to_frame([{"label": "a", "x": 10, "y": 30, "width": 20, "height": 10}])
+        self.assertEqual(boxes, [{"label": "a", "x": 200, "y": 180, "width": 400, "height": 200}])
+
+    def test_fit_long_clips_boxes_in_the_bands(self):
+        transform = frame_transform(ResizeMode.FIT_LONG)
+        boxes = transform.to_frame(
+            [
+                {"label": "top", "x": 0, "y": 0, "width": 96, "height": 30},
+                {"label": "bottom", "x": 0, "y": 70, "width": 96, "height": 26},
+                {"label": "band", "x": 0, "y": 0, "width": 10, "height": 10},
+            ]
+        )
+        self.assertEqual(
+            boxes,
+            [
+                {"label": "top", "x": 0, "y": 0, "width": 1920, "height": 180},
+                {"label": "bottom", "x": 0, "y": 980, "width": 1920, "height": 100},
+                {"label": "band", "x": 0, "y": 0, "width": 200, "height": 0},
+            ],
+        )
+
+    def test_classification_results_are_copied(self):
+        transform = FrameTransform(1920, 1080, 20, 11.25, 0, 0)
+        results = [{"label": "a", "value": 0.4}, {"label": "b", "value": 0.6}]
+        mapped = transform.to_frame(results)
+        self.assertEqual(mapped, results)
+        self.assertIsNot(mapped[0], results[0])
+
+    def test_boxes_are_not_modified(self):
+        transform = FrameTransform(1920, 1080, 20, 11.25, 0, 0)
+        box = {"label": "a", "x": 1, "y": 2, "width": 3, "height": 4}
+        transform.to_frame([box])
+        self.assertEqual(box, {"label": "a", "x": 1, "y": 2, "width": 3, "height": 4})
@@ -0,0 +1,123 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from ..segmentation_processor import extract_bounding_boxes, load_segmentation_boxes, pack_colors
+
+
+# the extent of every id, computed one id at a time
+def reference_boxes(mask):
+    boxes = {}
+    for mask_id in np.unique(mask).tolist():
+        rows, columns = np.nonzero(mask == mask_id)
+        boxes[mask_id] = (int(columns.min()), int(rows.min()), int(columns.max()), int(rows.max()))
+    return boxes
+
+
+def extents(bounding_boxes):
+    return list(zip(*(bounding_boxes[field].tolist() for field in ("x_min", "y_min", "x_max", "y_max"))))
+
+
+def boxes_by_id(ids, bounding_boxes):
+    return dict(zip(ids.tolist(), extents(bounding_boxes)))
+
+
+class TestExtractBoundingBoxes(unittest.TestCase):
+    def test_inclusive_extent_of_each_id(self):
+        mask = np.zeros((6, 8), dtype=np.uint32)
+        mask[1:3, 2:5] = 2
+        # Two separate regions of one id give one box around both
+        mask[4, 0] = 5
+        mask[5, 7] = 5
+        ids, bounding_boxes = extract_bounding_boxes(mask)
+        self.assertEqual(boxes_by_id(ids, bounding_boxes), {0: (0, 0, 7, 5), 2: (2, 1, 4, 2), 5: (0, 4, 7, 5)})
+        self.assertTrue(np.isnan(bounding_boxes["occlusionRatio"]).all())
+
+    def test_random_masks(self):
+        rng = np.random.default_rng(0)
+        for shape, id_count in (((1, 1), 1), ((5, 9), 3), ((40, 30), 12), ((17, 64), 200)):
+            mask = rng.integers(0, id_count, shape).astype(np.uint16)
+            ids, bounding_boxes = extract_bounding_boxes(mask)
+            self.assertEqual(boxes_by_id(ids, bounding_boxes), reference_boxes(mask))
+
+    def test_ids_missing_from_the_mask_are_skipped(self):
+        mask = np.full((3, 3), 9, dtype=np.uint8)
+        mask[0, 0] = 3
+        ids, _ = extract_bounding_boxes(mask)
+        self.assertEqual(ids.tolist(), [3, 9])
+
+    def test_large_ids(self):
+        # Packed colors are above the direct id limit
+        rng = np.random.default_rng(1)
+        colors = pack_colors(*rng.integers(0, 256, (4, 5)))
+        mask = colors[rng.integers(0, 5, (20, 30))]
+        ids, bounding_boxes = extract_bounding_boxes(mask)
+        self.assertEqual(boxes_by_id(ids, bounding_boxes), reference_boxes(mask))
+
+    def test_empty_mask(self):
+        ids, bounding_boxes = extract_bounding_boxes(np.zeros((0, 4), dtype=np.uint32))
+        self.assertEqual(len(ids), 0)
+        self.assertEqual(len(bounding_boxes), 0)
+
+
+class TestLoadSegmentationBoxes(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.temp_dir.name)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_mapping(self, mapping):
+        json_label_path = self.root / "labels.json"
+        with open(json_label_path, "w") as f:
+            json.dump(mapping, f)
+        return json_label_path
+
+    def test_semantic_npy_mask(self):
+        mask = np.zeros((10, 10), dtype=np.uint32)
+        mask[2:4, 3:8] = 1
+        mask[6:9, 1:2] = 4
+        mask[0, 9] = 6
+        # Some annotator versions keep a trailing channel axis
+        np.save(self.root / "semantic_segmentation_0000.npy", mask[..., np.newaxis])
+        json_label_path = self.write_mapping(
+            {
+                "0": {"class": "BACKGROUND"},
+                "1": {"class": "car"},
+                "4": {"class": "tree"},
+                "6": {"class": "UNLABELLED"},
+                "7": {"class": "not_in_the_mask"},
+            }
+        )
+
+        bounding_boxes, labels = load_segmentation_boxes(self.root / "semantic_segmentation_0000.npy", json_label_path)
+        self.assertEqual(labels, {"1": {"class": "car"}, "4": {"class": "tree"}})
+        self.assertEqual(bounding_boxes["semanticId"].tolist(), [1, 4])
+        self.assertEqual(extents(bounding_boxes), [(3, 2, 7, 3), (1, 6, 1, 8)])
+
+    def test_colorized_png_mask(self):
+        rgba = np.zeros((8, 8, 4), dtype=np.uint8)
+        rgba[..., 3] = 255
+        rgba[1:3, 1:6] = (140, 25, 255, 255)
+        rgba[5:8, 4:7] = (10, 200, 30, 255)
+        Image.fromarray(rgba, "RGBA").save(self.root / "instance_segmentation_0000.png")
+        json_label_path = self.write_mapping(
+            {
+                "(0, 0, 0, 255)": "BACKGROUND",
+                "(140, 25, 255, 255)": {"class": "car"},
+                "(10, 200, 30, 255)": "person",
+                "not a color": "ignored",
+            }
+        )
+
+        bounding_boxes, labels = load_segmentation_boxes(self.root / "instance_segmentation_0000.png", json_label_path)
+        boxes = {
+            labels[str(semantic_id)]["class"]: extent
+            for semantic_id, extent in zip(bounding_boxes["semanticId"].tolist(), extents(bounding_boxes))
+        }
+        self.assertEqual(boxes, {"car": (1, 1, 5, 2), "person": (4, 5, 6, 7)})
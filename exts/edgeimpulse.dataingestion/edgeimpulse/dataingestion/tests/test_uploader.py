@@ -0,0 +1,91 @@
+import asyncio
+import functools
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from .. import uploader
+from ..uploader import RateLimit, upload_file, upload_from_queue
+
+
+class StubResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = ""
+
+
+class StubClient:
+    """Stands in for an httpx.AsyncClient, answers the posts with the given responses in order."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.post_times = []
+
+    async def post(self, url, headers=None, files=None):
+        self.post_times.append(asyncio.get_running_loop().time())
+        return self.responses.pop(0)
+
+
+class TestUploadFile(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.file_path = os.path.join(temp_dir.name, "rgb_0000.png")
+        with open(self.file_path, "wb") as f:
+            f.write(b"png")
+        patcher = mock.patch.object(uploader, "RATE_LIMIT_BACKOFF", 0.01)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.messages = []
+        self.uploaded = []
+
+    async def upload(self, client, rate_limit=None):
+        on_success = functools.partial(self.uploaded.append, 1)
+        await upload_file(client, "url", "key", self.file_path, None, self.messages.append, on_success, rate_limit)
+
+    async def test_rate_limited_upload_is_retried_with_backoff(self):
+        client = StubClient([StubResponse(429), StubResponse(429), StubResponse(200)])
+        await self.upload(client)
+        self.assertEqual(self.uploaded, [1])
+        self.assertEqual(len([message for message in self.messages if message.startswith("Warning")]), 2)
+        # The second wait is twice as long as the first
+        first_wait, second_wait = (b - a for a, b in zip(client.post_times, client.post_times[1:]))
+        self.assertGreaterEqual(first_wait, 0.01)
+        self.assertGreaterEqual(second_wait, 0.02)
+
+    async def test_retry_after_is_honored(self):
+        client = StubClient([StubResponse(429, {"Retry-After": "0.05"}), StubResponse(200)])
+        await self.upload(client)
+        self.assertGreaterEqual(client.post_times[1] - client.post_times[0], 0.05)
+        self.assertEqual(self.uploaded, [1])
+
+    async def test_gives_up_after_the_retries(self):
+        client = StubClient([StubResponse(429)] * 3)
+        with mock.patch.object(uploader, "MAX_RATE_LIMIT_RETRIES", 2):
+            await self.upload(client)
+        self.assertEqual(len(client.post_times), 3)
+        self.assertEqual(self.uploaded, [])
+        self.assertTrue(self.messages[-1].startswith(f"Error: {self.file_path} failed to upload. Status Code 429"))
+
+    async def test_rate_limit_is_shared_by_the_uploads(self):
+        rate_limit = RateLimit()
+        rate_limit.limited(0.05)
+        client = StubClient([StubResponse(200)])
+        start = asyncio.get_running_loop().time()
+        await self.upload(client, rate_limit)
+        self.assertGreaterEqual(client.post_times[0] - start, 0.04)
+        # A success resets the backoff
+        self.assertEqual(rate_limit.limited_count, 0)
+
+
+class TestUploadFromQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_invalid_dataset(self):
+        messages = []
+        frame_queue = asyncio.Queue()
+        frame_queue.put_nowait(None)
+        await upload_from_queue("key", frame_queue, "validation", messages.append, lambda: None)
+        self.assertEqual(
+            messages, ["Error: Dataset type invalid (must be training, testing, or anomaly). Provided: validation"]
+        )
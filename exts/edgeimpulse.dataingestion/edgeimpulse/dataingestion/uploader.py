@@ -1,76 +1,230 @@
 # uploader.py
 import asyncio
-import requests
+import httpx
+import json
 import os
 
+from .profiling import profiler
+
+INGESTION_URL = "https://ingestion.edgeimpulse.com/api/"
+
+DATASET_TYPES = ["training", "testing", "anomaly"]
+
+# number of files uploaded at the same time
+MAX_CONCURRENT_UPLOADS = 4
+
+# seconds before a single upload is abandoned
+UPLOAD_TIMEOUT = 60
+
+# retries of an upload answered with 429 Too Many Requests before it is given up
+MAX_RATE_LIMIT_RETRIES = 5
+
+# seconds the uploads wait after a 429 without Retry-After, doubled for each 429 in a row
+RATE_LIMIT_BACKOFF = 1.0
+MAX_RATE_LIMIT_BACKOFF = 30.0
+
+# logs an error and returns False if dataset is not one of DATASET_TYPES
+def check_dataset(dataset, log_callback):
+    if dataset in DATASET_TYPES:
+        return True
+    log_callback(f"Error: Dataset type invalid (must be training, testing, or anomaly). Provided: {dataset}")
+    return False
+
+# shared by the concurrent uploads of a batch: once the ingestion API answers 429,
+# every upload waits before its next request, longer after each 429 in a row
+class RateLimit:
+    def __init__(self):
+        self.resume_at = 0.0
+        self.limited_count = 0
+
+    async def wait(self):
+        delay = self.resume_at - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def limited(self, retry_after=None):
+        self.limited_count += 1
+        delay = retry_after
+        if delay is None:
+            delay = min(RATE_LIMIT_BACKOFF * 2 ** (self.limited_count - 1), MAX_RATE_LIMIT_BACKOFF)
+        self.resume_at = max(self.resume_at, asyncio.get_running_loop().time() + delay)
+        return delay
+
+    def succeeded(self):
+        self.limited_count = 0
+
+# reads the Retry-After header in seconds, HTTP dates are left to the backoff
+def parse_retry_after(response):
+    try:
+        return max(0.0, float(response.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return None
+
+# builds the bounding_boxes.labels file of a single image, so each upload only carries
+# the boxes of its own image
+def create_labels_payload(image_name, bounding_boxes):
+    return json.dumps(
+        {"version": 1, "type": "bounding-box-labels", "boundingBoxes": {image_name: bounding_boxes}},
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+# uploads one image with its bounding_boxes.labels entries (None for no labels),
+# failures are logged and do not stop the upload. Requests answered with 429 are
+# retried once rate_limit lets them through.
+async def upload_file(
+    client, url, api_key, file_path, bounding_boxes, log_callback, on_sample_upload_success, rate_limit=None
+):
+    file = os.path.basename(file_path)
+    label = file.split(".")[0]
+    rate_limit = rate_limit or RateLimit()
+
+    try:
+        with open(file_path, "rb") as file_data:
+            files = [("data", (file, file_data.read(), "image/png"))]
+
+        # if the image has bounding boxes, append its labels to the files list
+        if bounding_boxes is not None:
+            labels_payload = create_labels_payload(file, bounding_boxes)
+            files.append(("data", ("bounding_boxes.labels", labels_payload, "multipart/form-data")))
+
+        for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+            await rate_limit.wait()
+            with profiler.span("upload_request", "upload", file=file):
+                res = await client.post(
+                    url,
+                    headers={
+                        "x-label": label,
+                        "x-api-key": api_key,
+                        "x-disallow-duplicates": "1",
+                    },
+                    files=files,
+                )
+            if res.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+                break
+            delay = rate_limit.limited(parse_retry_after(res))
+            log_callback(f"Warning: Rate limited uploading {file_path}, retrying in {delay:.1f} s")
+
+        if res.status_code != 429:
+            rate_limit.succeeded()
+        if res.status_code == 200:
+            log_callback(f"Success: {file_path} uploaded successfully.")
+            on_sample_upload_success()
+        else:
+            log_callback(
+                f"Error: {file_path} failed to upload. Status Code {res.status_code}: {res.text}"
+            )
+    except Exception as e:
+        log_callback(f"Error: Failed to process {file_path}. Exception: {str(e)}")
+
+# uploads the images of data_folder, max_concurrent_uploads at a time. bounding_boxes
+# maps image names to their bounding_boxes.labels entries (see
+# bbox_processor.process_files), None uploads the images without boxes. file_names
+# restricts the upload to these images of the folder. With a job, the upload reports
+# its progress and can be paused or cancelled between files.
 async def upload_data(
     api_key,
     data_folder,
     dataset,
     log_callback,
     on_sample_upload_success,
-    on_upload_complete,
-    checkbox,
+    bounding_boxes=None,
+    ingestion_url=INGESTION_URL,
+    max_concurrent_uploads=MAX_CONCURRENT_UPLOADS,
+    file_names=None,
+    job=None,
 ):
-    dataset_types = ["training", "testing", "anomaly"]
-    if dataset not in dataset_types:
-        log_callback(
-            f"Error: Dataset type invalid (must be training, testing, or anomaly). Provided: {dataset}"
-        )
+    if not check_dataset(dataset, log_callback):
         return
 
-    url = "https://ingestion.edgeimpulse.com/api/" + dataset + "/files"
-    bounding_boxes_file_path = os.path.join(data_folder, "bounding_boxes.labels")
+    url = ingestion_url + dataset + "/files"
+    rate_limit = RateLimit()
 
     try:
-        for file in os.listdir(data_folder):
-            file_path = os.path.join(data_folder, file)
-            label = os.path.basename(file_path).split(".")[0]
-
-            if os.path.isfile(file_path):
-                await asyncio.sleep(1) 
-
-                try:
-                    with open(file_path, "rb") as file_data:
-                        files = [
-                            ("data", (os.path.basename(file_path), file_data, "image/png"))
-                        ]
-
-                        # if bounding_boxes.labels exists, open and append it to the files list
-                        if os.path.isfile(bounding_boxes_file_path) and checkbox:
-                            bbox_file = open(bounding_boxes_file_path, "rb") 
-                            files.append(
-                                ("data", ("bounding_boxes.labels", bbox_file, "multipart/form-data"))
-                            )
-
-                        try:
-                            res = requests.post(
-                                url=url,
-                                headers={
-                                    "x-label": label,
-                                    "x-api-key": api_key,
-                                    "x-disallow-duplicates": "1",
-                                },
-                                files=files,
-                            )
-
-                            if res.status_code == 200:
-                                log_callback(f"Success: {file_path} uploaded successfully.")
-                                on_sample_upload_success()
-                            else:
-                                log_callback(
-                                    f"Error: {file_path} failed to upload. Status Code {res.status_code}: {res.text}"
-                                )
-                        finally:
-                            if 'bbox_file' in locals():
-                                bbox_file.close()
-
-                except Exception as e:
-                    log_callback(
-                        f"Error: Failed to process {file_path}. Exception: {str(e)}"
-                    )
+        file_paths = [
+            file_path
+            for file_path in (os.path.join(data_folder, file) for file in os.listdir(data_folder))
+            if os.path.isfile(file_path)
+        ]
     except FileNotFoundError:
         log_callback("Error: Data Path invalid.")
+        file_paths = []
+
+    if file_names is not None:
+        file_names = set(file_names)
+        file_paths = [file_path for file_path in file_paths if os.path.basename(file_path) in file_names]
+
+    # a few upload loops share one iterator, so at most max_concurrent_uploads
+    # requests are in flight whatever the number of files
+    pending_file_paths = iter(file_paths)
+    completed = 0
+
+    async def upload_loop(client):
+        nonlocal completed
+        for file_path in pending_file_paths:
+            if job is not None:
+                await job.checkpoint()
+            file_bounding_boxes = None
+            if bounding_boxes is not None:
+                file_bounding_boxes = bounding_boxes.get(os.path.basename(file_path))
+            await upload_file(
+                client,
+                url,
+                api_key,
+                file_path,
+                file_bounding_boxes,
+                log_callback,
+                on_sample_upload_success,
+                rate_limit,
+            )
+            completed += 1
+            if job is not None:
+                job.set_progress(completed, len(file_paths))
+
+    async with httpx.AsyncClient(timeout=UPLOAD_TIMEOUT) as client:
+        await asyncio.gather(*(upload_loop(client) for _ in range(max_concurrent_uploads)))
+
+    log_callback("Done")
+
+# uploads the (file_path, bounding_boxes) frames of an asyncio queue as they come in,
+# with max_concurrent_uploads uploads in flight, until a None item is queued. Used to
+# upload frames while Replicator is still rendering them, so the progress of the job
+# is measured against the frames queued so far.
+async def upload_from_queue(
+    api_key,
+    frame_queue,
+    dataset,
+    log_callback,
+    on_sample_upload_success,
+    ingestion_url=INGESTION_URL,
+    max_concurrent_uploads=MAX_CONCURRENT_UPLOADS,
+    job=None,
+):
+    if not check_dataset(dataset, log_callback):
+        return
+
+    url = ingestion_url + dataset + "/files"
+    rate_limit = RateLimit()
+    completed = 0
+
+    async def upload_loop(client):
+        nonlocal completed
+        while True:
+            frame = await frame_queue.get()
+            if frame is None:
+                # leave the end marker for the other upload loops
+                frame_queue.put_nowait(None)
+                return
+            if job is not None:
+                await job.checkpoint()
+            file_path, bounding_boxes = frame
+            await upload_file(
+                client, url, api_key, file_path, bounding_boxes, log_callback, on_sample_upload_success, rate_limit
+            )
+            completed += 1
+            if job is not None:
+                job.set_progress(completed, completed + frame_queue.qsize())
+
+    async with httpx.AsyncClient(timeout=UPLOAD_TIMEOUT) as client:
+        await asyncio.gather(*(upload_loop(client) for _ in range(max_concurrent_uploads)))
 
     log_callback("Done")
-    on_upload_complete()
\ No newline at end of file
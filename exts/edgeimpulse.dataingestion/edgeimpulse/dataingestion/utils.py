@@ -1,6 +1,7 @@
 import omni.kit.app
 import carb.settings
 import carb.tokens
+import hashlib
 import os
 import subprocess
 
@@ -29,7 +30,206 @@ def get_models_directory() -> str:
     return models_directory
 
 
-def is_node_installed():
+def get_data_directory() -> str:
+    """
+    Return the per-user data directory of the Extension, inside the Kit data directory.
+    Args:
+        None
+    Returns:
+        str: The path of the data directory.
+    """
+    extension_name = get_extension_name()
+    omni_data_directory = carb.tokens.get_tokens_interface().resolve("${omni_data}")
+    return os.path.join(omni_data_directory, extension_name)
+
+
+def get_label_cache_path(bounding_box_dir) -> str:
+    """
+    Return the per-frame label cache file of a bounding box directory.
+    Args:
+        bounding_box_dir (str): The Replicator bounding box directory.
+    Returns:
+        str: The path of the label cache file.
+    """
+    bounding_box_dir = os.path.abspath(bounding_box_dir)
+    cache_name = hashlib.sha1(bounding_box_dir.encode("utf-8")).hexdigest()
+    return os.path.join(get_data_directory(), "label_cache", f"{cache_name}.json")
+
+
+def get_save_overlay_images() -> bool:
+    """
+    Return whether classification overlays should also be written to the temp directory.
+    Args:
+        None
+    Returns:
+        bool: The value of the save_overlay_images setting.
+    """
+    extension_name = get_extension_name()
+    return carb.settings.get_settings().get_as_bool(
+        f"exts/{extension_name}/save_overlay_images"
+    )
+
+
+def get_inference_backend() -> str:
+    """
+    Return the inference backend used for classification.
+    Args:
+        None
+    Returns:
+        str: "node" (WebAssembly deployment, default), "tflite" or "onnx".
+    """
+    extension_name = get_extension_name()
+    backend = carb.settings.get_settings().get_as_string(
+        f"exts/{extension_name}/inference_backend"
+    )
+    return backend or "node"
+
+
+def get_local_model_path() -> str:
+    """
+    Return the model file run by the in-process inference backends.
+    Args:
+        None
+    Returns:
+        str: The expanded local_model_path setting.
+    """
+    extension_name = get_extension_name()
+    local_model_path = carb.settings.get_settings().get_as_string(
+        f"exts/{extension_name}/local_model_path"
+    )
+    return os.path.expanduser(local_model_path)
+
+
+def get_box_filter_settings() -> dict:
+    """
+    Return the filter settings of the uploaded bounding boxes.
+    Args:
+        None
+    Returns:
+        dict: The min_area, max_occlusion, clip_to_image and class_map arguments of BoxFilter.
+    """
+    extension_name = get_extension_name()
+    settings = carb.settings.get_settings()
+    return {
+        "min_area": settings.get_as_int(f"exts/{extension_name}/bbox_min_area"),
+        "max_occlusion": settings.get_as_float(f"exts/{extension_name}/bbox_max_occlusion"),
+        "clip_to_image": settings.get_as_bool(f"exts/{extension_name}/bbox_clip_to_image"),
+        "class_map": settings.get(f"exts/{extension_name}/bbox_class_map") or {},
+    }
+
+
+def get_bbox_use_processes() -> bool:
+    """
+    Return whether the bounding box files are parsed in worker processes.
+    Args:
+        None
+    Returns:
+        bool: The value of the bbox_use_processes setting.
+    """
+    extension_name = get_extension_name()
+    return carb.settings.get_settings().get_as_bool(f"exts/{extension_name}/bbox_use_processes")
+
+
+def get_log_max_entries() -> int:
+    """
+    Return the number of log messages kept in the upload and classification logs.
+    Args:
+        None
+    Returns:
+        int: The value of the log_max_entries setting.
+    """
+    extension_name = get_extension_name()
+    max_entries = carb.settings.get_settings().get_as_int(f"exts/{extension_name}/log_max_entries")
+    return max(max_entries, 1)
+
+
+def get_log_file_path(log_name) -> str:
+    """
+    Return the rotating log file of a log, if logging to files is enabled.
+    Args:
+        log_name (str): "upload" or "classify".
+    Returns:
+        str: The path of the log file, or None if the log_to_file setting is off.
+    """
+    extension_name = get_extension_name()
+    if not carb.settings.get_settings().get_as_bool(f"exts/{extension_name}/log_to_file"):
+        return None
+    return os.path.join(get_data_directory(), "logs", f"{log_name}.log")
+
+
+def get_stream_idle_timeout() -> float:
+    """
+    Return how long a streamed upload waits for new frames before it ends.
+    Args:
+        None
+    Returns:
+        float: The value of the stream_idle_timeout setting, in seconds.
+    """
+    extension_name = get_extension_name()
+    idle_timeout = carb.settings.get_settings().get_as_float(f"exts/{extension_name}/stream_idle_timeout")
+    return idle_timeout if idle_timeout > 0 else 30.0
+
+
+def get_profiling_settings() -> dict:
+    """
+    Return the profiling settings.
+    Args:
+        None
+    Returns:
+        dict: The enabled and trace_memory arguments of Profiler.configure.
+    """
+    extension_name = get_extension_name()
+    settings = carb.settings.get_settings()
+    return {
+        "enabled": settings.get_as_bool(f"exts/{extension_name}/profiling_enabled"),
+        "trace_memory": settings.get_as_bool(f"exts/{extension_name}/profiling_trace_memory"),
+    }
+
+
+def get_trace_path() -> str:
+    """
+    Return the path of the profiling trace.
+    Args:
+        None
+    Returns:
+        str: traces/trace.json in the extension data directory.
+    """
+    return os.path.join(get_data_directory(), "traces", "trace.json")
+
+
+def get_active_learning_settings() -> dict:
+    """
+    Return the settings of the active learning upload filter.
+    Args:
+        None
+    Returns:
+        dict: The budget, min_score and min_iou arguments of select_uncertain_frames.
+    """
+    extension_name = get_extension_name()
+    settings = carb.settings.get_settings()
+    return {
+        "budget": max(settings.get_as_int(f"exts/{extension_name}/active_learning_budget"), 0),
+        "min_score": settings.get_as_float(f"exts/{extension_name}/active_learning_min_score"),
+        "min_iou": settings.get_as_float(f"exts/{extension_name}/active_learning_min_iou"),
+    }
+
+
+_node_installed = False
+
+
+def is_node_installed(refresh=False):
+    """
+    Check whether NodeJS is available. A successful check is cached so that
+    `node --version` is only spawned once per session.
+    Args:
+        refresh (bool): Ignore the cached result and check again.
+    Returns:
+        bool: True if NodeJS is installed.
+    """
+    global _node_installed
+    if _node_installed and not refresh:
+        return True
+
     try:
         subprocess.run(
             ["node", "--version"],
@@ -37,6 +237,7 @@ def is_node_installed():
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
         )
-        return True
+        _node_installed = True
     except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
+        _node_installed = False
+    return _node_installed